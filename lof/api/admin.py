@@ -1,3 +1,23 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import Generation, MirroredTrack, PromptCacheEntry
+
+
+@admin.register(Generation)
+class GenerationAdmin(admin.ModelAdmin):
+    list_display = ('id', 'status', 'task_id', 'created_at', 'updated_at')
+    list_filter = ('status',)
+    search_fields = ('id', 'task_id')
+
+
+@admin.register(PromptCacheEntry)
+class PromptCacheEntryAdmin(admin.ModelAdmin):
+    list_display = ('image_sha256', 'phash', 'hit_count', 'last_used_at')
+    search_fields = ('image_sha256', 'phash')
+
+
+@admin.register(MirroredTrack)
+class MirroredTrackAdmin(admin.ModelAdmin):
+    list_display = ('content_sha256', 'task_id', 'status', 'size', 'last_accessed_at')
+    list_filter = ('status',)
+    search_fields = ('content_sha256', 'task_id', 'source_url')
@@ -0,0 +1,157 @@
+# api/async_utils.py
+#
+# Async counterparts of the outbound calls in api/utils.py for the ASGI views.
+# Suno calls share one pooled httpx.AsyncClient per event loop and Gemini uses
+# the SDK's native async client, so a single loop can keep many generations
+# in flight. Deadlines, hedging and circuit breakers behave as in api/utils.py.
+
+import json
+import time
+import asyncio
+
+from . import deadlines
+from .clients import get_async_client, get_async_gemini_model, get_gemini_model, gemini_endpoint
+from .metrics import PROMPTS, log_event, stage, upstream
+from .mood import local_lofi_prompt
+from .ratelimit import suno_limiter, parse_retry_after, poll_delay, RateLimited, SUNO_MAX_RETRIES
+from .resilience import CircuitOpen, HEDGES, gemini_breaker, gemini_hedge_delay, gemini_latency, suno_breaker
+from .utils import (
+    GOOGLE_API_KEY,
+    GEMINI_LOCAL_FALLBACK,
+    PROMPT_MODES,
+    SUNO_BASE_URL,
+    SUNO_CALLBACK_URL,
+    SUNO_TIMEOUT,
+    LOFI_PROMPT,
+    _suno_headers,
+    _budget_left,
+    gemini_request_options,
+    preprocess_image,
+    build_suno_payload,
+    parse_submit_response,
+)
+
+
+async def generate_lofi_prompt_async(image):
+    if not GOOGLE_API_KEY:
+        raise ValueError("Missing GOOGLE_API_KEY")
+    # Decoding and resizing are CPU work; keep them off the event loop.
+    data = await asyncio.to_thread(preprocess_image, image)
+    contents = [LOFI_PROMPT, {'mime_type': 'image/jpeg', 'data': data}]
+    with stage('gemini_describe'):
+        return await _describe_hedged_async(contents)
+
+
+async def _describe_once_async(contents):
+    rest = gemini_endpoint()
+    request_options = gemini_request_options(asynchronous=not rest)
+    with gemini_breaker.guard(), upstream('gemini') as call:
+        started = time.perf_counter()
+        if rest:
+            # The SDK's async client only works over gRPC; REST endpoints go through a thread.
+            response = await asyncio.to_thread(get_gemini_model().generate_content, contents, request_options=request_options)
+        else:
+            response = await get_async_gemini_model().generate_content_async(contents, request_options=request_options)
+        call.code = 200
+    gemini_latency.observe(time.perf_counter() - started)
+    return response.text.strip()
+
+
+async def _describe_hedged_async(contents):
+    """Async ``_describe_hedged``; the losing attempt is cancelled."""
+    delay = gemini_hedge_delay()
+    if delay is None:
+        gemini_latency.note_call(False)
+        return await _describe_once_async(contents)
+
+    attempts = [asyncio.ensure_future(_describe_once_async(contents))]
+    try:
+        done, _ = await asyncio.wait(attempts, timeout=delay)
+        hedged = not done and gemini_latency.hedge_allowed()
+        gemini_latency.note_call(hedged)
+        if hedged:
+            HEDGES.inc(outcome='fired')
+            attempts.append(asyncio.ensure_future(_describe_once_async(contents)))
+
+        error = None
+        pending = set(attempts)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for attempt in done:
+                if attempt.exception() is None:
+                    if attempt is not attempts[0]:
+                        HEDGES.inc(outcome='won')
+                    return attempt.result()
+                error = error or attempt.exception()
+        raise error
+    finally:
+        for attempt in attempts:
+            if not attempt.done():
+                attempt.cancel()
+            elif not attempt.cancelled():
+                attempt.exception()  # retrieved, so asyncio does not log it as unhandled
+
+
+async def lofi_prompt_async(image, mode='gemini'):
+    """Async ``lofi_prompt``; the local description runs in a worker thread."""
+    if mode not in PROMPT_MODES:
+        raise ValueError(f"Unknown prompt mode: {mode}")
+    if mode == 'fast':
+        prompt, source = await asyncio.to_thread(local_lofi_prompt, image), 'local'
+    else:
+        try:
+            prompt, source = await generate_lofi_prompt_async(image), 'gemini'
+        except Exception as e:
+            if not GEMINI_LOCAL_FALLBACK:
+                raise
+            log_event('gemini_fallback', error=f'{type(e).__name__}: {e}')
+            prompt, source = await asyncio.to_thread(local_lofi_prompt, image), 'fallback'
+    PROMPTS.inc(source=source)
+    return prompt, source
+
+
+async def suno_request_async(method, path, timeout=None, **kwargs):
+    """Async ``suno_request``: same limiter, timeouts, breaker and 429 handling."""
+    timeout = deadlines.budget((SUNO_TIMEOUT if timeout is None else timeout) or None, what=f'suno {path}')
+    deadline_at = None if timeout is None else time.monotonic() + timeout
+    for attempt in range(SUNO_MAX_RETRIES + 1):
+        if not await suno_limiter.acquire_async(max_wait=_budget_left(deadline_at)):
+            raise RateLimited("Suno rate limit: no request slot within the time budget")
+        with suno_breaker.guard() as guard, upstream('suno') as call:
+            response = await get_async_client().request(
+                method, f"{SUNO_BASE_URL}{path}", headers=_suno_headers(), timeout=_budget_left(deadline_at), **kwargs
+            )
+            call.code = response.status_code
+            guard.failed = response.status_code >= 500
+        if response.status_code != 429 or attempt == SUNO_MAX_RETRIES:
+            return response
+        suno_limiter.pause(parse_retry_after(response.headers.get('Retry-After'), poll_delay(attempt, base=1, cap=30)))
+    return response
+
+
+async def submit_music_generation_async(prompt, callback_url=None):
+    payload = build_suno_payload(prompt, callback_url or SUNO_CALLBACK_URL)
+    with stage('suno_submit') as span:
+        response = await suno_request_async('POST', '/generate', content=json.dumps(payload))
+        response.raise_for_status()
+        result = parse_submit_response(response.json())
+        span['task_id'] = result['task_id']
+    return result
+
+
+async def check_generation_status_async(task_id, timeout=None):
+    if not task_id or not str(task_id).strip():
+        raise ValueError("Task ID is required")
+    try:
+        with stage('suno_status', task_id=task_id):
+            response = await suno_request_async('GET', '/generate/record-info', timeout=timeout, params={'taskId': task_id})
+    except RateLimited as e:
+        return {'error': str(e), 'status_code': 429}
+    except CircuitOpen as e:
+        return {'error': str(e), 'status_code': 503}
+    if response.status_code != 200:
+        return {'error': f'Suno API returned HTTP {response.status_code}', 'status_code': response.status_code}
+    body = response.json()
+    if body.get('code') != 200:
+        return {'error': body.get('msg') or 'Suno API error', 'status_code': 502}
+    return body
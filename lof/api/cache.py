@@ -0,0 +1,105 @@
+# api/cache.py
+#
+# In-process cache in front of check_generation_status. Records for tasks
+# still in flight expire after a short TTL so progress keeps moving; finished
+# (complete or failed) records never change, so they stay until the LRU bound
+# pushes them out.
+
+import time
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .async_utils import check_generation_status_async
+from .metrics import register_collector
+from .utils import check_generation_status, extract_music_info, TERMINAL_STATUSES
+
+
+class StatusCache:
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # task_id -> (expires_at or None, api_response)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, task_id):
+        with self._lock:
+            entry = self._entries.get(task_id)
+            if entry is not None:
+                expires_at, api_response = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._entries.move_to_end(task_id)
+                    self.hits += 1
+                    return api_response
+                del self._entries[task_id]
+            self.misses += 1
+            return None
+
+    def set(self, task_id, api_response, terminal=False):
+        expires_at = None if terminal else time.monotonic() + self.ttl
+        with self._lock:
+            self._entries[task_id] = (expires_at, api_response)
+            self._entries.move_to_end(task_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, task_id):
+        with self._lock:
+            self._entries.pop(task_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+status_cache = StatusCache(settings.STATUS_CACHE_TTL, settings.STATUS_CACHE_MAX_ENTRIES)
+
+
+@register_collector
+def _status_cache_metrics():
+    stats = status_cache.stats()
+    return [
+        ('lofi_status_cache_lookups_total', 'counter', 'Status cache lookups by result.',
+         [({'result': 'hit'}, stats['hits']), ({'result': 'miss'}, stats['misses'])]),
+        ('lofi_status_cache_entries', 'gauge', 'Task records held in the status cache.', [({}, stats['entries'])]),
+    ]
+
+
+def cached_check_generation_status(task_id, timeout=None):
+    """``check_generation_status`` answered from ``status_cache`` when possible."""
+    api_response = status_cache.get(task_id)
+    if api_response is not None:
+        return api_response
+    api_response = check_generation_status(task_id, timeout=timeout)
+    if api_response and 'error' not in api_response:
+        terminal = extract_music_info(api_response)['status'] in TERMINAL_STATUSES
+        status_cache.set(task_id, api_response, terminal=terminal)
+    return api_response
+
+
+async def acached_check_generation_status(task_id, timeout=None):
+    """Async ``cached_check_generation_status`` for the ASGI views."""
+    api_response = status_cache.get(task_id)
+    if api_response is not None:
+        return api_response
+    api_response = await check_generation_status_async(task_id, timeout=timeout)
+    if api_response and 'error' not in api_response:
+        terminal = extract_music_info(api_response)['status'] in TERMINAL_STATUSES
+        status_cache.set(task_id, api_response, terminal=terminal)
+    return api_response
@@ -0,0 +1,153 @@
+# api/clients.py
+#
+# Process-wide registry of outbound clients. The configured Gemini model and
+# the keep-alive Suno and mirror sessions are built once, on first use, and
+# shared by all threads. Async HTTP clients are kept per event loop. After a fork the child
+# drops everything it inherited, so pooled sockets and gRPC channels are never
+# shared between processes.
+#
+# The SDKs themselves are imported on first use: google.generativeai alone
+# takes about a second to import, which every manage.py command and every new
+# worker would otherwise pay before serving anything. warm_up() imports them
+# up front, e.g. once in a pre-fork master so the workers inherit them.
+
+import os
+import asyncio
+import importlib
+import threading
+import weakref
+
+_lock = threading.Lock()
+_gemini_model = None
+_suno_session = None
+_mirror_session = None
+# httpx clients and the Gemini SDK's async gRPC channel are bound to the
+# event loop they were first used on, so those are kept per loop.
+_async_clients = weakref.WeakKeyDictionary()
+_async_gemini_models = weakref.WeakKeyDictionary()
+
+# Heavy third-party modules loaded lazily by this package; see warm_up().
+PRELOAD_MODULES = (
+    'google.generativeai',
+    'requests',
+    'httpx',
+    'PIL.Image',
+    'PIL.ImageOps',
+    'numpy',
+)
+
+
+def warm_up(modules=PRELOAD_MODULES):
+    """Import the lazily loaded SDKs now. Only modules are loaded; no clients or sockets are created."""
+    for name in modules:
+        importlib.import_module(name)
+
+
+def _pool_size():
+    return int(os.getenv("SUNO_HTTP_POOL_SIZE", 16))
+
+
+def gemini_endpoint():
+    """Override for the Gemini API host (e.g. a local stand-in); implies the REST transport."""
+    return os.getenv("GEMINI_API_ENDPOINT")
+
+
+def _build_gemini_model():
+    import google.generativeai as genai
+
+    options = {}
+    if gemini_endpoint():
+        options = {'transport': 'rest', 'client_options': {'api_endpoint': gemini_endpoint()}}
+    genai.configure(api_key=os.getenv("GOOGLE_API_KEY"), **options)
+    return genai.GenerativeModel(os.getenv("GEMINI_MODEL", "gemini-1.5-flash"))
+
+
+def get_gemini_model():
+    global _gemini_model
+    if _gemini_model is None:
+        with _lock:
+            if _gemini_model is None:
+                _gemini_model = _build_gemini_model()
+    return _gemini_model
+
+
+def get_async_gemini_model():
+    loop = asyncio.get_running_loop()
+    model = _async_gemini_models.get(loop)
+    if model is None:
+        with _lock:
+            model = _async_gemini_models.get(loop)
+            if model is None:
+                model = _async_gemini_models[loop] = _build_async_gemini_model()
+    return model
+
+
+def _build_async_gemini_model():
+    # The SDK caches one client per kind in a module-level manager until the next
+    # genai.configure(), and a GenerativeModel keeps whichever async client it first
+    # uses. That client's channel belongs to the loop it was created on, so the
+    # model is handed its own here, created under the lock on this loop; left to
+    # the SDK it could pick up the cached client of another loop.
+    from google.generativeai import client as genai_client
+
+    model = _build_gemini_model()
+    model._async_client = genai_client.get_default_generative_async_client()
+    return model
+
+
+def _build_session(hosts):
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    # pool_connections is the number of hosts whose connection pools are kept.
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=hosts, pool_maxsize=_pool_size())
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_suno_session():
+    global _suno_session
+    if _suno_session is None:
+        with _lock:
+            if _suno_session is None:
+                _suno_session = _build_session(hosts=1)
+    return _suno_session
+
+
+def get_mirror_session():
+    """Session for track downloads, kept apart so CDN hosts do not evict the Suno API pool."""
+    global _mirror_session
+    if _mirror_session is None:
+        with _lock:
+            if _mirror_session is None:
+                _mirror_session = _build_session(hosts=4)
+    return _mirror_session
+
+
+def get_async_client():
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        import httpx
+
+        pool_size = _pool_size()
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+        _async_clients[loop] = client
+    return client
+
+
+def _reset_after_fork():
+    global _lock, _gemini_model, _suno_session, _mirror_session, _async_clients, _async_gemini_models
+    _lock = threading.Lock()
+    _gemini_model = None
+    _suno_session = None
+    _mirror_session = None
+    _async_clients = weakref.WeakKeyDictionary()
+    _async_gemini_models = weakref.WeakKeyDictionary()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
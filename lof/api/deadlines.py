@@ -0,0 +1,57 @@
+# api/deadlines.py
+#
+# Per-request deadlines. A view or worker opens ``deadline(seconds)`` around
+# its pipeline; the deadline lives in a context variable, so every stage and
+# upstream call below it in the same thread or asyncio task (and code run via
+# sync_to_async or a copied context) sees it. Stages refuse to start once it
+# has passed and upstream calls turn what is left into their timeout.
+
+import time
+import contextvars
+from contextlib import contextmanager
+
+_deadline_at = contextvars.ContextVar('deadline_at', default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """The request's deadline passed before the work could be done."""
+
+
+@contextmanager
+def deadline(seconds):
+    """Run the block with a deadline ``seconds`` from now; an enclosing earlier deadline still wins."""
+    if not seconds:
+        yield
+        return
+    at = time.monotonic() + seconds
+    current = _deadline_at.get()
+    token = _deadline_at.set(at if current is None else min(current, at))
+    try:
+        yield
+    finally:
+        _deadline_at.reset(token)
+
+
+def remaining():
+    """Seconds left before the current deadline, or None when there is none."""
+    at = _deadline_at.get()
+    return None if at is None else at - time.monotonic()
+
+
+def expired():
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def check(what):
+    if expired():
+        raise DeadlineExceeded(f"Request deadline passed before {what}")
+
+
+def budget(cap=None, what='the upstream call'):
+    """Timeout for the next call: the smaller of ``cap`` and the time left (None when neither is set)."""
+    check(what)
+    left = remaining()
+    if left is None:
+        return cap
+    return left if cap is None else min(cap, left)
@@ -0,0 +1,97 @@
+# api/events.py
+#
+# Server-Sent Events stream of one Suno task. Each state change is sent as a
+# `status` event whose id is the status fingerprint, so a client reconnecting
+# with Last-Event-ID only receives news. Status reads go through the shared
+# status cache; many listeners on one task cost one upstream call per TTL,
+# and a Suno callback invalidates the entry so the next read sees it. A stream
+# lives at most SSE_MAX_DURATION and polls less often while upstream errors.
+
+import json
+import time
+import asyncio
+
+from django.conf import settings
+
+from .cache import acached_check_generation_status
+from .utils import extract_music_info, status_fingerprint, TERMINAL_STATUSES
+
+
+def format_event(data, event=None, event_id=None):
+    lines = []
+    if event_id:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return '\n'.join(lines) + '\n\n'
+
+
+def _status_data(task_id, music_info):
+    return {
+        'task_id': task_id,
+        'status': music_info['status'],
+        'progress': music_info['progress'],
+        'audio_urls': music_info['audio_urls'],
+        'tracks': music_info['tracks'],
+        'errors': music_info['errors'],
+    }
+
+
+async def _idle(seconds, last_sent):
+    """Sleep ``seconds``, yielding heartbeat comments; yields the time of the last one sent."""
+    wake_at = time.monotonic() + seconds
+    while True:
+        now = time.monotonic()
+        if now - last_sent >= settings.SSE_HEARTBEAT_INTERVAL:
+            yield ": heartbeat\n\n"
+            last_sent = now
+        if now >= wake_at:
+            return
+        await asyncio.sleep(min(wake_at, last_sent + settings.SSE_HEARTBEAT_INTERVAL) - now)
+
+
+async def task_event_stream(task_id, music_info, last_event_id=None):
+    """
+    Yield SSE frames for ``task_id`` until it completes or fails, or until
+    SSE_MAX_DURATION passes; then ``end`` carries ``reconnect: true`` and the
+    client opens a new stream with its Last-Event-ID.
+    """
+    yield f"retry: {settings.SSE_RETRY_MS}\n\n"
+    last_sent = time.monotonic()
+    ends_at = last_sent + settings.SSE_MAX_DURATION
+    errors = 0
+    while True:
+        if music_info is not None:
+            event_id = status_fingerprint(music_info)
+            if event_id != last_event_id:
+                yield format_event(_status_data(task_id, music_info), 'status', event_id)
+                last_event_id = event_id
+                last_sent = time.monotonic()
+            if music_info['status'] in TERMINAL_STATUSES:
+                yield format_event({'task_id': task_id}, 'end')
+                return
+
+        # Errors are not cached, so an erroring task backs off instead of
+        # costing an upstream call per listener per tick.
+        delay = min(settings.SSE_POLL_INTERVAL * 2 ** errors, settings.SSE_ERROR_BACKOFF_MAX)
+        if time.monotonic() + delay >= ends_at:
+            yield format_event({'task_id': task_id, 'reconnect': True}, 'end')
+            return
+        async for frame in _idle(delay, last_sent):
+            yield frame
+            last_sent = time.monotonic()
+
+        try:
+            api_response = await acached_check_generation_status(task_id)
+        except Exception as e:
+            api_response = {'error': str(e)}
+        if 'error' in api_response:
+            # Transient upstream trouble: tell the client and keep the stream open.
+            errors += 1
+            yield format_event({'task_id': task_id, 'error': api_response['error']}, 'error')
+            last_sent = time.monotonic()
+            music_info = None
+            continue
+        errors = 0
+        music_info = extract_music_info(api_response)
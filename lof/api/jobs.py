@@ -0,0 +1,437 @@
+# api/jobs.py
+#
+# Background execution of the image-to-lofi pipeline. Views persist a
+# Generation row and return straight away; a bounded thread pool runs the
+# Gemini and Suno stages and records progress on the row. Suno reports the
+# finished music through the callback view, which calls record_completion().
+# The pool lives in one process, so a periodic sweep (start_sweeper) picks up
+# rows left mid-pipeline by a worker that restarted or died.
+
+import os
+import time
+import uuid
+import logging
+import threading
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.signals import request_started
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, connections
+from django.utils import timezone
+
+from .cache import status_cache, cached_check_generation_status
+from .deadlines import deadline
+from .metrics import stage, log_event
+from .models import Generation
+from .ratelimit import poll_delay, SUNO_POLL_MAX_INTERVAL
+from .singleflight import generation_flight, generation_key
+from . import mirror, prompt_cache
+from .status import submit_bounded
+from .utils import (
+    lofi_prompt,
+    preprocess_image,
+    submit_music_generation,
+    extract_music_info,
+    TERMINAL_STATUSES,
+)
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+_sweeper = None
+
+# Generation ids queued or running on this process's pool; the sweep leaves them alone.
+_local = set()
+_local_lock = threading.Lock()
+
+PIPELINE_STATUSES = (Generation.STATUS_QUEUED, Generation.STATUS_DESCRIBING, Generation.STATUS_SUBMITTING)
+
+# task_id -> _Waiter for requests blocked in wait_for_completion in this process
+_waiters = {}
+_waiters_lock = threading.Lock()
+
+
+class _Waiter:
+    def __init__(self):
+        self.event = threading.Event()
+        self.music_info = None
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.GENERATION_WORKERS,
+                thread_name_prefix='generation',
+            )
+        return _executor
+
+
+def enqueue_generation(upload, user=None, batch_id=None, mode='gemini'):
+    """
+    Persist a queued Generation for an uploaded image and hand it to the worker pool.
+
+    The upload is hashed where Django spooled it. A downscaled copy is written
+    to storage for the worker only when no cached description matches; in
+    fast mode the local description is made here instead.
+    """
+    image_sha256, phash = prompt_cache.image_digests(upload)
+    prompt = prompt_cache.lookup(image_sha256, phash)
+    image_path = ''
+    if prompt is None and mode == 'fast':
+        prompt, _ = lofi_prompt(upload, mode)
+    if prompt is None:
+        with stage('save_upload'):
+            filename = default_storage.save(f"uploads/{image_sha256}.jpg", ContentFile(preprocess_image(upload)))
+            image_path = default_storage.path(filename)
+    generation = Generation.objects.create(
+        user=user,
+        batch_id=batch_id,
+        image_path=image_path,
+        image_sha256=image_sha256,
+        image_phash=phash,
+        prompt=prompt or '',
+        mode=mode,
+    )
+    _submit(generation.pk)
+    return generation
+
+
+def _submit(generation_id):
+    with _local_lock:
+        _local.add(generation_id)
+    get_executor().submit(run_generation, generation_id)
+
+
+def enqueue_batch(uploads, user=None, mode='gemini'):
+    """
+    Queue one Generation per upload under a shared batch id.
+
+    Uploads are hashed and downscaled on up to BATCH_PREPARE_WORKERS threads.
+    The Gemini and Suno stages then run on the same bounded worker pool as
+    single generations, and Suno submits share the process-wide rate
+    limiter. An upload that cannot be read is reported in its item instead
+    of failing the batch.
+    """
+    batch_id = uuid.uuid4()
+
+    def prepare(upload):
+        try:
+            return enqueue_generation(upload, user=user, batch_id=batch_id, mode=mode)
+        except Exception as e:
+            logger.warning("Batch %s: could not queue %s: %s", batch_id, upload.name, e)
+            return e
+        finally:
+            connections.close_all()
+
+    workers = max(1, min(len(uploads), settings.BATCH_PREPARE_WORKERS))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='batch-prepare') as pool:
+        results = list(pool.map(prepare, uploads))
+    items = []
+    for upload, result in zip(uploads, results):
+        if isinstance(result, Exception):
+            items.append({'filename': upload.name, 'error': str(result)})
+        else:
+            items.append({'filename': upload.name, 'generation_id': str(result.id), 'status': result.status})
+    return batch_id, items
+
+
+def _update(generation, **fields):
+    for name, value in fields.items():
+        setattr(generation, name, value)
+    generation.save(update_fields=[*fields, 'updated_at'])
+
+
+def _describe_and_submit(generation):
+    prompt = generation.prompt
+    if not prompt:
+        with stage('describe', generation_id=generation.pk) as span:
+            prompt, span['prompt_source'] = lofi_prompt(generation.image_path, generation.mode)
+        if span['prompt_source'] == 'gemini':
+            prompt_cache.store(generation.image_sha256, generation.image_phash, prompt)
+
+    _update(generation, status=Generation.STATUS_SUBMITTING, prompt=prompt)
+    with stage('submit', generation_id=generation.pk) as span:
+        result = submit_music_generation(prompt)
+        span['task_id'] = result['task_id']
+    return prompt, result
+
+
+def run_generation(generation_id):
+    close_old_connections()
+    try:
+        generation = Generation.objects.get(pk=generation_id)
+        # Claim the row before any work. A sweep in another process may have queued it
+        # again; only the run whose conditional update matches describes and submits it.
+        working = Generation.STATUS_SUBMITTING if generation.prompt else Generation.STATUS_DESCRIBING
+        claimed = (
+            Generation.objects
+            .filter(pk=generation_id, status=Generation.STATUS_QUEUED)
+            .update(status=working, updated_at=timezone.now())
+        )
+        if not claimed:
+            return  # running elsewhere, finished, or failed by the sweep while it waited in the queue
+        generation.status = working
+        try:
+            with deadline(settings.GENERATION_DEADLINE):
+                # The same image and mode submitted elsewhere right now (a double submit, a repeat
+                # within a batch, an upload view): share that run instead of starting another Suno job.
+                (prompt, result), _ = generation_flight.do(
+                    generation_key(generation.image_sha256, generation.mode),
+                    lambda: _describe_and_submit(generation),
+                )
+
+            _update(
+                generation,
+                status=Generation.STATUS_PROCESSING,
+                prompt=prompt,
+                task_id=result['task_id'],
+                initial_response=result['initial_response'],
+            )
+        except Exception as e:
+            logger.exception("Generation %s failed", generation_id)
+            _update(generation, status=Generation.STATUS_FAILED, error=str(e))
+        finally:
+            try:
+                if generation.image_path and os.path.exists(generation.image_path):
+                    os.remove(generation.image_path)
+            except OSError:
+                pass
+    finally:
+        with _local_lock:
+            _local.discard(generation_id)
+        close_old_connections()
+
+
+def sweep_stale_generations(older_than=None):
+    """
+    Recover generations stuck before Suno for ``older_than`` seconds
+    (default GENERATION_STALE_AFTER) that no pool in this process holds,
+    typically because the worker that queued them restarted. Rows that still
+    have their prompt or downscaled image are queued again; the rest are
+    marked failed. Each row is claimed with a conditional update, so
+    concurrent sweeps in other processes do not queue it twice. Returns
+    ``(requeued, failed)``.
+    """
+    older_than = settings.GENERATION_STALE_AFTER if older_than is None else older_than
+    stale = (
+        Generation.objects
+        .filter(status__in=PIPELINE_STATUSES, updated_at__lt=timezone.now() - timedelta(seconds=older_than))
+        .only('id', 'status', 'prompt', 'image_path', 'updated_at')
+        .order_by('updated_at')
+    )
+    requeued = failed = 0
+    for generation in stale.iterator():
+        with _local_lock:
+            if generation.pk in _local:
+                continue
+        resumable = bool(generation.prompt) or bool(generation.image_path and os.path.exists(generation.image_path))
+        if resumable:
+            fields = {'status': Generation.STATUS_QUEUED}
+        else:
+            fields = {'status': Generation.STATUS_FAILED, 'error': 'Interrupted before the image was described; please upload it again'}
+        claimed = (
+            Generation.objects
+            .filter(pk=generation.pk, status=generation.status, updated_at=generation.updated_at)
+            .update(updated_at=timezone.now(), **fields)
+        )
+        if not claimed:
+            continue
+        if resumable:
+            _submit(generation.pk)
+            requeued += 1
+        else:
+            failed += 1
+    if requeued or failed:
+        log_event('generation_sweep', requeued=requeued, failed=failed)
+    return requeued, failed
+
+
+def start_sweeper_on_first_request():
+    """
+    Start the sweeper when this process serves its first request. Under a
+    pre-forking server the app is imported in the master (gunicorn --preload),
+    which should neither sweep nor fork workers while the thread runs.
+    """
+    request_started.connect(_start_sweeper_for_request, dispatch_uid='api.jobs.start_sweeper')
+
+
+def _start_sweeper_for_request(**kwargs):
+    if _sweeper is None:
+        start_sweeper()
+
+
+def start_sweeper():
+    """Run sweep_stale_generations every GENERATION_SWEEP_INTERVAL seconds on a daemon thread (once per process)."""
+    global _sweeper
+    with _executor_lock:
+        if _sweeper is not None or not settings.GENERATION_SWEEP_INTERVAL:
+            return
+        _sweeper = threading.Thread(target=_sweep_forever, name='generation-sweeper', daemon=True)
+        _sweeper.start()
+
+
+def _sweep_forever():
+    while True:
+        try:
+            sweep_stale_generations()
+        except Exception:
+            logger.exception("Generation sweep failed")
+        finally:
+            close_old_connections()
+        time.sleep(settings.GENERATION_SWEEP_INTERVAL)
+
+
+def _reset_after_fork():
+    # Threads do not survive a fork: a child gets its own pool, sweeper and bookkeeping.
+    global _executor, _executor_lock, _sweeper, _local, _local_lock, _waiters, _waiters_lock
+    _executor = None
+    _executor_lock = threading.Lock()
+    _sweeper = None
+    _local = set()
+    _local_lock = threading.Lock()
+    _waiters = {}
+    _waiters_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def record_completion(task_id, music_info):
+    """Store a Suno task update on its Generation rows and wake local waiters."""
+    status = music_info['status']
+    status_cache.invalidate(task_id)
+    fields = {'updated_at': timezone.now()}
+    if music_info['audio_urls']:
+        fields['audio_urls'] = music_info['audio_urls']
+        fields['tracks'] = music_info['tracks']
+    if status == 'complete':
+        fields['status'] = Generation.STATUS_COMPLETE
+    elif status == 'failed':
+        fields['status'] = Generation.STATUS_FAILED
+        fields['error'] = '; '.join(music_info['errors']) or 'Suno generation failed'
+    updated = (
+        Generation.objects
+        .filter(task_id=task_id)
+        .exclude(status__in=Generation.TERMINAL_STATUSES)
+        .update(**fields)
+    )
+    log_event('task_update', task_id=task_id, status=status, progress=music_info['progress'], rows=updated)
+    # Only tasks this app submitted get their audio fetched; an unknown task_id writes nothing.
+    if updated and status == 'complete' and music_info['audio_urls']:
+        mirror.schedule(task_id, music_info['audio_urls'])
+    if status in TERMINAL_STATUSES:
+        with _waiters_lock:
+            waiter = _waiters.get(task_id)
+        if waiter:
+            waiter.music_info = music_info
+            waiter.event.set()
+    return updated
+
+
+def poll_stale(generations):
+    """
+    Fallback for missed callbacks on queued generations: poll Suno for the
+    processing rows among ``generations`` not updated for
+    SUNO_FALLBACK_POLL_INTERVAL seconds and record what it reports. Runs on
+    the status pool within SUNO_BATCH_DEADLINE; returns how many tasks were
+    polled, so callers know to re-read the rows.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.SUNO_FALLBACK_POLL_INTERVAL)
+    task_ids = list(dict.fromkeys(
+        generation.task_id for generation in generations
+        if generation.status == Generation.STATUS_PROCESSING and generation.task_id and generation.updated_at < cutoff
+    ))
+    if task_ids:
+        deadline_at = time.monotonic() + settings.SUNO_BATCH_DEADLINE
+        futures = submit_bounded(_poll_task, task_ids, deadline_at)
+        _, pending = wait(futures.values(), timeout=max(deadline_at - time.monotonic(), 0))
+        for future in pending:
+            future.cancel()
+    return len(task_ids)
+
+
+def _poll_task(task_id):
+    close_old_connections()
+    try:
+        api_response = cached_check_generation_status(task_id, timeout=settings.SUNO_BATCH_DEADLINE)
+        if api_response and 'error' not in api_response:
+            record_completion(task_id, extract_music_info(api_response))
+        else:
+            # Touch the rows so an erroring task is polled once per interval, not on every read.
+            Generation.objects.filter(task_id=task_id, status=Generation.STATUS_PROCESSING).update(updated_at=timezone.now())
+    except Exception as e:
+        logger.warning("Fallback poll for task %s failed: %s", task_id, e)
+    finally:
+        close_old_connections()
+
+
+def _completion_result(status, audio_urls, tracks, errors, started):
+    return {
+        'success': status == 'complete',
+        'status': status,
+        'audio_urls': audio_urls,
+        'tracks': tracks,
+        'errors': errors,
+        'elapsed': round(time.monotonic() - started, 1),
+    }
+
+
+def wait_for_completion(task_id, max_wait_time=300, fallback_interval=None):
+    """
+    Block until Suno reports the task as finished.
+
+    The callback view wakes waiters in this process immediately. When no
+    callback arrives the Generation row is re-read (another worker may have
+    received it) and Suno is polled once in case it was lost, first after
+    ``fallback_interval`` seconds and then with progress-driven backoff.
+    """
+    with stage('wait_completion', task_id=task_id):
+        return _wait_for_completion(task_id, max_wait_time, fallback_interval or settings.SUNO_FALLBACK_POLL_INTERVAL)
+
+
+def _wait_for_completion(task_id, max_wait_time, interval):
+    attempt, progress = 0, 0
+    started = time.monotonic()
+    with _waiters_lock:
+        waiter = _waiters.setdefault(task_id, _Waiter())
+    try:
+        while True:
+            if waiter.event.is_set():
+                info = waiter.music_info
+                return _completion_result(info['status'], info['audio_urls'], info['tracks'], info['errors'], started)
+
+            generation = Generation.objects.filter(task_id=task_id).first()
+            if generation and generation.status in Generation.TERMINAL_STATUSES:
+                errors = [generation.error] if generation.error else []
+                return _completion_result(generation.status, generation.audio_urls, generation.tracks, errors, started)
+
+            remaining = max_wait_time - (time.monotonic() - started)
+            if remaining <= 0:
+                return {
+                    'success': False,
+                    'status': generation.status if generation else 'pending',
+                    'error': f'Timed out after {max_wait_time} seconds',
+                    'audio_urls': [],
+                }
+            delay = interval if attempt == 0 else poll_delay(attempt, progress, interval, SUNO_POLL_MAX_INTERVAL)
+            attempt += 1
+            if waiter.event.wait(min(delay, remaining)):
+                continue
+
+            # No callback within the interval: poll once in case it was missed.
+            api_response = cached_check_generation_status(task_id)
+            if 'error' not in api_response:
+                music_info = extract_music_info(api_response)
+                progress = music_info['progress']
+                if music_info['status'] in TERMINAL_STATUSES:
+                    record_completion(task_id, music_info)
+    finally:
+        with _waiters_lock:
+            if _waiters.get(task_id) is waiter:
+                del _waiters[task_id]
@@ -0,0 +1,176 @@
+# api/metrics.py
+#
+# Minimal in-process metrics with Prometheus text exposition. Pipeline stages
+# are timed with `stage()`, which feeds a latency histogram and an in-flight
+# gauge and writes one structured log line per stage carrying the task or
+# generation id. Upstream responses are counted by service and status code.
+
+import json
+import time
+import logging
+import threading
+from types import SimpleNamespace
+from contextlib import contextmanager
+
+from . import deadlines
+
+logger = logging.getLogger('api.pipeline')
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key):
+    if not key:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in key)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(key, escaped)) + '}'
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    type = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation)
+        self.buckets = buckets
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            counts, total, count = self._values.get(key, ([0] * len(self.buckets), 0.0, 0))
+            counts = [c + (value <= bound) for c, bound in zip(counts, self.buckets)]
+            self._values[key] = (counts, total + value, count + 1)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        samples = []
+        for key, (counts, total, count) in items:
+            for bound, bucket_count in zip(self.buckets, counts):
+                samples.append((f'{self.name}_bucket', key + (('le', repr(float(bound))),), bucket_count))
+            samples.append((f'{self.name}_bucket', key + (('le', '+Inf'),), count))
+            samples.append((f'{self.name}_sum', key, total))
+            samples.append((f'{self.name}_count', key, count))
+        return samples
+
+
+REGISTRY = []
+# Callables returning [(name, type, help, [(labels_dict, value), ...]), ...] at scrape time.
+COLLECTORS = []
+
+STAGE_SECONDS = Histogram('lofi_stage_duration_seconds', 'Time spent in each pipeline stage.')
+STAGE_IN_FLIGHT = Gauge('lofi_stage_in_flight', 'Pipeline stages currently running.')
+STAGE_ERRORS = Counter('lofi_stage_errors_total', 'Pipeline stages that raised.')
+UPSTREAM_RESPONSES = Counter('lofi_upstream_responses_total', 'Responses from upstream APIs by status code.')
+UPSTREAM_IN_FLIGHT = Gauge('lofi_upstream_in_flight', 'Requests to upstream APIs awaiting a response.')
+PROMPTS = Counter('lofi_prompts_total', 'Image descriptions by source: gemini, local (fast mode) or fallback.')
+
+
+def register_collector(collector):
+    COLLECTORS.append(collector)
+    return collector
+
+
+@contextmanager
+def upstream(service):
+    """Track one upstream request; set ``.code`` on the yielded object to the HTTP status."""
+    call = SimpleNamespace(code=None)
+    UPSTREAM_IN_FLIGHT.inc(service=service)
+    try:
+        yield call
+    except BaseException as e:
+        # google.api_core errors carry the HTTP status as .code; transport errors have none.
+        call.code = call.code or getattr(e, 'code', None) or 'error'
+        raise
+    finally:
+        UPSTREAM_IN_FLIGHT.dec(service=service)
+        UPSTREAM_RESPONSES.inc(service=service, code=str(call.code))
+
+
+@contextmanager
+def stage(name, **context):
+    """
+    Time a pipeline stage; ``context`` (task_id, generation_id, ...) goes on
+    the log line. Raises DeadlineExceeded if the request deadline has passed
+    before the stage starts, or when the stage fails after it has passed
+    (typically an upstream timeout cut short by the deadline).
+    """
+    STAGE_IN_FLIGHT.inc(stage=name)
+    started = time.perf_counter()
+    outcome = 'ok'
+    try:
+        deadlines.check(name)
+        yield context
+    except BaseException as e:
+        outcome = 'error'
+        STAGE_ERRORS.inc(stage=name)
+        if isinstance(e, Exception) and not isinstance(e, deadlines.DeadlineExceeded) and deadlines.expired():
+            raise deadlines.DeadlineExceeded(f"Request deadline passed during {name}") from e
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_IN_FLIGHT.dec(stage=name)
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        log_event('stage', stage=name, outcome=outcome, duration_ms=round(elapsed * 1000, 2), **context)
+
+
+def log_event(event, **fields):
+    """Write one JSON log line; empty fields are dropped."""
+    fields = {key: value for key, value in fields.items() if value is not None and value != ''}
+    logger.info(json.dumps({'event': event, **fields}, default=str))
+
+
+def render():
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.type}')
+        for name, key, value in metric.samples():
+            lines.append(f'{name}{_format_labels(key)} {value}')
+    for collector in COLLECTORS:
+        for name, metric_type, documentation, samples in collector():
+            lines.append(f'# HELP {name} {documentation}')
+            lines.append(f'# TYPE {name} {metric_type}')
+            for labels, value in samples:
+                lines.append(f'{name}{_format_labels(_label_key(labels))} {value}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.4 on 2026-10-18 15:36
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Generation',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('describing', 'Describing image'), ('submitting', 'Submitting to Suno'), ('processing', 'Generating music'), ('complete', 'Complete'), ('failed', 'Failed')], default='queued', max_length=20)),
+                ('image_path', models.CharField(blank=True, max_length=500)),
+                ('prompt', models.TextField(blank=True)),
+                ('task_id', models.CharField(blank=True, db_index=True, max_length=100)),
+                ('initial_response', models.JSONField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.4 on 2026-10-18 15:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generation',
+            name='audio_urls',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='generation',
+            name='tracks',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.4 on 2026-10-18 15:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_generation_audio_urls_generation_tracks'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PromptCacheEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('image_sha256', models.CharField(max_length=64, unique=True)),
+                ('phash', models.CharField(blank=True, db_index=True, max_length=16)),
+                ('prompt', models.TextField()),
+                ('hit_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+    ]
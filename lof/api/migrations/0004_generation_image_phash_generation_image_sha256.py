@@ -0,0 +1,23 @@
+# Generated by Django 5.1.4 on 2026-10-18 15:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_promptcacheentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generation',
+            name='image_phash',
+            field=models.CharField(blank=True, max_length=16),
+        ),
+        migrations.AddField(
+            model_name='generation',
+            name='image_sha256',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.4 on 2026-10-18 15:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_generation_image_phash_generation_image_sha256'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MirroredTrack',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_url_sha256', models.CharField(max_length=64, unique=True)),
+                ('source_url', models.TextField()),
+                ('task_id', models.CharField(blank=True, db_index=True, max_length=100)),
+                ('status', models.CharField(choices=[('pending', 'Downloading'), ('ready', 'Ready'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('content_sha256', models.CharField(blank=True, db_index=True, max_length=64)),
+                ('content_type', models.CharField(blank=True, max_length=100)),
+                ('size', models.BigIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_accessed_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+    ]
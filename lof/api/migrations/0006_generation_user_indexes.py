@@ -0,0 +1,29 @@
+# Generated by Django 5.1.4 on 2026-10-18 15:58
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_mirroredtrack'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generation',
+            name='user',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='generations', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='generation',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='api_gen_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='generation',
+            index=models.Index(fields=['status', 'updated_at'], name='api_gen_status_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-18 15:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_generation_user_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generation',
+            name='batch_id',
+            field=models.UUIDField(blank=True, db_index=True, null=True),
+        ),
+    ]
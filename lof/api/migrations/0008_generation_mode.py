@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-18 16:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_generation_batch_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generation',
+            name='mode',
+            field=models.CharField(default='gemini', max_length=10),
+        ),
+    ]
@@ -0,0 +1,259 @@
+# api/mirror.py
+#
+# Optional local copy of finished Suno tracks. When AUDIO_MIRROR_ENABLED is
+# set, completed tasks have their audio downloaded in the background into a
+# content-addressed store under MEDIA_ROOT (<dir>/<sha[:2]>/<sha>). The store
+# is capped at AUDIO_MIRROR_MAX_BYTES; the least recently played tracks are
+# evicted first.
+
+import os
+import hashlib
+import logging
+import tempfile
+import threading
+from datetime import timedelta
+from urllib.parse import urljoin, urlsplit
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.urls import reverse
+from django.utils import timezone
+
+from .clients import get_mirror_session
+from .metrics import stage
+from .models import MirroredTrack
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+_evict_lock = threading.Lock()
+
+# Plays refresh last_accessed_at at most this often, so hot tracks don't write on every request.
+TOUCH_INTERVAL = timedelta(minutes=1)
+
+
+def enabled():
+    return settings.AUDIO_MIRROR_ENABLED
+
+
+def store_root():
+    return os.path.join(settings.MEDIA_ROOT, settings.AUDIO_MIRROR_DIR)
+
+
+def content_path(content_sha256):
+    return os.path.join(store_root(), content_sha256[:2], content_sha256)
+
+
+def _url_key(url):
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.AUDIO_MIRROR_WORKERS, thread_name_prefix='mirror')
+        return _executor
+
+
+def allowed_url(url):
+    """Whether ``url`` is an https URL on one of AUDIO_MIRROR_ALLOWED_HOSTS (``.example.com`` matches subdomains)."""
+    try:
+        parts = urlsplit(url)
+        host = (parts.hostname or '').lower()
+    except ValueError:
+        return False
+    if parts.scheme != 'https' or not host:
+        return False
+    return any(
+        host == allowed or (allowed.startswith('.') and host.endswith(allowed))
+        for allowed in settings.AUDIO_MIRROR_ALLOWED_HOSTS
+    )
+
+
+def schedule(task_id, audio_urls):
+    """
+    Queue downloads for ``audio_urls`` that are not already mirrored or in
+    progress. URLs off the Suno CDN allow-list are skipped, so a forged task
+    update cannot make the server fetch internal addresses.
+    """
+    if not enabled():
+        return 0
+    queued = 0
+    for url in audio_urls:
+        if not allowed_url(url):
+            logger.warning("Not mirroring %s: host is not in AUDIO_MIRROR_ALLOWED_HOSTS", url)
+            continue
+        track, created = MirroredTrack.objects.get_or_create(
+            source_url_sha256=_url_key(url),
+            defaults={'source_url': url, 'task_id': task_id},
+        )
+        if not created:
+            # Retry failures; anything pending or ready is already handled.
+            if MirroredTrack.objects.filter(pk=track.pk, status=MirroredTrack.STATUS_FAILED).update(
+                    status=MirroredTrack.STATUS_PENDING, error='') == 0:
+                continue
+        _get_executor().submit(download, track.pk)
+        queued += 1
+    return queued
+
+
+def download(track_pk):
+    """Stream one track into the store, hashing as it goes, then enforce the disk budget."""
+    close_old_connections()
+    try:
+        track = MirroredTrack.objects.get(pk=track_pk)
+        try:
+            with stage('mirror_download', task_id=track.task_id):
+                digest, size, content_type = _fetch(track.source_url)
+        except Exception as e:
+            logger.warning("Mirroring %s failed: %s", track.source_url, e)
+            MirroredTrack.objects.filter(pk=track_pk).update(status=MirroredTrack.STATUS_FAILED, error=str(e))
+            return
+        MirroredTrack.objects.filter(pk=track_pk).update(
+            status=MirroredTrack.STATUS_READY,
+            content_sha256=digest,
+            content_type=content_type,
+            size=size,
+            last_accessed_at=timezone.now(),
+        )
+        enforce_budget()
+    finally:
+        close_old_connections()
+
+
+def _open(url, max_redirects=5):
+    # Redirects are followed by hand so every hop is checked against the allow-list.
+    for _ in range(max_redirects + 1):
+        if not allowed_url(url):
+            raise ValueError(f'{url} is not in AUDIO_MIRROR_ALLOWED_HOSTS')
+        response = get_mirror_session().get(url, stream=True, timeout=settings.AUDIO_MIRROR_TIMEOUT, allow_redirects=False)
+        if not response.is_redirect:
+            return response
+        url = urljoin(url, response.headers['Location'])
+        response.close()
+    raise ValueError('Too many redirects')
+
+
+def _fetch(url):
+    os.makedirs(store_root(), exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    handle, temp_path = tempfile.mkstemp(dir=store_root(), suffix='.part')
+    try:
+        with os.fdopen(handle, 'wb') as out, _open(url) as response:
+            response.raise_for_status()
+            content_type = response.headers.get('Content-Type', 'audio/mpeg').split(';')[0]
+            for chunk in response.iter_content(chunk_size=256 * 1024):
+                out.write(chunk)
+                digest.update(chunk)
+                size += len(chunk)
+                if size > settings.AUDIO_MIRROR_MAX_BYTES:
+                    raise ValueError('Track is larger than the whole mirror budget')
+        sha = digest.hexdigest()
+        path = content_path(sha)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Identical audio behind a different URL is already on disk; keep one copy.
+        if os.path.exists(path):
+            os.remove(temp_path)
+        else:
+            os.replace(temp_path, path)
+        return sha, size, content_type
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def enforce_budget():
+    """Delete the least recently played tracks until the store fits AUDIO_MIRROR_MAX_BYTES."""
+    ready = MirroredTrack.objects.filter(status=MirroredTrack.STATUS_READY)
+    with _evict_lock:
+        total = _disk_bytes(ready)
+        if total <= settings.AUDIO_MIRROR_MAX_BYTES:
+            return 0
+        evicted = 0
+        for track in ready.order_by('last_accessed_at').iterator():
+            if total <= settings.AUDIO_MIRROR_MAX_BYTES:
+                break
+            track.delete()
+            if not ready.filter(content_sha256=track.content_sha256).exists():
+                try:
+                    os.remove(content_path(track.content_sha256))
+                except FileNotFoundError:
+                    pass
+                total -= track.size
+            evicted += 1
+        return evicted
+
+
+def _disk_bytes(ready):
+    # Rows sharing a content hash share one file.
+    return sum(dict(ready.values_list('content_sha256', 'size')).values())
+
+
+def find(content_sha256):
+    """The ready track for a content hash, touching its LRU timestamp; ``None`` if evicted."""
+    track = (
+        MirroredTrack.objects
+        .filter(content_sha256=content_sha256, status=MirroredTrack.STATUS_READY)
+        .order_by('-last_accessed_at')
+        .first()
+    )
+    if track is None or not os.path.exists(content_path(content_sha256)):
+        return None
+    now = timezone.now()
+    if track.last_accessed_at < now - TOUCH_INTERVAL:
+        MirroredTrack.objects.filter(pk=track.pk).update(last_accessed_at=now)
+    return track
+
+
+def byte_range(header, size):
+    """
+    Inclusive ``(start, end)`` for a single ``bytes=`` Range header, ``None``
+    to send the whole file, or ``False`` when the range cannot be satisfied.
+    """
+    if not header or not header.startswith('bytes=') or ',' in header:
+        return None
+    first, _, last = header[len('bytes='):].strip().partition('-')
+    try:
+        if not first:
+            suffix = int(last)
+            return (max(size - suffix, 0), size - 1) if suffix > 0 and size else False
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        return False
+    return start, end
+
+
+def iter_range(handle, length, chunk_size=64 * 1024):
+    """Yield ``length`` bytes from the current position of ``handle``, then close it."""
+    try:
+        while length > 0:
+            chunk = handle.read(min(chunk_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        handle.close()
+
+
+def local_urls(audio_urls):
+    """Mirror URLs aligned with ``audio_urls``; ``None`` where a track is not (yet) mirrored."""
+    if not enabled() or not audio_urls:
+        return None
+    ready = dict(
+        MirroredTrack.objects
+        .filter(source_url_sha256__in=[_url_key(url) for url in audio_urls], status=MirroredTrack.STATUS_READY)
+        .values_list('source_url_sha256', 'content_sha256')
+    )
+    return [
+        reverse('mirrored-audio', args=[ready[_url_key(url)]]) if _url_key(url) in ready else None
+        for url in audio_urls
+    ]
@@ -1,3 +1,111 @@
+import uuid
+
+from django.conf import settings
 from django.db import models
 
-# Create your models here.
+
+class Generation(models.Model):
+    """One image-to-lofi generation, tracked through the background pipeline."""
+
+    STATUS_QUEUED = 'queued'
+    STATUS_DESCRIBING = 'describing'
+    STATUS_SUBMITTING = 'submitting'
+    STATUS_PROCESSING = 'processing'
+    STATUS_COMPLETE = 'complete'
+    STATUS_FAILED = 'failed'
+    TERMINAL_STATUSES = (STATUS_COMPLETE, STATUS_FAILED)
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_DESCRIBING, 'Describing image'),
+        (STATUS_SUBMITTING, 'Submitting to Suno'),
+        (STATUS_PROCESSING, 'Generating music'),
+        (STATUS_COMPLETE, 'Complete'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL,
+        related_name='generations', db_index=False,  # covered by the (user, created_at) index
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    batch_id = models.UUIDField(null=True, blank=True, db_index=True)
+    image_path = models.CharField(max_length=500, blank=True)
+    image_sha256 = models.CharField(max_length=64, blank=True)
+    image_phash = models.CharField(max_length=16, blank=True)
+    prompt = models.TextField(blank=True)
+    mode = models.CharField(max_length=10, default='gemini')  # prompt mode, one of api.utils.PROMPT_MODES
+    task_id = models.CharField(max_length=100, blank=True, db_index=True)
+    initial_response = models.JSONField(null=True, blank=True)
+    audio_urls = models.JSONField(default=list, blank=True)
+    tracks = models.JSONField(default=list, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # History pages: one user's generations, newest first.
+            models.Index(fields=['user', '-created_at', '-id'], name='api_gen_user_created_idx'),
+            # Sweeps over stale in-flight rows: status filter, oldest update first.
+            models.Index(fields=['status', 'updated_at'], name='api_gen_status_updated_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.id} ({self.status})"
+
+    def to_dict(self):
+        return {
+            'generation_id': str(self.id),
+            'status': self.status,
+            'batch_id': str(self.batch_id) if self.batch_id else None,
+            'task_id': self.task_id or None,
+            'generated_prompt': self.prompt or None,
+            'mode': self.mode,
+            'audio_urls': self.audio_urls,
+            'image_sha256': self.image_sha256 or None,
+            'error': self.error or None,
+            'created_at': self.created_at.isoformat(),
+            'updated_at': self.updated_at.isoformat(),
+        }
+
+
+class PromptCacheEntry(models.Model):
+    """A Gemini description stored against the hashes of the image it describes."""
+
+    image_sha256 = models.CharField(max_length=64, unique=True)
+    phash = models.CharField(max_length=16, blank=True, db_index=True)
+    prompt = models.TextField()
+    hit_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return self.image_sha256
+
+
+class MirroredTrack(models.Model):
+    """A Suno track copied into the local audio store, addressed by the SHA-256 of its bytes."""
+
+    STATUS_PENDING = 'pending'
+    STATUS_READY = 'ready'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Downloading'),
+        (STATUS_READY, 'Ready'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    source_url_sha256 = models.CharField(max_length=64, unique=True)
+    source_url = models.TextField()
+    task_id = models.CharField(max_length=100, blank=True, db_index=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    content_sha256 = models.CharField(max_length=64, blank=True, db_index=True)
+    content_type = models.CharField(max_length=100, blank=True)
+    size = models.BigIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_accessed_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.content_sha256 or self.source_url} ({self.status})"
@@ -0,0 +1,145 @@
+# api/mood.py
+#
+# Local, CPU-only stand-in for the Gemini description. A small thumbnail of
+# the image is reduced with NumPy to a handful of features (brightness,
+# saturation, contrast, warmth and a hue histogram); the nearest mood preset
+# and the dominant colours fill a lofi prompt template. It takes a few
+# milliseconds and needs no network, so it backs the "fast" prompt mode and
+# the fallback used when Gemini fails or misses its latency budget.
+
+from .metrics import stage
+
+# Features are computed on a thumbnail no larger than this on its long side.
+THUMBNAIL_EDGE = 128
+
+# Twelve 30-degree hue bins, the first centred on red.
+HUE_NAMES = (
+    'red', 'orange', 'yellow', 'lime', 'green', 'teal',
+    'cyan', 'sky blue', 'blue', 'violet', 'magenta', 'pink',
+)
+
+# Centroids over (brightness, saturation, contrast, warmth); see image_features().
+MOODS = {
+    'sunny': {
+        'centroid': (0.70, 0.50, 0.20, 0.15),
+        'feel': 'bright, carefree and upbeat',
+        'sound': 'warm Rhodes chords, a bouncy bass line and crisp swung drums',
+        'bpm': 90,
+    },
+    'golden': {
+        'centroid': (0.55, 0.45, 0.20, 0.25),
+        'feel': 'warm, nostalgic golden-hour',
+        'sound': 'mellow jazz guitar, dusty vinyl crackle and soft brushed drums',
+        'bpm': 80,
+    },
+    'calm': {
+        'centroid': (0.65, 0.20, 0.15, -0.02),
+        'feel': 'calm, airy and peaceful',
+        'sound': 'gentle piano, soft pads and a slow laid-back beat',
+        'bpm': 72,
+    },
+    'rainy': {
+        'centroid': (0.40, 0.15, 0.12, -0.08),
+        'feel': 'melancholic, introspective and rainy',
+        'sound': 'muted piano, rain ambience, tape hiss and a sleepy kick',
+        'bpm': 70,
+    },
+    'night': {
+        'centroid': (0.15, 0.30, 0.15, -0.08),
+        'feel': 'late-night, dreamy and quiet',
+        'sound': 'deep sub bass, hazy synth chords and lazy swung drums',
+        'bpm': 65,
+    },
+    'cinematic': {
+        'centroid': (0.35, 0.35, 0.30, 0.02),
+        'feel': 'moody and cinematic',
+        'sound': 'jazzy minor chords, a heavy muffled kick and distant string swells',
+        'bpm': 75,
+    },
+}
+# Typical spread of each feature, so no single one dominates the distance.
+FEATURE_SCALE = (0.25, 0.20, 0.10, 0.15)
+
+
+def image_features(source):
+    """Mood and palette features of a path or file object, each roughly in 0..1 (warmth in -1..1)."""
+    import numpy as np
+    from PIL import Image  # loaded lazily, see api.clients
+
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    with Image.open(source) as img:
+        img.draft('RGB', (THUMBNAIL_EDGE * 2, THUMBNAIL_EDGE * 2))
+        img = img.convert('RGB')
+        img.thumbnail((THUMBNAIL_EDGE, THUMBNAIL_EDGE))
+        rgb = np.asarray(img, dtype=np.float32).reshape(-1, 3) / 255.0
+    if hasattr(source, 'seek'):
+        source.seek(0)
+
+    red, green, blue = rgb[:, 0], rgb[:, 1], rgb[:, 2]
+    value = rgb.max(axis=1)
+    chroma = value - rgb.min(axis=1)
+    saturation = np.divide(chroma, value, out=np.zeros_like(chroma), where=value > 0)
+    luma = 0.299 * red + 0.587 * green + 0.114 * blue
+
+    # Hue in [0, 6) per pixel; grey pixels get 0 but carry no chroma weight below.
+    safe_chroma = np.where(chroma > 0, chroma, 1.0)
+    hue = np.select(
+        [value == red, value == green],
+        [((green - blue) / safe_chroma) % 6, (blue - red) / safe_chroma + 2],
+        (red - green) / safe_chroma + 4,
+    )
+    bins = (hue * 2 + 0.5).astype(np.int64) % len(HUE_NAMES)
+    histogram = np.bincount(bins, weights=chroma, minlength=len(HUE_NAMES))
+    chromatic = histogram.sum()
+
+    return {
+        'brightness': float(luma.mean()),
+        'saturation': float(saturation.mean()),
+        'contrast': float(luma.std()),
+        'warmth': float((red - blue).mean()),
+        'colorfulness': float(chroma.mean()),
+        'hue_histogram': (histogram / chromatic).tolist() if chromatic else [0.0] * len(HUE_NAMES),
+    }
+
+
+def classify_mood(features):
+    """Name of the ``MOODS`` preset nearest to ``features``."""
+    import numpy as np
+
+    names = list(MOODS)
+    centroids = np.array([MOODS[name]['centroid'] for name in names])
+    point = np.array([features['brightness'], features['saturation'], features['contrast'], features['warmth']])
+    distances = (((centroids - point) / np.array(FEATURE_SCALE)) ** 2).sum(axis=1)
+    return names[int(distances.argmin())]
+
+
+def palette(features, limit=2):
+    """Short palette description, e.g. ``'muted teal and blue'``."""
+    if features['colorfulness'] < 0.04:
+        return 'black and white' if features['contrast'] > 0.25 else 'soft grey'
+    shares = features['hue_histogram']
+    top = sorted(range(len(shares)), key=shares.__getitem__, reverse=True)[:limit]
+    colors = [HUE_NAMES[index] for index in top if shares[index] >= 0.15] or [HUE_NAMES[top[0]]]
+    if features['saturation'] < 0.2:
+        tone = 'pastel' if features['brightness'] > 0.6 else 'muted'
+    elif features['saturation'] > 0.5:
+        tone = 'vivid'
+    else:
+        tone = 'warm' if features['warmth'] > 0.1 else 'cool' if features['warmth'] < -0.05 else 'soft'
+    return f"{tone} {' and '.join(colors)}"
+
+
+def local_lofi_prompt(source):
+    """A Suno prompt for the image built from its features alone, without calling Gemini."""
+    with stage('local_describe') as span:
+        features = image_features(source)
+        mood = classify_mood(features)
+        span['mood'] = mood
+        preset = MOODS[mood]
+        texture = ' with strong light and shadow' if features['contrast'] > 0.25 else ''
+        sound = preset['sound'][0].upper() + preset['sound'][1:]
+        return (
+            f"A {preset['feel']} lofi hip hop track inspired by a picture in {palette(features)} tones{texture}. "
+            f"{sound}, around {preset['bpm']} BPM, relaxed and instrumental."
+        )
@@ -0,0 +1,171 @@
+# api/prompt_cache.py
+#
+# Persistent cache of Gemini descriptions. Entries are keyed by the SHA-256 of
+# the uploaded bytes; a 64-bit difference hash (dHash) of the picture lets
+# re-encoded or resized copies reuse a description too. The table is bounded
+# by PROMPT_CACHE_MAX_ENTRIES and evicts the least recently used rows.
+
+import os
+import hashlib
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .async_utils import lofi_prompt_async
+from .metrics import stage, register_collector
+from .models import PromptCacheEntry
+from .utils import lofi_prompt
+
+_stats = {'exact_hits': 0, 'near_hits': 0, 'misses': 0}
+_stats_lock = threading.Lock()
+
+
+def _open(source):
+    if isinstance(source, (str, os.PathLike)):
+        return open(source, 'rb')
+    source.seek(0)
+    return source
+
+
+def sha256_of(source):
+    handle = _open(source)
+    try:
+        digest = hashlib.sha256()
+        for chunk in iter(lambda: handle.read(64 * 1024), b''):
+            digest.update(chunk)
+        return digest.hexdigest()
+    finally:
+        if handle is not source:
+            handle.close()
+        elif hasattr(source, 'seek'):
+            source.seek(0)
+
+
+def dhash_of(source):
+    """64-bit difference hash of the image as 16 hex digits."""
+    from PIL import Image  # loaded lazily, see api.clients
+
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    with Image.open(source) as img:
+        img.draft('L', (64, 64))
+        pixels = list(img.convert('L').resize((9, 8), Image.BILINEAR).getdata())
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            bits = (bits << 1) | (left > pixels[row * 9 + col + 1])
+    return f'{bits:016x}'
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def _nearest(phash):
+    max_distance = settings.PROMPT_CACHE_PHASH_DISTANCE
+    if not phash or max_distance <= 0:
+        return None
+    target = int(phash, 16)
+    # Flat or featureless pictures hash to nearly all-0 or all-1 bits and
+    # would match each other; only trust hashes with some structure.
+    if not 8 <= target.bit_count() <= 56:
+        return None
+    best_pk, best_distance = None, max_distance + 1
+    # The table is bounded, so a scan of the hashes stays cheap.
+    for pk, candidate in PromptCacheEntry.objects.exclude(phash='').values_list('pk', 'phash').iterator():
+        distance = (target ^ int(candidate, 16)).bit_count()
+        if distance < best_distance:
+            best_pk, best_distance = pk, distance
+    return best_pk
+
+
+def lookup(image_sha256, phash=''):
+    entry = PromptCacheEntry.objects.filter(image_sha256=image_sha256).first()
+    kind = 'exact_hits'
+    if entry is None:
+        pk = _nearest(phash)
+        entry = PromptCacheEntry.objects.filter(pk=pk).first() if pk else None
+        kind = 'near_hits'
+    if entry is None:
+        _count('misses')
+        return None
+    _count(kind)
+    PromptCacheEntry.objects.filter(pk=entry.pk).update(hit_count=F('hit_count') + 1, last_used_at=timezone.now())
+    return entry.prompt
+
+
+def store(image_sha256, phash, prompt):
+    PromptCacheEntry.objects.update_or_create(
+        image_sha256=image_sha256,
+        defaults={'phash': phash, 'prompt': prompt, 'last_used_at': timezone.now()},
+    )
+    overflow = PromptCacheEntry.objects.count() - settings.PROMPT_CACHE_MAX_ENTRIES
+    if overflow > 0:
+        stale = PromptCacheEntry.objects.order_by('last_used_at').values_list('pk', flat=True)[:overflow]
+        PromptCacheEntry.objects.filter(pk__in=list(stale)).delete()
+
+
+def image_digests(source):
+    """``(sha256, dhash)`` of a path or file object, streamed rather than read whole."""
+    with stage('hash'):
+        image_sha256 = sha256_of(source)
+        try:
+            phash = dhash_of(source)
+        except OSError:
+            phash = ''
+    return image_sha256, phash
+
+
+def describe_image(source, digests=None, mode='gemini'):
+    """
+    ``lofi_prompt`` for ``source``, reusing a cached description when one
+    matches. Only Gemini descriptions are stored; local ones are cheap to redo.
+    """
+    image_sha256, phash = digests or image_digests(source)
+    prompt = lookup(image_sha256, phash)
+    if prompt is None:
+        prompt, origin = lofi_prompt(source, mode)
+        if origin == 'gemini':
+            store(image_sha256, phash, prompt)
+    return prompt
+
+
+def stats():
+    with _stats_lock:
+        counts = dict(_stats)
+    lookups = sum(counts.values())
+    hits = counts['exact_hits'] + counts['near_hits']
+    return {
+        **counts,
+        'entries': PromptCacheEntry.objects.count(),
+        'max_entries': settings.PROMPT_CACHE_MAX_ENTRIES,
+        'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+    }
+
+
+@register_collector
+def _prompt_cache_metrics():
+    summary = stats()
+    return [
+        ('lofi_prompt_cache_lookups_total', 'counter', 'Prompt cache lookups by result.',
+         [({'result': name}, summary[name]) for name in ('exact_hits', 'near_hits', 'misses')]),
+        ('lofi_prompt_cache_entries', 'gauge', 'Descriptions stored in the prompt cache.', [({}, summary['entries'])]),
+    ]
+
+
+async def adescribe_image(source, digests=None, mode='gemini'):
+    """Async ``describe_image``: hashing in a worker thread, Gemini on the event loop."""
+    image_sha256, phash = digests or await sync_to_async(image_digests, thread_sensitive=False)(source)
+    prompt = await sync_to_async(lookup)(image_sha256, phash)
+    if prompt is None:
+        prompt, origin = await lofi_prompt_async(source, mode)
+        if origin == 'gemini':
+            await sync_to_async(store)(image_sha256, phash, prompt)
+    return prompt
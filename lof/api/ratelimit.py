@@ -0,0 +1,113 @@
+# api/ratelimit.py
+#
+# Process-wide token bucket in front of every outbound Suno call, plus the
+# backoff used between status polls. Callers reserve a token and sleep until
+# it is theirs, so a burst of workers queues behind the bucket instead of
+# hitting Suno at once. A 429 with Retry-After pauses the whole bucket:
+# no tokens accrue during the pause and queued callers resume one token
+# interval apart after it, rather than all at once.
+
+import os
+import time
+import random
+import asyncio
+import threading
+from email.utils import parsedate_to_datetime
+
+
+class RateLimited(RuntimeError):
+    """The limiter could not grant a token within the caller's time budget."""
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        # Nothing accrues while paused, so refill from the later of the last update and the pause end.
+        elapsed = max(now - max(self._updated, self._paused_until), 0.0)
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._updated = now
+
+    def _reserve(self, max_wait=None):
+        """Take a token and return how long to wait for it, or None if that exceeds ``max_wait``."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = max(self._paused_until - now, 0.0) + max((1 - self._tokens) / self.rate, 0.0)
+            if max_wait is not None and wait > max_wait:
+                return None
+            self._tokens -= 1
+            return wait
+
+    def acquire(self, max_wait=None):
+        wait = self._reserve(max_wait)
+        if wait is None:
+            return False
+        if wait:
+            time.sleep(wait)
+        return True
+
+    async def acquire_async(self, max_wait=None):
+        wait = self._reserve(max_wait)
+        if wait is None:
+            return False
+        if wait:
+            await asyncio.sleep(wait)
+        return True
+
+    def pause(self, seconds):
+        """
+        Hold every caller back for ``seconds`` (an upstream Retry-After). The
+        saved-up burst is dropped too: one call may go when the pause ends,
+        the rest follow at ``rate``.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens = min(self._tokens, 1.0)
+            self._paused_until = max(self._paused_until, now + seconds)
+
+
+def parse_retry_after(value, default=1.0):
+    if not value:
+        return default
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return default
+
+
+def poll_interval(attempt, progress=0, base=5.0, cap=60.0):
+    """``poll_delay`` without the jitter: exponential in the attempt, shortened as progress grows."""
+    remaining = max(1 - (progress or 0) / 100, 0.25)
+    return min(cap, base * (2 ** attempt)) * remaining
+
+
+def poll_delay(attempt, progress=0, base=5.0, cap=60.0):
+    """
+    Seconds to wait before status poll number ``attempt`` (0-based).
+
+    Exponential in the attempt, shortened as Suno reports more progress, and
+    jittered between half and the full value so pollers drift apart.
+    """
+    delay = poll_interval(attempt, progress, base, cap)
+    return random.uniform(delay / 2, delay)
+
+
+SUNO_MAX_RETRIES = int(os.getenv("SUNO_MAX_RETRIES", 3))
+SUNO_POLL_MAX_INTERVAL = float(os.getenv("SUNO_POLL_MAX_INTERVAL", 60))
+
+suno_limiter = TokenBucket(
+    rate=float(os.getenv("SUNO_RATE_LIMIT", 5)),
+    capacity=int(os.getenv("SUNO_RATE_BURST", 10)),
+)
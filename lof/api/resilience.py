@@ -0,0 +1,200 @@
+# api/resilience.py
+#
+# Circuit breakers and hedging support for the upstream calls in api/utils.py
+# and api/async_utils.py. Each upstream has a breaker that watches the
+# outcome of recent calls: once too many of them fail it opens and calls are
+# refused straight away (CircuitOpen) instead of tying up workers on a
+# service that is down; after a cool-down one trial call is let through and
+# its outcome closes or re-opens the circuit. LatencyTracker keeps recent
+# Gemini latencies so the describe step can send a hedged second request
+# when the first one runs past the p95.
+
+import os
+import math
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+from .metrics import Counter, register_collector
+
+BREAKER_REJECTIONS = Counter('lofi_circuit_rejections_total', 'Upstream calls refused because the circuit was open.')
+HEDGES = Counter('lofi_hedged_requests_total', 'Hedged second requests sent, and how many answered first.')
+
+CLOSED, HALF_OPEN, OPEN = 'closed', 'half_open', 'open'
+
+
+class CircuitOpen(RuntimeError):
+    """The upstream's circuit is open; no call was made."""
+
+    def __init__(self, service, retry_after):
+        super().__init__(f"{service} is unavailable; not retrying for {math.ceil(retry_after)} s")
+        self.service = service
+        self.retry_after = retry_after
+
+
+def is_upstream_failure(error):
+    """
+    Whether an exception says the upstream is unhealthy. Client errors (4xx
+    other than 408) are the caller's fault and do not count.
+    """
+    code = getattr(error, 'code', None)
+    if isinstance(code, int) and 400 <= code < 500 and code != 408:
+        return False
+    return isinstance(error, Exception)
+
+
+class CircuitBreaker:
+    def __init__(self, service, failure_ratio, min_calls, window, cooldown):
+        self.service = service
+        self.failure_ratio = failure_ratio
+        self.min_calls = min_calls
+        self.window = window
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self._results = deque()  # (monotonic time, failed) for calls in the last ``window`` seconds
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def _open(self, now):
+        self.state = OPEN
+        self._opened_at = now
+        self._results.clear()
+
+    def allow(self):
+        """Raise CircuitOpen unless a call may go ahead now."""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == OPEN:
+                wait = self._opened_at + self.cooldown - now
+                if wait > 0:
+                    BREAKER_REJECTIONS.inc(service=self.service)
+                    raise CircuitOpen(self.service, wait)
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN:
+                if self._trial_running:
+                    BREAKER_REJECTIONS.inc(service=self.service)
+                    raise CircuitOpen(self.service, 1)
+                self._trial_running = True
+
+    def record(self, failed):
+        """Outcome of an allowed call; ``None`` when it ended without a verdict (e.g. cancelled)."""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == HALF_OPEN:
+                self._trial_running = False
+                if failed:
+                    self._open(now)
+                elif failed is not None:
+                    self.state = CLOSED
+                return
+            if failed is None or self.state != CLOSED:
+                return
+            self._results.append((now, failed))
+            while self._results and self._results[0][0] <= now - self.window:
+                self._results.popleft()
+            failures = sum(1 for _, result in self._results if result)
+            if len(self._results) >= self.min_calls and failures / len(self._results) >= self.failure_ratio:
+                self._open(now)
+
+    @contextmanager
+    def guard(self):
+        """
+        Check the circuit, then record how the block went. Exceptions count
+        as failures per ``is_upstream_failure``; set ``.failed`` on the
+        yielded object for failures that do not raise (a 5xx response).
+        """
+        self.allow()
+        call = SimpleNamespace(failed=False)
+        try:
+            yield call
+        except BaseException as e:
+            self.record(is_upstream_failure(e) if isinstance(e, Exception) else None)
+            raise
+        self.record(call.failed)
+
+
+class LatencyTracker:
+    """Recent successful call latencies, and a budget for hedged requests."""
+
+    def __init__(self, size=200, min_samples=20, max_hedge_ratio=0.1):
+        self.min_samples = min_samples
+        self.max_hedge_ratio = max_hedge_ratio
+        self._samples = deque(maxlen=size)
+        self._hedged = deque(maxlen=size)  # whether each recent call was hedged
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def quantile(self, q):
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+    def hedge_allowed(self):
+        """Whether one more hedge keeps recent hedged calls within ``max_hedge_ratio`` of all calls."""
+        with self._lock:
+            return sum(self._hedged) + 1 <= self.max_hedge_ratio * (len(self._hedged) + 1)
+
+    def note_call(self, hedged):
+        with self._lock:
+            self._hedged.append(hedged)
+
+
+def _setting(name, default):
+    """A Django setting; the api.utils CLI runs without settings and reads the same name from the environment."""
+    from django.conf import settings
+    from django.core.exceptions import ImproperlyConfigured
+
+    try:
+        return getattr(settings, name)
+    except ImproperlyConfigured:
+        value = os.getenv(name)
+        if value is None:
+            return default
+        if isinstance(default, bool):
+            return value.lower() in ('1', 'true', 'yes')
+        return type(default)(value)
+
+
+def _breaker(service):
+    prefix = service.upper()
+    return CircuitBreaker(
+        service,
+        failure_ratio=_setting(f"{prefix}_BREAKER_FAILURE_RATIO", 0.5),
+        min_calls=_setting(f"{prefix}_BREAKER_MIN_CALLS", 10),
+        window=_setting(f"{prefix}_BREAKER_WINDOW", 30.0),
+        cooldown=_setting(f"{prefix}_BREAKER_COOLDOWN", 30.0),
+    )
+
+
+gemini_breaker = _breaker('gemini')
+suno_breaker = _breaker('suno')
+BREAKERS = (gemini_breaker, suno_breaker)
+
+GEMINI_HEDGE_ENABLED = _setting("GEMINI_HEDGE_ENABLED", True)
+GEMINI_HEDGE_QUANTILE = _setting("GEMINI_HEDGE_QUANTILE", 0.95)
+GEMINI_HEDGE_MIN_DELAY = _setting("GEMINI_HEDGE_MIN_DELAY", 1.0)
+gemini_latency = LatencyTracker(max_hedge_ratio=_setting("GEMINI_HEDGE_MAX_RATIO", 0.1))
+
+
+def gemini_hedge_delay():
+    """Seconds to wait for a Gemini describe before hedging it, or None to not hedge."""
+    if not GEMINI_HEDGE_ENABLED:
+        return None
+    threshold = gemini_latency.quantile(GEMINI_HEDGE_QUANTILE)
+    return None if threshold is None else max(threshold, GEMINI_HEDGE_MIN_DELAY)
+
+
+@register_collector
+def _breaker_metrics():
+    return [
+        ('lofi_circuit_open', 'gauge', 'Whether the circuit for an upstream is open (1), half open (0.5) or closed (0).',
+         [({'service': breaker.service}, {CLOSED: 0, HALF_OPEN: 0.5, OPEN: 1}[breaker.state]) for breaker in BREAKERS]),
+    ]
@@ -0,0 +1,137 @@
+# api/singleflight.py
+#
+# Coalesces identical generations that are in flight at the same time. The
+# first request for a key (image SHA-256 plus generation parameters) runs the
+# describe-and-submit pipeline; identical requests arriving meanwhile wait
+# for it and share its prompt and Suno task id instead of spending Gemini and
+# Suno quota again. A successful result is kept for SINGLE_FLIGHT_LINGER
+# seconds so a double submit landing just after the first one finished is
+# answered too. Failures are passed to the waiters and never kept. Calls are
+# tracked with concurrent.futures.Future, so sync and async views share them.
+# A waiter stops waiting when its own request deadline passes. Per process,
+# like the other in-memory caches.
+
+import time
+import asyncio
+import threading
+from concurrent.futures import Future, wait
+
+from django.conf import settings
+
+from . import deadlines
+from .metrics import register_collector
+
+
+def generation_key(image_sha256, mode):
+    """Key for a describe-and-submit run; the Suno parameters other than the prompt are fixed."""
+    return f'{image_sha256}:{mode}'
+
+
+def _time_left():
+    left = deadlines.remaining()
+    return None if left is None else max(left, 0)
+
+
+def _waited_too_long():
+    return deadlines.DeadlineExceeded('Request deadline passed waiting for a coalesced generation')
+
+
+class SingleFlight:
+    def __init__(self, linger):
+        self.linger = linger
+        self._calls = {}  # key -> (Future, expires_at, or None while running)
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.shared = 0
+
+    def _join(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._calls.get(key)
+            if entry is not None and (entry[1] is None or entry[1] > now):
+                self.shared += 1
+                return entry[0], False
+            future = Future()
+            # A running future cannot be cancelled, so a waiter that goes away
+            # (asyncio.wrap_future forwards cancellation) leaves it to the others.
+            future.set_running_or_notify_cancel()
+            self._calls[key] = (future, None)
+            self.leaders += 1
+            return future, True
+
+    def _finish(self, key, future, result=None, error=None):
+        now = time.monotonic()
+        with self._lock:
+            if error is None and self.linger > 0:
+                self._calls[key] = (future, now + self.linger)
+            else:
+                self._calls.pop(key, None)
+            expired = [name for name, (_, expires_at) in self._calls.items() if expires_at is not None and expires_at <= now]
+            for name in expired:
+                del self._calls[name]
+        if error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(error)
+
+    def do(self, key, fn):
+        """Run ``fn()`` unless a call for ``key`` is already running; return ``(result, shared)``."""
+        future, leader = self._join(key)
+        if not leader:
+            if not wait([future], timeout=_time_left()).done:
+                raise _waited_too_long()
+            return future.result(), True
+        try:
+            result = fn()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result, False
+
+    async def ado(self, key, coroutine_fn):
+        """
+        Async ``do``. The leader's coroutine runs as its own task, so waiters
+        still get a result if the leading request is cancelled.
+        """
+        future, leader = self._join(key)
+        if not leader:
+            shared = asyncio.wrap_future(future)
+            done, _ = await asyncio.wait([shared], timeout=_time_left())
+            if not done:
+                shared.cancel()  # only detaches this waiter; the running future is not cancelled
+                raise _waited_too_long()
+            return shared.result(), True
+
+        def settle(task):
+            if task.cancelled():
+                self._finish(key, future, error=RuntimeError('Coalesced generation was cancelled'))
+            elif task.exception() is not None:
+                self._finish(key, future, error=task.exception())
+            else:
+                self._finish(key, future, task.result())
+
+        task = asyncio.ensure_future(coroutine_fn())
+        task.add_done_callback(settle)
+        return await asyncio.shield(task), False
+
+    def stats(self):
+        with self._lock:
+            return {
+                'in_flight': sum(1 for _, expires_at in self._calls.values() if expires_at is None),
+                'leaders': self.leaders,
+                'shared': self.shared,
+            }
+
+
+generation_flight = SingleFlight(settings.SINGLE_FLIGHT_LINGER)
+
+
+@register_collector
+def _single_flight_metrics():
+    stats = generation_flight.stats()
+    return [
+        ('lofi_single_flight_calls_total', 'counter', 'Describe-and-submit runs started (leader) or joined (shared).',
+         [({'role': 'leader'}, stats['leaders']), ({'role': 'shared'}, stats['shared'])]),
+        ('lofi_single_flight_in_flight', 'gauge', 'Describe-and-submit runs currently running.', [({}, stats['in_flight'])]),
+    ]
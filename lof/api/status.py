@@ -0,0 +1,142 @@
+# api/status.py
+#
+# Batch status lookups. Task ids are deduplicated and checked concurrently on
+# a bounded pool that shares the keep-alive Suno session; anything still
+# running when the batch deadline passes is reported as timed out. One request
+# holds at most SUNO_BATCH_REQUEST_CONCURRENCY pool slots at a time, so a large
+# batch is interleaved with other callers instead of queueing ahead of them.
+
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+
+from .cache import cached_check_generation_status, acached_check_generation_status
+from .utils import extract_music_info
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.SUNO_STATUS_CONCURRENCY,
+                thread_name_prefix='suno-status',
+            )
+        return _executor
+
+
+def submit_bounded(fn, items, deadline_at):
+    """
+    Submit ``fn(item)`` for each item to the status pool, keeping at most
+    SUNO_BATCH_REQUEST_CONCURRENCY of them queued or running; returns
+    ``{item: future}`` for the items submitted before ``deadline_at``.
+    """
+    executor = get_executor()
+    slots = threading.BoundedSemaphore(settings.SUNO_BATCH_REQUEST_CONCURRENCY)
+    futures = {}
+    for item in items:
+        if not slots.acquire(timeout=max(deadline_at - time.monotonic(), 0)):
+            break
+        futures[item] = executor.submit(fn, item)
+        futures[item].add_done_callback(lambda _: slots.release())
+    return futures
+
+
+def _timed_out_result():
+    return {
+        'success': False,
+        'status': 'timeout',
+        'error': 'No answer before the batch deadline',
+        'timed_out': True,
+    }
+
+
+def _result_from(api_response):
+    if api_response and 'error' not in api_response:
+        music_info = extract_music_info(api_response)
+        return {
+            'success': True,
+            'status': music_info['status'],
+            'progress': music_info['progress'],
+            'audio_urls': music_info['audio_urls'],
+            'errors': music_info['errors'],
+        }
+    return {
+        'success': False,
+        'error': api_response.get('error', 'Could not fetch status')
+    }
+
+
+def _check_one(task_id, deadline_at):
+    import requests  # loaded lazily, see api.clients
+
+    started = time.monotonic()
+    try:
+        result = _result_from(cached_check_generation_status(task_id, timeout=max(deadline_at - started, 0.1)))
+    except requests.Timeout:
+        result = _timed_out_result()
+    except Exception as e:
+        result = {'success': False, 'error': str(e)}
+    result['latency_ms'] = round((time.monotonic() - started) * 1000, 1)
+    return result
+
+
+def check_many(task_ids, deadline=None):
+    """Check each distinct task id concurrently and return ``{task_id: result}``."""
+    deadline = settings.SUNO_BATCH_DEADLINE if deadline is None else deadline
+    deadline_at = time.monotonic() + deadline
+    unique_ids = list(dict.fromkeys(str(task_id) for task_id in task_ids))
+    futures = submit_bounded(lambda task_id: _check_one(task_id, deadline_at), unique_ids, deadline_at)
+    wait(futures.values(), timeout=max(deadline_at - time.monotonic(), 0))
+
+    results = {}
+    for task_id in unique_ids:
+        future = futures.get(task_id)
+        if future is not None and future.done():
+            results[task_id] = future.result()
+        else:
+            if future is not None:
+                future.cancel()
+            results[task_id] = {**_timed_out_result(), 'latency_ms': None}
+    return results
+
+
+async def _acheck_one(task_id, deadline_at, semaphore):
+    import httpx  # loaded lazily, see api.clients
+
+    async with semaphore:
+        started = time.monotonic()
+        try:
+            result = _result_from(await acached_check_generation_status(task_id, timeout=max(deadline_at - started, 0.1)))
+        except httpx.TimeoutException:
+            result = _timed_out_result()
+        except Exception as e:
+            result = {'success': False, 'error': str(e)}
+        result['latency_ms'] = round((time.monotonic() - started) * 1000, 1)
+        return result
+
+
+async def acheck_many(task_ids, deadline=None):
+    """Async ``check_many``: the same results, gathered on the running event loop."""
+    deadline = settings.SUNO_BATCH_DEADLINE if deadline is None else deadline
+    deadline_at = time.monotonic() + deadline
+    unique_ids = list(dict.fromkeys(str(task_id) for task_id in task_ids))
+    semaphore = asyncio.Semaphore(settings.SUNO_BATCH_REQUEST_CONCURRENCY)
+    tasks = {task_id: asyncio.create_task(_acheck_one(task_id, deadline_at, semaphore)) for task_id in unique_ids}
+    if tasks:
+        await asyncio.wait(tasks.values(), timeout=deadline)
+
+    results = {}
+    for task_id, task in tasks.items():
+        if task.done():
+            results[task_id] = task.result()
+        else:
+            task.cancel()
+            results[task_id] = {**_timed_out_result(), 'latency_ms': None}
+    return results
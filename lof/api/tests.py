@@ -1,3 +1,791 @@
-from django.test import TestCase
+import io
+import os
+import base64
+import time
+import uuid
+import tempfile
+import asyncio
+import threading
+from unittest import mock
+from datetime import timedelta
+from email.utils import formatdate
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.signals import request_started
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import clients, deadlines, jobs, mirror
+from .events import task_event_stream
+from .models import Generation, MirroredTrack
+from .singleflight import SingleFlight
+from .status import check_many
+from .ratelimit import TokenBucket, parse_retry_after
+from .resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpen, LatencyTracker, is_upstream_failure
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class UpstreamError(Exception):
+    def __init__(self, code):
+        super().__init__(f'HTTP {code}')
+        self.code = code
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch('api.resilience.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker('test', failure_ratio=0.5, min_calls=4, window=30, cooldown=10)
+
+    def _call(self, error=None):
+        with self.breaker.guard():
+            if error is not None:
+                raise error
+
+    def _fail(self, times=1):
+        for _ in range(times):
+            with self.assertRaises(RuntimeError):
+                self._call(RuntimeError('boom'))
+
+    def test_opens_then_half_opens_then_closes(self):
+        self._call()
+        self._call()
+        self._fail()
+        self.assertEqual(self.breaker.state, CLOSED)  # 1 of 3: below min_calls
+        self._fail()
+        self.assertEqual(self.breaker.state, OPEN)  # 2 of 4 failed
+
+        with self.assertRaises(CircuitOpen) as raised:
+            self._call()
+        self.assertEqual(raised.exception.retry_after, 10)
+
+        self.clock.advance(10)
+        with self.breaker.guard():
+            self.assertEqual(self.breaker.state, HALF_OPEN)
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    def test_failed_trial_reopens(self):
+        self._fail(4)
+        self.clock.advance(10)
+        self._fail()
+        self.assertEqual(self.breaker.state, OPEN)
+        self.clock.advance(5)
+        with self.assertRaises(CircuitOpen):
+            self._call()
+
+    def test_one_trial_at_a_time_when_half_open(self):
+        self._fail(4)
+        self.clock.advance(10)
+        self.breaker.allow()
+        with self.assertRaises(CircuitOpen):
+            self.breaker.allow()
+        self.breaker.record(None)  # the trial was cancelled: no verdict, the next caller may try
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        self.breaker.allow()
+        with self.assertRaises(CircuitOpen):
+            self.breaker.allow()
+        self.breaker.record(False)
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    def test_client_errors_are_not_failures(self):
+        for _ in range(10):
+            with self.assertRaises(UpstreamError):
+                self._call(UpstreamError(404))
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.assertFalse(is_upstream_failure(UpstreamError(429)))
+        self.assertTrue(is_upstream_failure(UpstreamError(408)))
+        self.assertTrue(is_upstream_failure(UpstreamError(503)))
+
+    def test_failed_flag_counts_without_raising(self):
+        for _ in range(4):
+            with self.breaker.guard() as call:
+                call.failed = True
+        self.assertEqual(self.breaker.state, OPEN)
+
+    def test_old_results_leave_the_window(self):
+        self._fail(3)
+        self.clock.advance(31)
+        self._call()
+        self._fail()
+        self.assertEqual(self.breaker.state, CLOSED)
+
+
+class LatencyTrackerTests(SimpleTestCase):
+    def test_no_quantile_before_min_samples(self):
+        tracker = LatencyTracker(min_samples=5)
+        for seconds in range(4):
+            tracker.observe(seconds)
+        self.assertIsNone(tracker.quantile(0.95))
+        tracker.observe(10)
+        self.assertEqual(tracker.quantile(0.95), 10)
+
+    def test_hedges_stay_within_ratio(self):
+        tracker = LatencyTracker(max_hedge_ratio=0.1)
+        hedges = 0
+        for _ in range(100):
+            hedged = tracker.hedge_allowed()
+            tracker.note_call(hedged)
+            hedges += hedged
+        self.assertEqual(hedges, 10)
+
+
+class DeadlineTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch('api.deadlines.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_nested_later_deadline_keeps_the_earlier_one(self):
+        with deadlines.deadline(5):
+            with deadlines.deadline(60):
+                self.assertEqual(deadlines.remaining(), 5)
+            with deadlines.deadline(2):
+                self.assertEqual(deadlines.remaining(), 2)
+            self.assertEqual(deadlines.remaining(), 5)
+        self.assertIsNone(deadlines.remaining())
+
+    def test_zero_means_no_deadline(self):
+        with deadlines.deadline(0):
+            self.assertIsNone(deadlines.remaining())
+            self.assertEqual(deadlines.budget(30), 30)
+
+    def test_budget_is_capped_and_checks_expiry(self):
+        with deadlines.deadline(5):
+            self.assertEqual(deadlines.budget(30), 5)
+            self.assertEqual(deadlines.budget(2), 2)
+            self.clock.advance(5)
+            with self.assertRaises(deadlines.DeadlineExceeded):
+                deadlines.budget(30, what='the test call')
+
+
+class SingleFlightTests(SimpleTestCase):
+    def _wait_for_waiters(self, flight, count, timeout=5):
+        stop_at = time.monotonic() + timeout
+        while flight.stats()['shared'] < count and time.monotonic() < stop_at:
+            time.sleep(0.005)
+        self.assertEqual(flight.stats()['shared'], count)
+
+    def test_concurrent_callers_share_one_run(self):
+        flight = SingleFlight(linger=0)
+        release = threading.Event()
+        calls = []
+        results = []
+
+        def fn():
+            calls.append(1)
+            release.wait(5)
+            return 'task-1'
+
+        def call():
+            results.append(flight.do('key', fn))
+
+        leader = threading.Thread(target=call)
+        leader.start()
+        while not calls:
+            time.sleep(0.005)
+        waiters = [threading.Thread(target=call) for _ in range(3)]
+        for thread in waiters:
+            thread.start()
+        self._wait_for_waiters(flight, 3)
+        release.set()
+        for thread in [leader, *waiters]:
+            thread.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(results), [('task-1', False)] + [('task-1', True)] * 3)
+        self.assertEqual(flight.stats()['in_flight'], 0)
+
+    def test_results_linger_but_errors_do_not(self):
+        flight = SingleFlight(linger=60)
+        calls = []
+
+        def failing():
+            calls.append(1)
+            raise RuntimeError('describe failed')
+
+        with self.assertRaises(RuntimeError):
+            flight.do('key', failing)
+        self.assertEqual(flight.do('key', lambda: 'task-1'), ('task-1', False))
+        self.assertEqual(flight.do('key', lambda: 'task-2'), ('task-1', True))
+        self.assertEqual(len(calls), 1)
+
+    def test_waiter_gives_up_at_its_own_deadline(self):
+        flight = SingleFlight(linger=0)
+        started = threading.Event()
+        release = threading.Event()
+        results = []
+
+        def fn():
+            started.set()
+            release.wait(5)
+            return 'task-1'
+
+        leader = threading.Thread(target=lambda: results.append(flight.do('key', fn)))
+        leader.start()
+        started.wait(5)
+        began = time.monotonic()
+        with deadlines.deadline(0.1), self.assertRaises(deadlines.DeadlineExceeded):
+            flight.do('key', fn)
+        self.assertLess(time.monotonic() - began, 1)
+        release.set()
+        leader.join(5)
+        self.assertEqual(results, [('task-1', False)])
+
+    async def test_cancelled_async_waiter_leaves_the_run_alone(self):
+        flight = SingleFlight(linger=0)
+        release = asyncio.Event()
+        calls = []
+
+        async def submit():
+            calls.append(1)
+            await release.wait()
+            return 'task-1'
+
+        leader = asyncio.create_task(flight.ado('key', submit))
+        await asyncio.sleep(0)
+        quitter = asyncio.create_task(flight.ado('key', submit))
+        waiter = asyncio.create_task(flight.ado('key', submit))
+        await asyncio.sleep(0)
+        quitter.cancel()
+        await asyncio.sleep(0)
+        release.set()
+
+        self.assertEqual(await leader, ('task-1', False))
+        self.assertEqual(await waiter, ('task-1', True))
+        self.assertTrue(quitter.cancelled())
+        self.assertEqual(len(calls), 1)
+
+    async def test_cancelled_async_leader_still_answers_waiters(self):
+        flight = SingleFlight(linger=0)
+        release = asyncio.Event()
+
+        async def submit():
+            await release.wait()
+            return 'task-1'
+
+        leader = asyncio.create_task(flight.ado('key', submit))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(flight.ado('key', submit))
+        await asyncio.sleep(0)
+        leader.cancel()
+        await asyncio.sleep(0)
+        release.set()
+
+        self.assertEqual(await waiter, ('task-1', True))
+        self.assertTrue(leader.cancelled())
+
+
+def _task_response(status):
+    return {'data': {'status': status, 'response': {'sunoData': []}}}
+
+
+@override_settings(SSE_POLL_INTERVAL=0.01, SSE_HEARTBEAT_INTERVAL=60, SSE_ERROR_BACKOFF_MAX=0.04, SSE_MAX_DURATION=0.3)
+class TaskEventStreamTests(SimpleTestCase):
+    async def _events(self, responses):
+        calls = []
+
+        async def check(task_id):
+            calls.append(time.monotonic())
+            response = responses[min(len(calls), len(responses)) - 1]
+            if isinstance(response, Exception):
+                raise response
+            return response
+
+        with mock.patch('api.events.acached_check_generation_status', check):
+            frames = [frame async for frame in task_event_stream('task-1', None)]
+        return [line.split(': ', 1)[1] for frame in frames for line in frame.splitlines() if line.startswith('event: ')], frames, calls
+
+    async def test_ends_when_the_task_finishes(self):
+        events, _, calls = await self._events([_task_response('PENDING'), _task_response('SUCCESS')])
+        self.assertEqual(events, ['status', 'status', 'end'])
+        self.assertEqual(len(calls), 2)
+
+    async def test_ends_with_reconnect_after_max_duration(self):
+        started = time.monotonic()
+        events, frames, _ = await self._events([_task_response('PENDING')])
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual(events, ['status', 'end'])
+        self.assertIn('"reconnect":true', frames[-1])
+
+    async def test_backs_off_after_errors(self):
+        events, _, calls = await self._events([RuntimeError('upstream down')])
+        self.assertEqual(events[-1], 'end')
+        gaps = [later - earlier for earlier, later in zip(calls, calls[1:])]
+        self.assertGreater(len(gaps), 2)
+        self.assertLess(len(calls), 15)  # polling every tick would be about 30 calls
+        self.assertGreaterEqual(gaps[-1], 0.035)
+
+
+class BatchStatusTests(SimpleTestCase):
+    def setUp(self):
+        def check(task_id, timeout=None):
+            time.sleep(0.01)
+            return _task_response('PENDING')
+
+        patcher = mock.patch('api.status.cached_check_generation_status', check)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_large_batch_does_not_starve_a_small_one(self):
+        big = threading.Thread(target=check_many, args=([f'big-{n}' for n in range(400)],))
+        big.start()
+        time.sleep(0.05)
+        small = check_many(['small-1', 'small-2'], deadline=0.3)
+        big.join(10)
+        self.assertEqual([result['status'] for result in small.values()], ['pending', 'pending'])
+
+    @override_settings(SUNO_BATCH_MAX_TASKS=3)
+    def test_too_many_task_ids_is_rejected(self):
+        response = self.client.post('/api/check-multiple-tasks/', {'task_ids': ['a', 'b', 'c', 'd']}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/check-multiple-tasks/', {'task_ids': ['a', 'b', 'c']}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+
+class GenerationSweepTests(TransactionTestCase):
+    # run_generation and the sweep close stale connections, so no wrapping transaction.
+
+    def setUp(self):
+        self.submitted = []
+        patcher = mock.patch('api.jobs.submit_music_generation', self._submit_music)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _submit_music(self, prompt):
+        self.submitted.append(prompt)
+        return {'task_id': f'task-{len(self.submitted)}', 'initial_response': {}}
+
+    def _generation(self, age=0, **fields):
+        generation = Generation.objects.create(image_sha256=uuid.uuid4().hex, **fields)
+        Generation.objects.filter(pk=generation.pk).update(updated_at=timezone.now() - timedelta(seconds=age))
+        return generation
+
+    def test_run_claims_a_queued_row(self):
+        generation = self._generation(prompt='rainy window')
+        jobs.run_generation(generation.pk)
+        jobs.run_generation(generation.pk)  # queued twice, e.g. by a sweep in another process
+        generation.refresh_from_db()
+        self.assertEqual((generation.status, generation.task_id), (Generation.STATUS_PROCESSING, 'task-1'))
+        self.assertEqual(self.submitted, ['rainy window'])
+
+    def test_run_leaves_a_row_claimed_elsewhere(self):
+        generation = self._generation(prompt='rainy window', status=Generation.STATUS_SUBMITTING)
+        jobs.run_generation(generation.pk)
+        generation.refresh_from_db()
+        self.assertEqual(generation.status, Generation.STATUS_SUBMITTING)
+        self.assertEqual(self.submitted, [])
+
+    def test_sweep_requeues_or_fails_stale_rows(self):
+        resumable = self._generation(age=700, prompt='rainy window', status=Generation.STATUS_SUBMITTING)
+        lost = self._generation(age=700, status=Generation.STATUS_DESCRIBING, image_path='/nonexistent/upload.jpg')
+        fresh = self._generation(age=10, prompt='neon street')
+        held = self._generation(age=700, prompt='held here')
+        done = self._generation(age=700, status=Generation.STATUS_COMPLETE)
+        with mock.patch.object(jobs, '_local', {held.pk}), mock.patch('api.jobs._submit') as submit:
+            self.assertEqual(jobs.sweep_stale_generations(older_than=600), (1, 1))
+        submit.assert_called_once_with(resumable.pk)
+        statuses = {g.pk: g.status for g in Generation.objects.all()}
+        self.assertEqual(statuses, {
+            resumable.pk: Generation.STATUS_QUEUED,
+            lost.pk: Generation.STATUS_FAILED,
+            fresh.pk: Generation.STATUS_QUEUED,
+            held.pk: Generation.STATUS_QUEUED,
+            done.pk: Generation.STATUS_COMPLETE,
+        })
+        # Requeued rows are fresh again, so a second sweep leaves them alone.
+        with mock.patch('api.jobs._submit') as submit:
+            self.assertEqual(jobs.sweep_stale_generations(older_than=600), (1, 0))
+        submit.assert_called_once_with(held.pk)
+
+    def test_sweeper_starts_on_first_request(self):
+        self.addCleanup(request_started.disconnect, dispatch_uid='api.jobs.start_sweeper')
+        with mock.patch('api.jobs.start_sweeper') as start:
+            jobs.start_sweeper_on_first_request()
+            start.assert_not_called()
+            self.client.get('/api/cache-stats/')
+        start.assert_called_once_with()
+
+
+class ByteRangeTests(SimpleTestCase):
+    def test_ranges(self):
+        cases = {
+            'bytes=0-99': (0, 99),
+            'bytes=100-': (100, 999),
+            'bytes=900-5000': (900, 999),
+            'bytes=-100': (900, 999),
+            'bytes=-5000': (0, 999),
+            'bytes=-0': False,
+            'bytes=1000-': False,
+            'bytes=500-100': False,
+            'bytes=0-1,5-9': None,
+            'bytes=abc': None,
+            'items=0-1': None,
+            '': None,
+        }
+        for header, expected in cases.items():
+            with self.subTest(header=header):
+                self.assertEqual(mirror.byte_range(header, 1000), expected)
+
+    def test_empty_file_cannot_satisfy_a_range(self):
+        self.assertIs(mirror.byte_range('bytes=-1', 0), False)
+        self.assertIs(mirror.byte_range('bytes=0-', 0), False)
+
+
+@override_settings(AUDIO_MIRROR_ALLOWED_HOSTS=['.suno.ai', 'musicfile.api.box'])
+class MirrorAllowListTests(SimpleTestCase):
+    def test_allowed_hosts(self):
+        for url in ('https://cdn1.suno.ai/a.mp3', 'https://CDN1.Suno.AI/a.mp3', 'https://musicfile.api.box/a.mp3'):
+            with self.subTest(url=url):
+                self.assertTrue(mirror.allowed_url(url))
+
+    def test_rejected_hosts(self):
+        for url in (
+            'https://evil.suno.ai.attacker.com/a.mp3',
+            'https://evilsuno.ai/a.mp3',
+            'https://suno.ai.attacker.com/a.mp3',
+            'https://cdn1.suno.ai@127.0.0.1/a.mp3',
+            'https://sub.musicfile.api.box/a.mp3',
+            'http://cdn1.suno.ai/a.mp3',
+            'file:///etc/passwd',
+            'https://[::1/a.mp3',
+            'not a url',
+        ):
+            with self.subTest(url=url):
+                self.assertFalse(mirror.allowed_url(url))
+
+    def test_redirect_off_the_list_is_not_followed(self):
+        redirect = mock.Mock(is_redirect=True, headers={'Location': 'http://169.254.169.254/latest/'})
+        with mock.patch('api.mirror.get_mirror_session') as session:
+            session.return_value.get.return_value = redirect
+            with self.assertRaises(ValueError):
+                mirror._open('https://cdn1.suno.ai/a.mp3')
+        self.assertEqual(session.return_value.get.call_count, 1)
+
+
+class MirrorBudgetTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        override = override_settings(MEDIA_ROOT=media_root.name, AUDIO_MIRROR_MAX_BYTES=250)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def _track(self, name, content_sha256, size, age):
+        path = mirror.content_path(content_sha256)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as out:
+            out.write(b'x' * size)
+        track = MirroredTrack.objects.create(
+            source_url_sha256=mirror._url_key(name), source_url=name, status=MirroredTrack.STATUS_READY,
+            content_sha256=content_sha256, size=size,
+        )
+        # last_accessed_at is auto_now_add, so backdate it afterwards.
+        MirroredTrack.objects.filter(pk=track.pk).update(last_accessed_at=timezone.now() - timedelta(minutes=age))
+        return track
+
+    def test_least_recently_played_go_first(self):
+        oldest = self._track('a', 'aa' * 32, 100, age=30)
+        older = self._track('b', 'bb' * 32, 100, age=20)
+        recent = self._track('c', 'cc' * 32, 100, age=10)
+        self.assertEqual(mirror.enforce_budget(), 1)
+        self.assertEqual(list(MirroredTrack.objects.values_list('pk', flat=True).order_by('pk')), [older.pk, recent.pk])
+        self.assertFalse(os.path.exists(mirror.content_path(oldest.content_sha256)))
+        self.assertTrue(os.path.exists(mirror.content_path(older.content_sha256)))
+        self.assertEqual(mirror.enforce_budget(), 0)
+
+    def test_shared_content_is_counted_and_kept_once(self):
+        self._track('a', 'aa' * 32, 100, age=30)
+        self._track('a-again', 'aa' * 32, 100, age=5)
+        self._track('b', 'bb' * 32, 100, age=20)
+        self.assertEqual(mirror.enforce_budget(), 0)  # 200 bytes on disk
+        self._track('c', 'cc' * 32, 100, age=10)
+        # The oldest row goes, but its file stays for the newer row; then 'b' is evicted.
+        self.assertEqual(mirror.enforce_budget(), 2)
+        self.assertTrue(os.path.exists(mirror.content_path('aa' * 32)))
+        self.assertFalse(os.path.exists(mirror.content_path('bb' * 32)))
+
+
+def _callback(task_id, callback_type='complete', code=200):
+    return {
+        'code': code,
+        'msg': 'success' if code == 200 else 'generation failed',
+        'data': {
+            'callbackType': callback_type,
+            'task_id': task_id,
+            'data': [{'id': 'track-1', 'audio_url': 'https://cdn1.suno.ai/track-1.mp3', 'title': 'Rain'}],
+        },
+    }
+
+
+@override_settings(SUNO_CALLBACK_TOKEN='s3cret')
+class SunoCallbackTests(TransactionTestCase):
+    # wait_for_completion reads the rows from another thread, so no wrapping transaction.
+
+    def _post(self, payload, token='s3cret'):
+        url = '/api/suno/callback/' + (f'?token={token}' if token is not None else '')
+        return self.client.post(url, payload, content_type='application/json')
+
+    @override_settings(SUNO_CALLBACK_TOKEN='')
+    def test_refused_without_a_configured_token(self):
+        self.assertEqual(self._post(_callback('task-1'), token='').status_code, 403)
+
+    def test_refused_without_or_with_a_wrong_token(self):
+        generation = Generation.objects.create(task_id='task-1', status=Generation.STATUS_PROCESSING)
+        self.assertEqual(self._post(_callback('task-1'), token=None).status_code, 403)
+        self.assertEqual(self._post(_callback('task-1'), token='s3cre').status_code, 403)
+        generation.refresh_from_db()
+        self.assertEqual(generation.status, Generation.STATUS_PROCESSING)
+
+    def test_body_must_be_an_object(self):
+        for payload in ([1], 'done', {'data': [1]}):
+            with self.subTest(payload=payload):
+                self.assertEqual(self._post(payload).status_code, 400)
+
+    def test_terminal_callback_updates_rows_and_wakes_a_waiter(self):
+        first = Generation.objects.create(task_id='task-1', status=Generation.STATUS_PROCESSING)
+        second = Generation.objects.create(task_id='task-1', status=Generation.STATUS_PROCESSING)
+        other = Generation.objects.create(task_id='task-2', status=Generation.STATUS_PROCESSING)
+        results = []
+        waiter = threading.Thread(target=lambda: results.append(jobs.wait_for_completion('task-1', max_wait_time=5, fallback_interval=60)))
+        waiter.start()
+        while 'task-1' not in jobs._waiters:
+            time.sleep(0.005)
+
+        self.assertEqual(self._post(_callback('task-1', 'first')).status_code, 200)
+        self.assertTrue(waiter.is_alive())  # not terminal yet
+        started = time.monotonic()
+        self.assertEqual(self._post(_callback('task-1')).json(), {'status': 'received'})
+        waiter.join(5)
+        self.assertLess(time.monotonic() - started, 1)
+
+        self.assertEqual(results[0]['status'], 'complete')
+        self.assertEqual(results[0]['audio_urls'], ['https://cdn1.suno.ai/track-1.mp3'])
+        for generation in (first, second):
+            generation.refresh_from_db()
+            self.assertEqual((generation.status, generation.audio_urls), (Generation.STATUS_COMPLETE, ['https://cdn1.suno.ai/track-1.mp3']))
+        other.refresh_from_db()
+        self.assertEqual(other.status, Generation.STATUS_PROCESSING)
+
+    def test_failed_callback_records_the_error(self):
+        generation = Generation.objects.create(task_id='task-1', status=Generation.STATUS_PROCESSING)
+        self._post(_callback('task-1', 'error', code=501))
+        generation.refresh_from_db()
+        self.assertEqual((generation.status, generation.error), (Generation.STATUS_FAILED, 'generation failed'))
+
+
+def _bearer(user):
+    return {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(user)}'}
+
+
+def _image_upload(seed):
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new('RGB', (32, 32), (seed % 256, seed // 256 % 256, 7)).save(buffer, 'PNG')
+    return SimpleUploadedFile('photo.png', buffer.getvalue(), content_type='image/png')
+
+
+class CoalescedUploadTests(TestCase):
+    def test_one_row_per_user_and_task(self):
+        alice = User.objects.create_user('alice')
+        bob = User.objects.create_user('bob')
+        seed = uuid.uuid4().int % 65536  # a fresh image, so no lingering run from another test answers it
+        submitted = {'task_id': 'task-1', 'initial_response': {}}
+        with mock.patch('api.views._describe_and_submit', return_value=('rainy window', submitted)) as run:
+            for user in (alice, alice, bob):
+                response = self.client.post('/api/upload/', {'file': _image_upload(seed)}, **_bearer(user))
+                self.assertEqual(response.json()['task_id'], 'task-1')
+        run.assert_called_once()
+        owners = sorted(Generation.objects.filter(task_id='task-1').values_list('user__username', flat=True))
+        self.assertEqual(owners, ['alice', 'bob'])
+
+
+@override_settings(STATUS_CACHE_TTL=5, STATUS_POLL_HINT=10, STATUS_TERMINAL_MAX_AGE=300)
+class StatusConditionalTests(SimpleTestCase):
+    def setUp(self):
+        self.response = _task_response('PENDING')
+        patcher = mock.patch('api.views.cached_check_generation_status', lambda task_id: self.response)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _get(self, query='', etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(f'/api/check_music_status/task-1/{query}', **headers)
+
+    def test_unchanged_state_is_answered_with_304(self):
+        first = self._get()
+        self.assertEqual(first.status_code, 200)
+        again = self._get(etag=first['ETag'])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again.content, b'')
+        self.assertEqual((again['ETag'], again['Cache-Control']), (first['ETag'], first['Cache-Control']))
+
+        self.response = _task_response('FIRST_SUCCESS')
+        changed = self._get(etag=first['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], first['ETag'])
+
+    def test_poll_hint_is_fixed_for_a_state(self):
+        hints = {self._get()['Cache-Control'] for _ in range(20)}
+        self.assertEqual(hints, {'private, max-age=9'})  # 10 s shortened by 10% progress
+        self.response = _task_response('FIRST_SUCCESS')
+        self.assertEqual(self._get()['Cache-Control'], 'private, max-age=5')  # never below the cache TTL
+        self.response = _task_response('SUCCESS')
+        self.assertEqual(self._get()['Cache-Control'], 'private, max-age=300')
+
+    def test_each_representation_has_its_own_etag(self):
+        full = self._get()
+        compact = self._get('?compact=1')
+        picked = self._get('?fields=status')
+        self.assertEqual(len({full['ETag'], compact['ETag'], picked['ETag']}), 3)
+        self.assertEqual(set(picked.json()), {'success', 'task_id', 'status'})
+        self.assertEqual(self._get('?compact=1', etag=full['ETag']).status_code, 200)
+        self.assertEqual(self._get('?compact=1', etag=compact['ETag']).status_code, 304)
+
+
+class TokenBucketTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch('api.ratelimit.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.bucket = TokenBucket(rate=5, capacity=2)
+
+    def _waits(self, count, max_wait=None):
+        return [round(self.bucket._reserve(max_wait), 6) for _ in range(count)]
+
+    def test_burst_then_one_token_apart(self):
+        self.assertEqual(self._waits(4), [0, 0, 0.2, 0.4])
+        self.clock.advance(1)  # 5 tokens accrue, capped at the capacity of 2
+        self.assertEqual(self._waits(3), [0, 0, 0.2])
+
+    def test_refused_beyond_max_wait_without_taking_a_token(self):
+        self._waits(2)
+        self.assertIsNone(self.bucket._reserve(max_wait=0.1))
+        self.assertFalse(self.bucket.acquire(max_wait=0.1))
+        self.assertEqual(self._waits(1, max_wait=0.2), [0.2])
+
+    def test_pause_releases_callers_one_token_apart(self):
+        self.bucket.pause(30)
+        self.assertEqual(self._waits(4), [30, 30.2, 30.4, 30.6])
+
+    def test_no_tokens_accrue_while_paused(self):
+        self.bucket.pause(30)
+        self.clock.advance(20)
+        self.assertEqual(self._waits(2), [10, 10.2])
+        self.clock.advance(10.2)
+        self.assertEqual(self._waits(1), [0.2])
+        self.clock.advance(60)  # after the pause the bucket fills up to its capacity again
+        self.assertEqual(self._waits(3), [0, 0, 0.2])
+
+    def test_pause_drops_the_saved_burst_and_never_shortens(self):
+        self.bucket.pause(30)
+        self.bucket.pause(5)
+        self.assertEqual(self._waits(1), [30])
+
+
+class RetryAfterTests(SimpleTestCase):
+    def test_seconds(self):
+        self.assertEqual(parse_retry_after('120'), 120)
+        self.assertEqual(parse_retry_after('1.5'), 1.5)
+        self.assertEqual(parse_retry_after('-3'), 0)
+
+    def test_http_date(self):
+        self.assertAlmostEqual(parse_retry_after(formatdate(time.time() + 120, usegmt=True)), 120, delta=2)
+        self.assertEqual(parse_retry_after(formatdate(time.time() - 120, usegmt=True)), 0)
+
+    def test_missing_or_unreadable_uses_the_default(self):
+        self.assertEqual(parse_retry_after(None, default=7), 7)
+        self.assertEqual(parse_retry_after('', default=7), 7)
+        self.assertEqual(parse_retry_after('soon', default=7), 7)
+
+
+class GenerationHistoryTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('alice')
+        self.bob = User.objects.create_user('bob')
+        start = timezone.now() - timedelta(hours=1)
+        # Seven rows for alice, four of them created at the same instant, and two for bob in between.
+        offsets = [0, 1, 2, 2, 2, 2, 3]
+        self.expected = []
+        for offset in offsets:
+            self.expected.append(self._generation(self.alice, start + timedelta(minutes=offset)))
+        for offset in (1, 2):
+            self._generation(self.bob, start + timedelta(minutes=offset))
+        self.expected.sort(key=lambda generation: (generation.created_at, str(generation.pk)), reverse=True)
+
+    def _generation(self, user, created_at):
+        generation = Generation.objects.create(user=user, task_id=f'task-{uuid.uuid4().hex[:8]}')
+        Generation.objects.filter(pk=generation.pk).update(created_at=created_at)
+        generation.refresh_from_db()
+        return generation
+
+    def _page(self, user, **params):
+        return self.client.get('/api/generations/history/', params, **_bearer(user))
+
+    def test_pages_cover_every_row_once_in_order(self):
+        seen, cursor, pages = [], None, 0
+        while True:
+            response = self._page(self.alice, limit=2, **({'cursor': cursor} if cursor else {}))
+            self.assertEqual(response.status_code, 200)
+            body = response.json()
+            self.assertLessEqual(len(body['results']), 2)
+            seen += [item['generation_id'] for item in body['results']]
+            pages += 1
+            cursor = body['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(pages, 4)
+        self.assertEqual(seen, [str(generation.pk) for generation in self.expected])
+
+    def test_exact_last_page_has_no_cursor(self):
+        body = self._page(self.alice, limit=7).json()
+        self.assertEqual(len(body['results']), 7)
+        self.assertIsNone(body['next_cursor'])
+
+    def test_only_the_callers_rows(self):
+        body = self._page(self.bob, limit=100).json()
+        self.assertEqual(len(body['results']), 2)
+        self.assertFalse({item['generation_id'] for item in body['results']} & {str(g.pk) for g in self.expected})
+
+    def test_invalid_cursor_or_limit(self):
+        for cursor in ('!!!', 'bm90LWEtY3Vyc29y', base64.urlsafe_b64encode(b'2024-01-01T00:00:00|not-a-uuid').decode(), '\u00ff'):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self._page(self.alice, cursor=cursor).status_code, 400)
+        self.assertEqual(self._page(self.alice, limit='ten').status_code, 400)
+
+    def test_requires_a_login(self):
+        self.assertEqual(self.client.get('/api/generations/history/').status_code, 401)
+
+
+@mock.patch.dict(os.environ, {'GOOGLE_API_KEY': 'test-key'})
+class AsyncGeminiModelTests(SimpleTestCase):
+    def _models(self):
+        async def twice():
+            return clients.get_async_gemini_model(), clients.get_async_gemini_model()
+        return asyncio.run(twice())
+
+    def test_one_model_and_client_per_event_loop(self):
+        with mock.patch('api.clients._build_gemini_model', wraps=clients._build_gemini_model) as build:
+            first, again = self._models()
+            other, _ = self._models()
+        self.assertIs(first, again)
+        self.assertIsNot(first, other)
+        self.assertEqual(build.call_count, 2)
+        self.assertIsNotNone(first._async_client)
+        self.assertIsNot(first._async_client, other._async_client)
@@ -1,6 +1,42 @@
 from django.urls import path
-from .views import upload_image, check_music_status, generate_and_wait, check_multiple_tasks
+from .views import (
+    upload_image,
+    check_music_status,
+    generate_and_wait,
+    check_multiple_tasks,
+    create_generation,
+    generation_status,
+    generation_history,
+    create_batch,
+    batch_status,
+    suno_callback,
+    cache_stats,
+    prometheus_metrics,
+    mirrored_audio,
+    upload_image_async,
+    check_music_status_async,
+    check_multiple_tasks_async,
+    task_events,
+)
 
 urlpatterns = [
     path('upload/', upload_image, name='upload-image'),
-]
\ No newline at end of file
+    path('generate-and-wait/', generate_and_wait, name='generate-and-wait'),
+    path('check_music_status/<str:task_id>/', check_music_status, name='check-music-status'),
+    path('check-multiple-tasks/', check_multiple_tasks, name='check-multiple-tasks'),
+    path('generations/', create_generation, name='create-generation'),
+    path('generations/history/', generation_history, name='generation-history'),
+    path('generations/<uuid:generation_id>/', generation_status, name='generation-status'),
+    path('batches/', create_batch, name='create-batch'),
+    path('batches/<uuid:batch_id>/', batch_status, name='batch-status'),
+    path('suno/callback/', suno_callback, name='suno-callback'),
+    path('cache-stats/', cache_stats, name='cache-stats'),
+    path('metrics/', prometheus_metrics, name='metrics'),
+    path('audio/<slug:content_sha256>/', mirrored_audio, name='mirrored-audio'),
+
+    # Native async variants; run them under lof.asgi to share one event loop.
+    path('async/upload/', upload_image_async, name='upload-image-async'),
+    path('async/check_music_status/<str:task_id>/', check_music_status_async, name='check-music-status-async'),
+    path('async/check-multiple-tasks/', check_multiple_tasks_async, name='check-multiple-tasks-async'),
+    path('async/tasks/<str:task_id>/events/', task_events, name='task-events'),
+]
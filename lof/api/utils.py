@@ -1,125 +1,607 @@
-<<<<<<< HEAD
 # api/utils.py
 
 import os
+import sys
+import glob
 import json
-import http.client
 import time
-import threading
-from PIL import Image
 import base64
+import hashlib
+import argparse
+import threading
+import contextvars
+from io import BytesIO
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 from dotenv import load_dotenv
-import google.generativeai as genai
-from http.server import HTTPServer, BaseHTTPRequestHandler
+
+from . import deadlines
+from .clients import get_gemini_model, get_suno_session
+from .metrics import PROMPTS, log_event, stage, upstream
+from .mood import local_lofi_prompt
+from .ratelimit import (
+    suno_limiter,
+    parse_retry_after,
+    poll_delay,
+    RateLimited,
+    SUNO_MAX_RETRIES,
+    SUNO_POLL_MAX_INTERVAL,
+)
+from .resilience import CircuitOpen, HEDGES, gemini_breaker, gemini_hedge_delay, gemini_latency, suno_breaker
 
 load_dotenv()
 
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 SUNO_API_KEY = os.getenv("SUNO")
+SUNO_BASE_URL = os.getenv("SUNO_API_BASE", "https://api.sunoapi.org/api/v1")
+# Public URL of the api app's suno/callback/ endpoint; Suno pushes task updates there.
+SUNO_CALLBACK_URL = os.getenv("SUNO_CALLBACK_URL", "https://api.example.com/callback")
+# Gemini only needs enough pixels to read the mood of the picture.
+GEMINI_IMAGE_MAX_EDGE = int(os.getenv("GEMINI_IMAGE_MAX_EDGE", 1024))
+GEMINI_IMAGE_QUALITY = int(os.getenv("GEMINI_IMAGE_QUALITY", 85))
+# Seconds one Gemini description attempt may take (0: only the request deadline
+# applies), and whether a failed or late description falls back to the local
+# classifier in api/mood.py.
+GEMINI_LATENCY_BUDGET = float(os.getenv("GEMINI_LATENCY_BUDGET", 30))
+GEMINI_LOCAL_FALLBACK = os.getenv("GEMINI_LOCAL_FALLBACK", '').lower() in ('1', 'true', 'yes')
+# 'gemini' asks Gemini to describe the image; 'fast' uses the local classifier only.
+PROMPT_MODES = ('gemini', 'fast')
+# Threads for Gemini describes that may be hedged (see _describe_hedged).
+GEMINI_HEDGE_WORKERS = int(os.getenv("GEMINI_HEDGE_WORKERS", 16))
+# Seconds a Suno request may take when the caller gives no timeout (0: no limit).
+SUNO_TIMEOUT = float(os.getenv("SUNO_TIMEOUT", 30))
+
+LOFI_PROMPT = (
+    "Describe this image for creating prompt for a music. It should include its emotion, "
+    "the people, and the surroundings to generate the prompt in maximum of 200 words without any comments or suggestions."
+)
+
+# Suno reports its own task states; the views expose a smaller vocabulary.
+SUNO_STATUS_MAP = {
+    'PENDING': 'pending',
+    'TEXT_SUCCESS': 'processing',
+    'FIRST_SUCCESS': 'processing',
+    'SUCCESS': 'complete',
+    'CREATE_TASK_FAILED': 'failed',
+    'GENERATE_AUDIO_FAILED': 'failed',
+    'CALLBACK_EXCEPTION': 'failed',
+    'SENSITIVE_WORD_ERROR': 'failed',
+}
+SUNO_PROGRESS = {
+    'PENDING': 10,
+    'TEXT_SUCCESS': 40,
+    'FIRST_SUCCESS': 75,
+    'SUCCESS': 100,
+}
+TERMINAL_STATUSES = ('complete', 'failed')
+
 
 # --- Simple utility ---
 def image_to_base64(image_path):
-    with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode('utf-8')
+    return base64.b64encode(preprocess_image(image_path)).decode('utf-8')
+
+
+# --- Image preprocessing ---
+def preprocess_image(source, max_edge=None, quality=None):
+    """
+    Return ``source`` (a path or file object) as upright RGB JPEG bytes, no
+    larger than ``max_edge`` on its long side and without EXIF or other metadata.
+    """
+    max_edge = max_edge or GEMINI_IMAGE_MAX_EDGE
+    quality = quality or GEMINI_IMAGE_QUALITY
+    from PIL import Image, ImageOps  # loaded lazily, see api.clients
+
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    with stage('preprocess'), Image.open(source) as img:
+        # Let the JPEG decoder scale down by a power of two before decoding in full.
+        img.draft('RGB', (max_edge, max_edge))
+        img.load()
+        ImageOps.exif_transpose(img, in_place=True)
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        img.thumbnail((max_edge, max_edge), Image.LANCZOS)
+        buffer = BytesIO()
+        img.save(buffer, 'JPEG', quality=quality, optimize=True)
+    return buffer.getvalue()
+
 
 # --- Gemini prompt gen ---
-=======
-import sys
-import google.generativeai as genai
-import os
-from dotenv import load_dotenv
-from PIL import Image
-import requests
-import json
-API_KEY = os.getenv("SUNO")
->>>>>>> parent of 12283b6 (api done)
-def generate_lofi_prompt(image_path):
-    load_dotenv()
-    api_key = os.getenv("GOOGLE_API_KEY")
-    if not api_key:
+def generate_lofi_prompt(image):
+    """
+    Describe the image (a path or an open file object) with Gemini and return
+    the text used as the Suno prompt.
+    """
+    if not GOOGLE_API_KEY:
         raise ValueError("Missing GOOGLE_API_KEY")
+    if isinstance(image, (str, os.PathLike)) and not os.path.exists(image):
+        raise FileNotFoundError(f"{image} not found")
+
+    image = {'mime_type': 'image/jpeg', 'data': preprocess_image(image)}
+    with stage('gemini_describe'):
+        return _describe_hedged([LOFI_PROMPT, image])
+
+
+def gemini_request_options(asynchronous=False):
+    """
+    Gemini SDK call options keeping one call, retries included, within
+    GEMINI_LATENCY_BUDGET and whatever is left of the request deadline.
+    """
+    budget = deadlines.budget(GEMINI_LATENCY_BUDGET or None, what='gemini_describe')
+    if budget is None:
+        return None
+    # Without an explicit policy the SDK keeps retrying 503s for up to ten minutes.
+    from google.api_core import exceptions, retry, retry_async
+
+    retry_class = retry_async.AsyncRetry if asynchronous else retry.Retry
+    return {
+        'timeout': budget,
+        'retry': retry_class(
+            predicate=retry.if_exception_type(exceptions.ServiceUnavailable),
+            initial=0.25,
+            maximum=1.0,
+            timeout=budget,
+        ),
+    }
+
+
+def _describe_once(contents):
+    """One Gemini describe call through the circuit breaker."""
+    request_options = gemini_request_options()
+    with gemini_breaker.guard(), upstream('gemini') as call:
+        started = time.perf_counter()
+        response = get_gemini_model().generate_content(contents, request_options=request_options)
+        call.code = 200
+    gemini_latency.observe(time.perf_counter() - started)
+    return response.text.strip()
+
+
+_hedge_executor = None
+_hedge_executor_lock = threading.Lock()
+
+
+def _get_hedge_executor():
+    global _hedge_executor
+    with _hedge_executor_lock:
+        if _hedge_executor is None:
+            _hedge_executor = ThreadPoolExecutor(max_workers=GEMINI_HEDGE_WORKERS, thread_name_prefix='gemini-hedge')
+        return _hedge_executor
+
+
+def _describe_hedged(contents):
+    """
+    Describe with Gemini, sending a second identical request if the first is
+    still running after the hedge delay (the recent p95); the first answer
+    wins. Describing is idempotent, so the slower call is simply left to
+    finish within its own timeout.
+    """
+    delay = gemini_hedge_delay()
+    if delay is None:
+        gemini_latency.note_call(False)
+        return _describe_once(contents)
+
+    executor = _get_hedge_executor()
+    started = threading.Event()
+
+    def first_attempt():
+        started.set()
+        return _describe_once(contents)
+
+    # Each attempt runs in a copy of this context so it keeps the request deadline.
+    attempts = [executor.submit(contextvars.copy_context().run, first_attempt)]
+    # The hedge clock starts when the attempt does: time queued behind other
+    # describes is not Gemini being slow, and hedging it would only queue more.
+    if not started.wait(deadlines.remaining()) and attempts[0].cancel():
+        raise deadlines.DeadlineExceeded("Request deadline passed waiting for a Gemini worker")
+    done, _ = wait(attempts, timeout=delay)
+    hedged = not done and gemini_latency.hedge_allowed()
+    gemini_latency.note_call(hedged)
+    if hedged:
+        HEDGES.inc(outcome='fired')
+        attempts.append(executor.submit(contextvars.copy_context().run, _describe_once, contents))
+
+    error = None
+    pending = set(attempts)
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for attempt in done:
+            if attempt.exception() is None:
+                if attempt is not attempts[0]:
+                    HEDGES.inc(outcome='won')
+                return attempt.result()
+            error = error or attempt.exception()
+    raise error
+
+
+def lofi_prompt(image, mode='gemini'):
+    """
+    ``(prompt, source)`` for the image. ``mode='fast'`` describes it locally
+    (source ``'local'``). Otherwise Gemini does (``'gemini'``); with
+    GEMINI_LOCAL_FALLBACK set, a Gemini error or timeout falls back to the
+    local description (``'fallback'``) instead of raising.
+    """
+    if mode not in PROMPT_MODES:
+        raise ValueError(f"Unknown prompt mode: {mode}")
+    if mode == 'fast':
+        prompt, source = local_lofi_prompt(image), 'local'
+    else:
+        try:
+            prompt, source = generate_lofi_prompt(image), 'gemini'
+        except Exception as e:
+            if not GEMINI_LOCAL_FALLBACK:
+                raise
+            log_event('gemini_fallback', error=f'{type(e).__name__}: {e}')
+            prompt, source = local_lofi_prompt(image), 'fallback'
+    PROMPTS.inc(source=source)
+    return prompt, source
+
+
+# --- Suno music gen ---
+def _suno_headers():
+    if not SUNO_API_KEY:
+        raise ValueError("Missing SUNO API key")
+    return {
+        'Content-Type': 'application/json',
+        'Accept': 'application/json',
+        'Authorization': f'Bearer {SUNO_API_KEY}',
+    }
+
+
+def _budget_left(deadline_at):
+    return None if deadline_at is None else max(deadline_at - time.monotonic(), 0.0)
+
+
+def suno_request(method, path, timeout=None, **kwargs):
+    """
+    Send a Suno API request through the shared rate limiter.
+
+    A 429 pauses the limiter for the Retry-After period and the request is
+    retried up to SUNO_MAX_RETRIES times; ``timeout`` (default SUNO_TIMEOUT,
+    capped by the request deadline) bounds the whole call, waits included.
+    Raises CircuitOpen while the Suno breaker is open.
+    """
+    timeout = deadlines.budget((SUNO_TIMEOUT if timeout is None else timeout) or None, what=f'suno {path}')
+    deadline_at = None if timeout is None else time.monotonic() + timeout
+    for attempt in range(SUNO_MAX_RETRIES + 1):
+        if not suno_limiter.acquire(max_wait=_budget_left(deadline_at)):
+            raise RateLimited("Suno rate limit: no request slot within the time budget")
+        with suno_breaker.guard() as guard, upstream('suno') as call:
+            response = get_suno_session().request(
+                method, f"{SUNO_BASE_URL}{path}", headers=_suno_headers(), timeout=_budget_left(deadline_at), **kwargs
+            )
+            call.code = response.status_code
+            guard.failed = response.status_code >= 500
+        if response.status_code != 429 or attempt == SUNO_MAX_RETRIES:
+            return response
+        suno_limiter.pause(parse_retry_after(response.headers.get('Retry-After'), poll_delay(attempt, base=1, cap=30)))
+    return response
+
+
+def build_suno_payload(prompt, callback_url):
+    return {
+        "prompt": prompt,
+        "style": "Classical",
+        "title": "Peaceful Piano Meditation",
+        "customMode": True,
+        "instrumental": True,
+        "model": "V3_5",
+        "negativeTags": "Heavy Metal, Upbeat Drums",
+        "callBackUrl": callback_url,
+    }
+
+
+def parse_submit_response(body):
+    task_id = (body.get('data') or {}).get('taskId')
+    if body.get('code') != 200 or not task_id:
+        raise RuntimeError(body.get('msg') or 'Suno did not return a task id')
+    return {"task_id": task_id, "initial_response": body}
 
-    genai.configure(api_key=api_key)
 
-    if not os.path.exists(image_path):
-        raise FileNotFoundError(f"{image_path} not found")
+def submit_music_generation(prompt, callback_url=None):
+    """Start a Suno generation for the prompt and return its task id."""
+    payload = build_suno_payload(prompt, callback_url or SUNO_CALLBACK_URL)
+    with stage('suno_submit') as span:
+        response = suno_request('POST', '/generate', data=json.dumps(payload))
+        response.raise_for_status()
+        result = parse_submit_response(response.json())
+        span['task_id'] = result['task_id']
+    return result
 
+
+def check_generation_status(task_id, timeout=None):
+    """Fetch the raw Suno record for a task, or a dict with ``error`` and ``status_code``."""
+    if not task_id or not str(task_id).strip():
+        raise ValueError("Task ID is required")
     try:
-        img = Image.open(image_path)
-        prompt = (
-            "Describe this image for creating prompt for a music. It should include its emotion, "
-            "the people, and the surroundings to generate the prompt in maximum of 200 words without any comments or suggestions."
-        )
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        response = model.generate_content([prompt, img])
-        print(response.text)
-        
-        # Call Suno API
-        url = "https://api.sunoapi.org/api/v1/generate"
-        payload = json.dumps({
-            "prompt": f"{response.text}",
-            "style": "Classical",
-            "title": "Peaceful Piano Meditation",
-            "customMode": True,
-            "instrumental": True,
-            "model": "V3_5",
-            "negativeTags": "Heavy Metal, Upbeat Drums",
-            "callBackUrl":'https://api.example.com/callback'
-        })
-        print(payload)
-        headers = {
-            'Content-Type': 'application/json',
-            'Accept': 'application/json',
-            'Authorization': f'Bearer {os.getenv("SUNO")}'  # Replace with real token
-        }
+        with stage('suno_status', task_id=task_id):
+            response = suno_request('GET', '/generate/record-info', timeout=timeout, params={'taskId': task_id})
+    except RateLimited as e:
+        return {'error': str(e), 'status_code': 429}
+    except CircuitOpen as e:
+        return {'error': str(e), 'status_code': 503}
+    if response.status_code != 200:
+        return {'error': f'Suno API returned HTTP {response.status_code}', 'status_code': response.status_code}
+    body = response.json()
+    if body.get('code') != 200:
+        return {'error': body.get('msg') or 'Suno API error', 'status_code': 502}
+    return body
+
+
+def _track_from_item(item):
+    # Status records use camelCase keys, callbacks use snake_case.
+    return {
+        'id': item.get('id'),
+        'title': item.get('title'),
+        'audio_url': item.get('audioUrl') or item.get('audio_url'),
+        'stream_audio_url': item.get('streamAudioUrl') or item.get('stream_audio_url'),
+        'image_url': item.get('imageUrl') or item.get('image_url'),
+        'duration': item.get('duration'),
+        'tags': item.get('tags'),
+    }
+
+
+def extract_music_info(api_response):
+    """Normalise a Suno status record into status, progress, tracks and audio URLs."""
+    data = api_response.get('data') or {}
+    suno_status = (data.get('status') or 'PENDING').upper()
+    items = (data.get('response') or {}).get('sunoData') or []
+    tracks = [_track_from_item(item) for item in items]
+    errors = []
+    if data.get('errorMessage'):
+        errors.append(data['errorMessage'])
+    return {
+        'status': SUNO_STATUS_MAP.get(suno_status, 'processing'),
+        'progress': SUNO_PROGRESS.get(suno_status, 0),
+        'audio_urls': [track['audio_url'] for track in tracks if track['audio_url']],
+        'tracks': tracks,
+        'metadata': {
+            'suno_status': suno_status,
+            'type': data.get('type'),
+            'error_code': data.get('errorCode'),
+        },
+        'errors': errors,
+    }
+
+
+def status_fingerprint(music_info):
+    """
+    Short stable id for the client-visible state of a task: the whole
+    normalised ``extract_music_info`` result, so a change to any field
+    (tracks and metadata included) gives a new ETag and SSE event.
+    """
+    state = json.dumps(music_info, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha1(state.encode('utf-8')).hexdigest()[:16]
+
+
+def extract_callback_info(payload):
+    """Normalise a Suno callback body into the same shape as ``extract_music_info``."""
+    data = payload.get('data') or {}
+    callback_type = (data.get('callbackType') or '').lower()
+    tracks = [_track_from_item(item) for item in (data.get('data') or [])]
+    errors = []
+    if payload.get('code') != 200 or callback_type == 'error':
+        status, progress = 'failed', 0
+        errors.append(payload.get('msg') or 'Suno generation failed')
+    elif callback_type == 'complete':
+        status, progress = 'complete', 100
+    else:
+        status, progress = 'processing', SUNO_PROGRESS['FIRST_SUCCESS' if callback_type == 'first' else 'TEXT_SUCCESS']
+    return {
+        'task_id': data.get('task_id') or data.get('taskId'),
+        'status': status,
+        'progress': progress,
+        'audio_urls': [track['audio_url'] for track in tracks if track['audio_url']],
+        'tracks': tracks,
+        'metadata': {'callback_type': callback_type},
+        'errors': errors,
+    }
+
+
+def poll_for_completion(task_id, poll_interval=10, max_wait_time=300):
+    """
+    Poll Suno until the task finishes or ``max_wait_time`` seconds have passed.
+
+    ``poll_interval`` is the first delay; later ones back off with jitter and
+    shrink as the reported progress grows (see ``poll_delay``).
+    """
+    with stage('poll_completion', task_id=task_id):
+        return _poll_for_completion(task_id, poll_interval, max_wait_time)
+
+
+def _poll_for_completion(task_id, poll_interval, max_wait_time):
+    started = time.monotonic()
+    music_info = None
+    attempt = 0
+    while time.monotonic() - started < max_wait_time:
+        api_response = check_generation_status(task_id)
+        if 'error' in api_response:
+            return {'success': False, 'status': 'failed', 'error': api_response['error'], 'audio_urls': []}
+        music_info = extract_music_info(api_response)
+        if music_info['status'] in TERMINAL_STATUSES:
+            return {
+                'success': music_info['status'] == 'complete',
+                'status': music_info['status'],
+                'audio_urls': music_info['audio_urls'],
+                'tracks': music_info['tracks'],
+                'errors': music_info['errors'],
+                'elapsed': round(time.monotonic() - started, 1),
+            }
+        remaining = max_wait_time - (time.monotonic() - started)
+        time.sleep(min(poll_delay(attempt, music_info['progress'], poll_interval, SUNO_POLL_MAX_INTERVAL), max(remaining, 0)))
+        attempt += 1
+    return {
+        'success': False,
+        'status': music_info['status'] if music_info else 'pending',
+        'error': f'Timed out after {max_wait_time} seconds',
+        'audio_urls': [],
+    }
+
+
+# --- Command line ---
+CLI_IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.gif', '.bmp', '.tif', '.tiff')
+
+
+def _expand_inputs(inputs):
+    """Image paths for CLI arguments that are files, directories or glob patterns, without duplicates."""
+    paths = []
+    for arg in inputs:
+        if os.path.isdir(arg):
+            matches = sorted(
+                os.path.join(arg, name) for name in os.listdir(arg)
+                if name.lower().endswith(CLI_IMAGE_EXTENSIONS)
+            )
+        elif any(char in arg for char in '*?['):
+            matches = sorted(path for path in glob.glob(arg, recursive=True) if os.path.isfile(path))
+        else:
+            matches = [arg]
+        paths.extend(matches)
+    return list(dict.fromkeys(os.path.abspath(path) for path in paths))
+
+
+def _read_manifest(path):
+    """SHA-256 of every image the manifest records as submitted."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding='utf-8') as manifest:
+        for line in manifest:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # a line cut short by an interrupted run
+            if entry.get('success'):
+                done.add(entry['image_sha256'])
+    return done
+
 
-        suno_response = requests.post(url, headers=headers, data=payload)
-        
-        # Return structured JSON response
-        while True:
-            status_resp = requests.get(f"{BASE_URL}/v1/music/status/{task_id}", headers=headers)
-            status_resp.raise_for_status()
-            status_data = status_resp.json()
-
-            status = status_data.get("status")
-            if status == "completed":
-                audio_url = status_data["result"]["audio_url"]
-                print("✅ Completed! Audio URL:", audio_url)
-                break
-            elif status == "failed":
-                error = status_data.get("error", "Unknown reason")
-                print("❌ Failed:", error)
-                break
-            else:
-                print(f"⏳ Current status: {status}")
-                time.sleep(5)  # adjust as needed
-
-
-        result = {
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for chunk in iter(lambda: handle.read(64 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _process_image(path, done, mode):
+    entry = {'image': path, 'image_sha256': None, 'success': False}
+    try:
+        entry['image_sha256'] = _file_sha256(path)
+        if entry['image_sha256'] in done:
+            return None
+        started = time.monotonic()
+        entry['prompt'], entry['prompt_source'] = lofi_prompt(path, mode)
+        entry['describe_seconds'] = round(time.monotonic() - started, 3)
+        started = time.monotonic()
+        entry['task_id'] = submit_music_generation(entry['prompt'])['task_id']
+        entry['suno_seconds'] = round(time.monotonic() - started, 3)
+        entry['success'] = True
+    except Exception as e:
+        entry['error'] = str(e)
+    return entry
+
+
+def run_batch(paths, manifest_path, workers=4, mode='gemini', progress=sys.stderr):
+    """
+    Describe and submit every image in ``paths`` on ``workers`` threads.
+
+    Each outcome is appended to the JSONL manifest as soon as it is known.
+    Images the manifest already records as submitted are skipped, so an
+    interrupted run can simply be started again. Returns a summary dict.
+    """
+    done = _read_manifest(manifest_path)
+    counts = {'submitted': 0, 'failed': 0, 'skipped': 0}
+    stage_seconds = {'describe_seconds': 0.0, 'suno_seconds': 0.0}
+    started = time.monotonic()
+
+    with open(manifest_path, 'a', encoding='utf-8') as manifest, ThreadPoolExecutor(max_workers=workers) as executor:
+        def record(entry):
+            if entry is None:
+                counts['skipped'] += 1
+                return
+            entry['finished_at'] = round(time.time(), 3)
+            manifest.write(json.dumps(entry) + '\n')
+            manifest.flush()
+            counts['submitted' if entry['success'] else 'failed'] += 1
+            for key in stage_seconds:
+                stage_seconds[key] += entry.get(key, 0)
+            outcome = 'ok  ' if entry['success'] else 'FAIL'
+            print(f"{outcome} {entry['image']} {entry.get('task_id') or entry.get('error')}", file=progress)
+
+        pending = {executor.submit(_process_image, path, done, mode) for path in paths}
+        try:
+            for future in as_completed(list(pending)):
+                pending.discard(future)
+                record(future.result())
+        except KeyboardInterrupt:
+            # Drop queued images, but let the ones in flight finish and record them.
+            print("Interrupted; finishing images already in progress...", file=progress)
+            for future in pending:
+                future.cancel()
+            for future in pending:
+                if not future.cancelled():
+                    record(future.result())
+            raise
+
+    elapsed = time.monotonic() - started
+    processed = counts['submitted'] + counts['failed']
+    return {
+        'images': len(paths),
+        **counts,
+        'elapsed_seconds': round(elapsed, 2),
+        'images_per_minute': round(processed / elapsed * 60, 1) if elapsed else None,
+        'mean_describe_seconds': round(stage_seconds['describe_seconds'] / counts['submitted'], 2) if counts['submitted'] else None,
+        'mean_suno_seconds': round(stage_seconds['suno_seconds'] / counts['submitted'], 2) if counts['submitted'] else None,
+        'workers': workers,
+        'mode': mode,
+        'manifest': manifest_path,
+    }
+
+
+def _generate_one(image_path, mode):
+    try:
+        prompt, _ = lofi_prompt(image_path, mode)
+        generation = submit_music_generation(prompt)
+        return {
             "success": True,
-            "prompt": response.text,
-            "audioResponse": suno_response.json() if suno_response.headers.get('content-type', '').startswith('application/json') else suno_response.text,
-            "audioUrl": None  # Extract from suno_response based on API docs
+            "prompt": prompt,
+            "task_id": generation["task_id"],
+            "audioResponse": generation["initial_response"],
         }
-        print(result)
-        return json.dumps(result)
-        
     except Exception as e:
-        error_result = {
-            "success": False,
-            "error": str(e)
-        }
-        return json.dumps(error_result)
+        return {"success": False, "error": str(e)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m api.utils',
+        description='Describe images with Gemini and start a Suno generation for each.',
+    )
+    parser.add_argument('inputs', nargs='+', metavar='IMAGE', help='image files, directories or glob patterns')
+    parser.add_argument('--workers', type=int, default=int(os.getenv('CLI_WORKERS', 4)),
+                        help='images processed concurrently (default: 4)')
+    parser.add_argument('--manifest', help='JSONL file results are appended to; images recorded there as '
+                                           'submitted are skipped (default: lofi-manifest.jsonl)')
+    parser.add_argument('--mode', choices=PROMPT_MODES, default='gemini',
+                        help="'fast' describes images locally instead of with Gemini")
+    args = parser.parse_args(argv)
+
+    single = len(args.inputs) == 1 and os.path.isfile(args.inputs[0]) and not args.manifest
+    if single:
+        # The original one-image mode: a single JSON result on stdout.
+        print(json.dumps(_generate_one(args.inputs[0], args.mode)))
+        return 0
+
+    paths = _expand_inputs(args.inputs)
+    if not paths:
+        print(json.dumps({"success": False, "error": "No images matched"}))
+        return 1
+    try:
+        summary = run_batch(paths, args.manifest or 'lofi-manifest.jsonl', max(args.workers, 1), args.mode)
+    except KeyboardInterrupt:
+        print("Interrupted; run the same command again to resume.", file=sys.stderr)
+        return 130
+    print(json.dumps({"success": summary['failed'] == 0, **summary}))
+    return 0 if summary['failed'] == 0 else 1
+
 
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        error_result = {
-            "success": False,
-            "error": "Usage: python generate_lofi.py <image_path>"
-        }
-        print(json.dumps(error_result))
-        sys.exit(1)
-    
-    image_path = sys.argv[1]
-    result = generate_lofi_prompt(image_path)
-    print(result)
+    sys.exit(main())
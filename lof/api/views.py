@@ -1,49 +1,136 @@
 # api/views.py
 
-from django.http import JsonResponse
+from django.conf import settings
+from asgiref.sync import sync_to_async
+from django.db.models import Q
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
 from django.views.decorators.csrf import csrf_exempt
-from django.core.files.storage import default_storage
-from django.core.files.base import ContentFile
-import os
 import json
+import uuid
+from collections import Counter
+import hmac
+import math
+import base64
+import hashlib
+import threading
+from datetime import datetime
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework_simplejwt.authentication import JWTAuthentication
 
 from .utils import (
-    generate_lofi_prompt,
     submit_music_generation,
-    poll_for_completion,
     extract_music_info,
-    check_generation_status
+    extract_callback_info,
+    status_fingerprint,
+    PROMPT_MODES,
+    TERMINAL_STATUSES,
 )
+from .async_utils import submit_music_generation_async
+from .deadlines import deadline, DeadlineExceeded
+from .events import task_event_stream
+from .cache import status_cache, cached_check_generation_status, acached_check_generation_status
+from .jobs import enqueue_batch, enqueue_generation, poll_stale, record_completion, wait_for_completion
+from .models import Generation
+from .ratelimit import poll_interval, SUNO_POLL_MAX_INTERVAL
+from .responses import JsonResponse
+from . import metrics, mirror, prompt_cache
+from .prompt_cache import describe_image, adescribe_image, image_digests
+from .resilience import CircuitOpen
+from .singleflight import generation_flight, generation_key
+from .status import check_many, acheck_many
 
 @csrf_exempt
 def upload_image(request):
     if request.method == 'POST':
         if 'file' not in request.FILES:
             return JsonResponse({'success': False, 'error': 'No file provided'}, status=400)
+        mode = _prompt_mode(request)
+        if mode is None:
+            return JsonResponse({'success': False, 'error': INVALID_MODE_ERROR}, status=400)
         file = request.FILES.get('file')
-        filename = default_storage.save(f"uploads/{file.name}", ContentFile(file.read()))
-        file_path = os.path.join(default_storage.location, filename)
         try:
-            generated_prompt = generate_lofi_prompt(file_path)
-            generation_result = submit_music_generation(generated_prompt)
+            user = _request_user(request)
+            digests = image_digests(file)
+            with deadline(settings.UPLOAD_DEADLINE):
+                (generated_prompt, generation_result), coalesced = generation_flight.do(
+                    generation_key(digests[0], mode),
+                    lambda: _describe_and_submit(file, digests, mode),
+                )
             task_id = generation_result["task_id"]
+            _record_submission(user, digests, generated_prompt, generation_result)
             return JsonResponse({
                 'success': True, 
                 'message': 'Music generation started',
                 'task_id': task_id,
+                'coalesced': coalesced,
                 'generated_prompt': generated_prompt,
                 'initial_response': generation_result["initial_response"]
             })
+        except AuthenticationFailed:
+            return JsonResponse({'success': False, 'error': 'Invalid or expired token'}, status=401)
+        except CircuitOpen as e:
+            return _upstream_unavailable(e)
+        except DeadlineExceeded as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=504)
         except Exception as e:
             return JsonResponse({'success': False, 'error': str(e)}, status=500)
         finally:
-            try:
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-            except:
-                pass
+            file.close()
     return JsonResponse({'success': False, 'error': 'Invalid request'}, status=405)
 
+def _describe_and_submit(file, digests, mode):
+    prompt = describe_image(file, digests, mode)
+    return prompt, submit_music_generation(prompt)
+
+async def _adescribe_and_submit(file, digests, mode):
+    prompt = await adescribe_image(file, digests, mode)
+    return prompt, await submit_music_generation_async(prompt)
+
+def _prompt_mode(request):
+    # 'fast' skips Gemini and describes the image locally (api/mood.py).
+    mode = request.POST.get('mode') or 'gemini'
+    return mode if mode in PROMPT_MODES else None
+
+INVALID_MODE_ERROR = f"mode must be one of: {', '.join(PROMPT_MODES)}"
+
+def _upstream_unavailable(error):
+    # The circuit for Gemini or Suno is open; tell the client when it is worth trying again.
+    return JsonResponse(
+        {'success': False, 'error': str(error)},
+        status=503,
+        headers={'Retry-After': str(math.ceil(error.retry_after))},
+    )
+
+def _request_user(request):
+    # Uploads work anonymously; a valid JWT bearer token attributes the generation to its user.
+    authenticated = JWTAuthentication().authenticate(request)
+    return authenticated[0] if authenticated else None
+
+_record_lock = threading.Lock()
+
+def _record_submission(user, digests, prompt, generation_result):
+    # Coalesced requests share a task_id: keep one row per user and task, so a double
+    # submit shows up once in that user's history. The requests coalesce within this
+    # process, so a process lock closes the gap between the get and the create.
+    with _record_lock:
+        generation, _ = Generation.objects.get_or_create(
+            user=user,
+            task_id=generation_result["task_id"],
+            defaults={
+                'status': Generation.STATUS_PROCESSING,
+                'image_sha256': digests[0],
+                'image_phash': digests[1],
+                'prompt': prompt,
+                'initial_response': generation_result["initial_response"],
+            },
+        )
+    return generation
+
 @csrf_exempt
 def check_music_status(request, task_id):
     if request.method != 'GET':
@@ -51,66 +138,123 @@ def check_music_status(request, task_id):
     if not task_id or not task_id.strip():
         return JsonResponse({'success': False, 'error': 'Task ID is required'}, status=400)
     try:
-        api_response = check_generation_status(task_id)
-        if not api_response:
-            return JsonResponse({'success': False, 'error': 'Could not fetch status from Suno API', 'task_id': task_id}, status=500)
-        if 'error' in api_response:
-            status_code = api_response.get('status_code', 500)
-            return JsonResponse({'success': False, 'error': api_response['error'], 'task_id': task_id}, status=status_code)
-        music_info = extract_music_info(api_response)
-        response_data = {
-            'success': True,
-            'task_id': task_id,
-            'status': music_info['status'],
-            'progress': music_info['progress'],
-            'is_complete': music_info['status'] == 'complete',
-            'is_failed': music_info['status'] == 'failed',
-            'is_processing': music_info['status'] in ['processing', 'queued', 'pending'],
-            'audio_urls': music_info['audio_urls'],
-            'tracks': music_info['tracks'],
-            'metadata': music_info['metadata'],
-            'timestamp': api_response.get('timestamp'),
-            'raw_response': api_response
-        }
-        if music_info['errors']:
-            response_data['errors'] = music_info['errors']
-        return JsonResponse(response_data)
+        api_response = cached_check_generation_status(task_id)
+        mirror_urls = mirror.local_urls(_audio_urls(api_response)) if mirror.enabled() else None
+        return _status_response(request, task_id, api_response, mirror_urls)
     except ValueError as e:
         return JsonResponse({'success': False, 'error': str(e), 'task_id': task_id}, status=400)
     except Exception as e:
         return JsonResponse({'success': False, 'error': f'Internal server error: {str(e)}', 'task_id': task_id}, status=500)
 
+# ?compact=1 keeps these; ?fields=a,b picks its own. success and task_id are always sent.
+COMPACT_STATUS_FIELDS = ('status', 'progress', 'audio_urls', 'errors', 'mirror_urls')
+
+def _requested_fields(request):
+    if request.GET.get('fields'):
+        return {name.strip() for name in request.GET['fields'].split(',') if name.strip()}
+    if request.GET.get('compact', '').lower() in ('1', 'true', 'yes'):
+        return set(COMPACT_STATUS_FIELDS)
+    return None
+
+def _audio_urls(api_response):
+    if not api_response or 'error' in api_response:
+        return []
+    return extract_music_info(api_response)['audio_urls']
+
+def _status_etag(music_info, mirror_urls, fields):
+    # Only the normalised state counts; raw_response details don't change the ETag.
+    etag = status_fingerprint(music_info)
+    if mirror_urls or fields:
+        variant = json.dumps([mirror_urls, sorted(fields or ())], separators=(',', ':'))
+        etag += '-' + hashlib.sha1(variant.encode('utf-8')).hexdigest()[:8]
+    return f'"{etag}"'
+
+def _status_cache_control(music_info):
+    # A hint for when to poll next: the status cache TTL at the least, sooner as progress grows.
+    # Fixed for a given state, so a 200 and its 304s agree; clients add their own jitter.
+    if music_info['status'] in TERMINAL_STATUSES:
+        return f'private, max-age={settings.STATUS_TERMINAL_MAX_AGE}'
+    hint = max(settings.STATUS_CACHE_TTL, poll_interval(0, music_info['progress'], settings.STATUS_POLL_HINT, SUNO_POLL_MAX_INTERVAL))
+    return f'private, max-age={round(hint)}'
+
+def _status_response(request, task_id, api_response, mirror_urls=None):
+    if not api_response:
+        return JsonResponse({'success': False, 'error': 'Could not fetch status from Suno API', 'task_id': task_id}, status=500)
+    if 'error' in api_response:
+        status_code = api_response.get('status_code', 500)
+        return JsonResponse({'success': False, 'error': api_response['error'], 'task_id': task_id}, status=status_code)
+    music_info = extract_music_info(api_response)
+    fields = _requested_fields(request)
+    headers = {'ETag': _status_etag(music_info, mirror_urls, fields), 'Cache-Control': _status_cache_control(music_info)}
+    not_modified = get_conditional_response(request, etag=headers['ETag'])
+    if not_modified is not None:
+        # Nothing changed since the client's copy: 304 without serialising a body.
+        for name, value in headers.items():
+            not_modified[name] = value
+        return not_modified
+    response_data = {
+        'success': True,
+        'task_id': task_id,
+        'status': music_info['status'],
+        'progress': music_info['progress'],
+        'is_complete': music_info['status'] == 'complete',
+        'is_failed': music_info['status'] == 'failed',
+        'is_processing': music_info['status'] in ['processing', 'queued', 'pending'],
+        'audio_urls': music_info['audio_urls'],
+        'tracks': music_info['tracks'],
+        'metadata': music_info['metadata'],
+        'timestamp': api_response.get('timestamp'),
+        'raw_response': api_response
+    }
+    if music_info['errors']:
+        response_data['errors'] = music_info['errors']
+    if mirror_urls:
+        response_data['mirror_urls'] = mirror_urls
+    if fields:
+        response_data = {name: value for name, value in response_data.items() if name in fields or name in ('success', 'task_id')}
+    return JsonResponse(response_data, headers=headers)
+
 @csrf_exempt
 def generate_and_wait(request):
     if request.method == 'POST':
         if 'file' not in request.FILES:
             return JsonResponse({'success': False, 'error': 'No file provided'}, status=400)
+        mode = _prompt_mode(request)
+        if mode is None:
+            return JsonResponse({'success': False, 'error': INVALID_MODE_ERROR}, status=400)
         file = request.FILES.get('file')
-        filename = default_storage.save(f"uploads/{file.name}", ContentFile(file.read()))
-        file_path = os.path.join(default_storage.location, filename)
         try:
-            generated_prompt = generate_lofi_prompt(file_path)
-            generation_result = submit_music_generation(generated_prompt)
+            user = _request_user(request)
+            digests = image_digests(file)
+            with deadline(settings.UPLOAD_DEADLINE):
+                (generated_prompt, generation_result), coalesced = generation_flight.do(
+                    generation_key(digests[0], mode),
+                    lambda: _describe_and_submit(file, digests, mode),
+                )
             task_id = generation_result["task_id"]
-            completion_result = poll_for_completion(task_id, poll_interval=10, max_wait_time=300)
+            _record_submission(user, digests, generated_prompt, generation_result)
+            completion_result = wait_for_completion(task_id, max_wait_time=300)
             audio_urls = completion_result.get('audio_urls', [])
             return JsonResponse({
                 'success': completion_result['success'],
                 'task_id': task_id,
+                'coalesced': coalesced,
                 'generated_prompt': generated_prompt,
                 'initial_response': generation_result["initial_response"],
                 'final_result': completion_result,
                 'status': completion_result.get('status'),
                 'audio_urls': audio_urls
             })
+        except AuthenticationFailed:
+            return JsonResponse({'success': False, 'error': 'Invalid or expired token'}, status=401)
+        except CircuitOpen as e:
+            return _upstream_unavailable(e)
+        except DeadlineExceeded as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=504)
         except Exception as e:
             return JsonResponse({'success': False, 'error': str(e)}, status=500)
         finally:
-            try:
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-            except:
-                pass
+            file.close()
     return JsonResponse({'success': False, 'error': 'Invalid request'}, status=405)
 
 @csrf_exempt 
@@ -122,33 +266,337 @@ def check_multiple_tasks(request):
         task_ids = data.get('task_ids', [])
         if not task_ids or not isinstance(task_ids, list):
             return JsonResponse({'success': False, 'error': 'task_ids array is required'}, status=400)
-        results = {}
-        for task_id in task_ids:
-            try:
-                api_response = check_generation_status(task_id)
-                if api_response and 'error' not in api_response:
-                    music_info = extract_music_info(api_response)
-                    results[task_id] = {
-                        'success': True,
-                        'status': music_info['status'],
-                        'progress': music_info['progress'],
-                        'audio_urls': music_info['audio_urls'],
-                        'errors': music_info['errors']
-                    }
-                else:
-                    results[task_id] = {
-                        'success': False,
-                        'error': api_response.get('error', 'Could not fetch status')
-                    }
-            except Exception as e:
-                results[task_id] = {'success': False, 'error': str(e)}
+        if len(task_ids) > settings.SUNO_BATCH_MAX_TASKS:
+            return JsonResponse({'success': False, 'error': f'At most {settings.SUNO_BATCH_MAX_TASKS} task_ids per request'}, status=400)
+        return _batch_response(task_ids, check_many(task_ids))
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'error': 'Invalid JSON in request body'}, status=400)
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+def _batch_response(task_ids, results):
+    return JsonResponse({
+        'success': True,
+        'results': results,
+        'total_tasks': len(task_ids),
+        'unique_tasks': len(results),
+        'successful_checks': len([r for r in results.values() if r.get('success')]),
+        'timed_out': len([r for r in results.values() if r.get('timed_out')])
+    })
+
+@csrf_exempt
+def create_generation(request):
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Only POST method allowed'}, status=405)
+    if 'file' not in request.FILES:
+        return JsonResponse({'success': False, 'error': 'No file provided'}, status=400)
+    mode = _prompt_mode(request)
+    if mode is None:
+        return JsonResponse({'success': False, 'error': INVALID_MODE_ERROR}, status=400)
+    file = request.FILES.get('file')
+    try:
+        generation = enqueue_generation(file, user=_request_user(request), mode=mode)
+    except AuthenticationFailed:
+        return JsonResponse({'success': False, 'error': 'Invalid or expired token'}, status=401)
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+    finally:
+        file.close()
+    return JsonResponse({
+        'success': True,
+        'message': 'Music generation queued',
+        'generation_id': str(generation.id),
+        'status': generation.status,
+        'status_url': reverse('generation-status', args=[generation.id]),
+    }, status=202)
+
+@csrf_exempt
+def generation_status(request, generation_id):
+    if request.method != 'GET':
+        return JsonResponse({'success': False, 'error': 'Only GET method allowed'}, status=405)
+    try:
+        generation = Generation.objects.get(pk=generation_id)
+    except Generation.DoesNotExist:
+        return JsonResponse({'success': False, 'error': 'Generation not found'}, status=404)
+    if poll_stale([generation]):
+        generation.refresh_from_db()
+    data = generation.to_dict()
+    mirror_urls = mirror.local_urls(generation.audio_urls)
+    if mirror_urls:
+        data['mirror_urls'] = mirror_urls
+    return JsonResponse({'success': True, **data})
+
+@csrf_exempt
+def create_batch(request):
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Only POST method allowed'}, status=405)
+    files = request.FILES.getlist('files') or request.FILES.getlist('file')
+    if not files:
+        return JsonResponse({'success': False, 'error': 'No files provided'}, status=400)
+    if len(files) > settings.BATCH_MAX_FILES:
+        return JsonResponse({'success': False, 'error': f'At most {settings.BATCH_MAX_FILES} files per batch'}, status=400)
+    mode = _prompt_mode(request)
+    if mode is None:
+        return JsonResponse({'success': False, 'error': INVALID_MODE_ERROR}, status=400)
+    try:
+        batch_id, items = enqueue_batch(files, user=_request_user(request), mode=mode)
+    except AuthenticationFailed:
+        return JsonResponse({'success': False, 'error': 'Invalid or expired token'}, status=401)
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+    finally:
+        for file in files:
+            file.close()
+    queued = sum(1 for item in items if 'generation_id' in item)
+    if not queued:
+        return JsonResponse({'success': False, 'error': 'None of the files could be read', 'items': items}, status=400)
+    return JsonResponse({
+        'success': True,
+        'message': f'{queued} of {len(items)} generations queued',
+        'batch_id': str(batch_id),
+        'items': items,
+        'status_url': reverse('batch-status', args=[batch_id]),
+    }, status=202)
+
+@csrf_exempt
+def batch_status(request, batch_id):
+    if request.method != 'GET':
+        return JsonResponse({'success': False, 'error': 'Only GET method allowed'}, status=405)
+    rows = Generation.objects.filter(batch_id=batch_id).defer('initial_response', 'tracks').order_by('created_at', 'id')
+    generations = list(rows)
+    if not generations:
+        return JsonResponse({'success': False, 'error': 'Batch not found'}, status=404)
+    if poll_stale(generations):
+        generations = list(rows)
+    return JsonResponse({
+        'success': True,
+        'batch_id': str(batch_id),
+        'total': len(generations),
+        'counts': dict(Counter(generation.status for generation in generations)),
+        'is_finished': all(generation.status in Generation.TERMINAL_STATUSES for generation in generations),
+        'items': [generation.to_dict() for generation in generations],
+    })
+
+def _encode_cursor(generation):
+    raw = f"{generation.created_at.isoformat()}|{generation.id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+def _decode_cursor(cursor):
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+    created_at, _, generation_id = raw.partition('|')
+    return datetime.fromisoformat(created_at), uuid.UUID(generation_id)
+
+@api_view(['GET'])
+@authentication_classes([JWTAuthentication])
+@permission_classes([IsAuthenticated])
+def generation_history(request):
+    """
+    The caller's generations, newest first. Pages are keyset-paginated: pass
+    the returned ``next_cursor`` back as ``?cursor=`` to get the next page.
+    """
+    try:
+        limit = min(max(int(request.GET.get('limit', 20)), 1), settings.HISTORY_MAX_PAGE_SIZE)
+    except ValueError:
+        return Response({'success': False, 'error': 'limit must be an integer'}, status=400)
+    rows = (
+        Generation.objects
+        .filter(user=request.user)
+        .defer('initial_response', 'tracks')
+        .order_by('-created_at', '-id')
+    )
+    if request.GET.get('status'):
+        rows = rows.filter(status=request.GET['status'])
+    if request.GET.get('cursor'):
+        try:
+            created_at, generation_id = _decode_cursor(request.GET['cursor'])
+        except (ValueError, UnicodeDecodeError):
+            return Response({'success': False, 'error': 'Invalid cursor'}, status=400)
+        # Seek past the last row of the previous page instead of OFFSET-scanning to it.
+        rows = rows.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=generation_id))
+    page = list(rows[:limit + 1])
+    return Response({
+        'success': True,
+        'results': [generation.to_dict() for generation in page[:limit]],
+        'next_cursor': _encode_cursor(page[limit - 1]) if len(page) > limit else None,
+    })
+
+@csrf_exempt
+def suno_callback(request):
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Only POST method allowed'}, status=405)
+    # Without a configured token anyone could rewrite task results, so callbacks are refused;
+    # the fallback polling still completes the generations.
+    if not settings.SUNO_CALLBACK_TOKEN:
+        return JsonResponse({'success': False, 'error': 'Callbacks are disabled: SUNO_CALLBACK_TOKEN is not set'}, status=403)
+    if not hmac.compare_digest(request.GET.get('token', '').encode(), settings.SUNO_CALLBACK_TOKEN.encode()):
+        return JsonResponse({'success': False, 'error': 'Invalid callback token'}, status=403)
+    try:
+        payload = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'error': 'Invalid JSON in request body'}, status=400)
+    if not isinstance(payload, dict) or not isinstance(payload.get('data') or {}, dict):
+        return JsonResponse({'success': False, 'error': 'Callback body must be a JSON object'}, status=400)
+    music_info = extract_callback_info(payload)
+    if not music_info['task_id']:
+        return JsonResponse({'success': False, 'error': 'Callback has no task_id'}, status=400)
+    record_completion(music_info['task_id'], music_info)
+    return JsonResponse({'status': 'received'})
+
+@csrf_exempt
+def cache_stats(request):
+    if request.method != 'GET':
+        return JsonResponse({'success': False, 'error': 'Only GET method allowed'}, status=405)
+    return JsonResponse({
+        'success': True,
+        'status_cache': status_cache.stats(),
+        'prompt_cache': prompt_cache.stats(),
+    })
+
+
+@csrf_exempt
+def prometheus_metrics(request):
+    if request.method != 'GET':
+        return JsonResponse({'success': False, 'error': 'Only GET method allowed'}, status=405)
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@csrf_exempt
+def mirrored_audio(request, content_sha256):
+    if request.method not in ('GET', 'HEAD'):
+        return JsonResponse({'success': False, 'error': 'Only GET method allowed'}, status=405)
+    track = mirror.find(content_sha256)
+    if track is None:
+        return JsonResponse({'success': False, 'error': 'Track is not mirrored'}, status=404)
+    etag = f'"{content_sha256}"'
+    if request.headers.get('If-None-Match') == etag:
+        return HttpResponse(status=304, headers={'ETag': etag})
+
+    if settings.AUDIO_MIRROR_ACCEL_REDIRECT:
+        # nginx serves the file (and any Range) itself with sendfile.
+        response = HttpResponse(content_type=track.content_type or 'audio/mpeg')
+        response['X-Accel-Redirect'] = f"{settings.AUDIO_MIRROR_ACCEL_REDIRECT.rstrip('/')}/{content_sha256[:2]}/{content_sha256}"
+    else:
+        byte_range = None
+        if request.headers.get('If-Range', etag) == etag:
+            byte_range = mirror.byte_range(request.headers.get('Range'), track.size)
+        if byte_range is False:
+            return HttpResponse(status=416, headers={'Content-Range': f'bytes */{track.size}'})
+        start, end = byte_range or (0, track.size - 1)
+        length = end - start + 1
+        if request.method == 'HEAD':
+            response = HttpResponse(content_type=track.content_type or 'audio/mpeg')
+            response['Content-Length'] = length
+        else:
+            handle = open(mirror.content_path(content_sha256), 'rb')
+            handle.seek(start)
+            if end == track.size - 1:
+                # Runs to the end of the file, so the server's file wrapper can sendfile() it.
+                response = FileResponse(handle, content_type=track.content_type or 'audio/mpeg')
+            else:
+                response = StreamingHttpResponse(mirror.iter_range(handle, length), content_type=track.content_type or 'audio/mpeg')
+                response['Content-Length'] = length
+        if byte_range:
+            response.status_code = 206
+            response['Content-Range'] = f'bytes {start}-{end}/{track.size}'
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    # The URL is the hash of the bytes, so the content never changes.
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+
+# --- Async views (served by lof.asgi; the sync views above stay for WSGI) ---
+
+@csrf_exempt
+async def upload_image_async(request):
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Invalid request'}, status=405)
+    if 'file' not in request.FILES:
+        return JsonResponse({'success': False, 'error': 'No file provided'}, status=400)
+    mode = _prompt_mode(request)
+    if mode is None:
+        return JsonResponse({'success': False, 'error': INVALID_MODE_ERROR}, status=400)
+    file = request.FILES.get('file')
+    try:
+        user = await sync_to_async(_request_user)(request)
+        digests = await sync_to_async(image_digests, thread_sensitive=False)(file)
+        with deadline(settings.UPLOAD_DEADLINE):
+            (generated_prompt, generation_result), coalesced = await generation_flight.ado(
+                generation_key(digests[0], mode),
+                lambda: _adescribe_and_submit(file, digests, mode),
+            )
+        await sync_to_async(_record_submission)(user, digests, generated_prompt, generation_result)
         return JsonResponse({
             'success': True,
-            'results': results,
-            'total_tasks': len(task_ids),
-            'successful_checks': len([r for r in results.values() if r.get('success')])
+            'message': 'Music generation started',
+            'task_id': generation_result["task_id"],
+            'coalesced': coalesced,
+            'generated_prompt': generated_prompt,
+            'initial_response': generation_result["initial_response"]
         })
+    except AuthenticationFailed:
+        return JsonResponse({'success': False, 'error': 'Invalid or expired token'}, status=401)
+    except CircuitOpen as e:
+        return _upstream_unavailable(e)
+    except DeadlineExceeded as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=504)
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+    finally:
+        file.close()
+
+@csrf_exempt
+async def check_music_status_async(request, task_id):
+    if request.method != 'GET':
+        return JsonResponse({'success': False, 'error': 'Only GET method allowed'}, status=405)
+    if not task_id or not task_id.strip():
+        return JsonResponse({'success': False, 'error': 'Task ID is required'}, status=400)
+    try:
+        api_response = await acached_check_generation_status(task_id)
+        mirror_urls = await sync_to_async(mirror.local_urls)(_audio_urls(api_response)) if mirror.enabled() else None
+        return _status_response(request, task_id, api_response, mirror_urls)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e), 'task_id': task_id}, status=400)
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': f'Internal server error: {str(e)}', 'task_id': task_id}, status=500)
+
+@csrf_exempt
+async def check_multiple_tasks_async(request):
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Only POST method allowed'}, status=405)
+    try:
+        data = json.loads(request.body)
+        task_ids = data.get('task_ids', [])
+        if not task_ids or not isinstance(task_ids, list):
+            return JsonResponse({'success': False, 'error': 'task_ids array is required'}, status=400)
+        if len(task_ids) > settings.SUNO_BATCH_MAX_TASKS:
+            return JsonResponse({'success': False, 'error': f'At most {settings.SUNO_BATCH_MAX_TASKS} task_ids per request'}, status=400)
+        return _batch_response(task_ids, await acheck_many(task_ids))
     except json.JSONDecodeError:
         return JsonResponse({'success': False, 'error': 'Invalid JSON in request body'}, status=400)
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+@csrf_exempt
+async def task_events(request, task_id):
+    if request.method != 'GET':
+        return JsonResponse({'success': False, 'error': 'Only GET method allowed'}, status=405)
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    try:
+        api_response = await acached_check_generation_status(task_id)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e), 'task_id': task_id}, status=400)
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e), 'task_id': task_id}, status=502)
+    if 'error' in api_response:
+        return JsonResponse({'success': False, 'error': api_response['error'], 'task_id': task_id}, status=api_response.get('status_code', 500))
+    music_info = extract_music_info(api_response)
+    if music_info['status'] in TERMINAL_STATUSES and status_fingerprint(music_info) == last_event_id:
+        # The client already saw the final state; 204 stops EventSource reconnecting.
+        return HttpResponse(status=204)
+    response = StreamingHttpResponse(
+        task_event_stream(task_id, music_info, last_event_id),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
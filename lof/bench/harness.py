@@ -0,0 +1,274 @@
+"""
+Offline load benchmark for the Django endpoints.
+
+Starts the Gemini and Suno stand-ins from bench.stubs, runs the project on a
+throwaway SQLite database pointed at them, drives each endpoint at the given
+concurrency and reports latency percentiles, throughput and the server's
+peak RSS. Needs no network and no API keys:
+
+    python -m bench.harness --concurrency 16 --requests 200
+    python -m bench.harness --server asgi --endpoints upload,check_multiple_tasks
+    python -m bench.harness --gemini-latency lognormal:0.8:0.4 --suno-error-rate 0.05
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from .stubs import GeminiStub, SunoStub
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENDPOINTS = {
+    # name: (sync path, async path or None)
+    'upload': ('/api/upload/', '/api/async/upload/'),
+    'generate_and_wait': ('/api/generate-and-wait/', None),
+    'check_multiple_tasks': ('/api/check-multiple-tasks/', '/api/async/check-multiple-tasks/'),
+}
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _make_images(count, size=(1600, 1200)):
+    from PIL import Image, ImageFilter
+    images = []
+    for _ in range(count):
+        noise = Image.effect_noise((size[0] // 16, size[1] // 16), random.randint(20, 80))
+        picture = noise.filter(ImageFilter.GaussianBlur(2)).convert('RGB').resize(size)
+        buffer = BytesIO()
+        picture.save(buffer, 'JPEG', quality=90)
+        images.append(buffer.getvalue())
+    return images
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+class RssSampler(threading.Thread):
+    """Track the peak resident set size of a process from /proc."""
+
+    def __init__(self, pid, interval=0.05):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak_kb = 0
+        self._stop_event = threading.Event()
+
+    def _rss_kb(self):
+        try:
+            with open(f'/proc/{self.pid}/status') as status:
+                for line in status:
+                    if line.startswith('VmRSS:'):
+                        return int(line.split()[1])
+        except OSError:
+            pass
+        return 0
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.peak_kb = max(self.peak_kb, self._rss_kb())
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        return self.peak_kb
+
+
+class Server:
+    """The project under WSGI (runserver) or ASGI (uvicorn) on a scratch database."""
+
+    def __init__(self, kind, env):
+        self.kind = kind
+        self.port = _free_port()
+        self.env = env
+        self.process = None
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.port}'
+
+    def start(self):
+        subprocess.run(
+            [sys.executable, 'manage.py', 'migrate', '--noinput', '-v', '0'],
+            cwd=PROJECT_DIR, env=self.env, check=True,
+        )
+        if self.kind == 'asgi':
+            command = [sys.executable, '-m', 'uvicorn', 'lof.asgi:application',
+                       '--host', '127.0.0.1', '--port', str(self.port), '--log-level', 'warning']
+        else:
+            command = [sys.executable, 'manage.py', 'runserver', f'127.0.0.1:{self.port}', '--noreload']
+        self.process = subprocess.Popen(
+            command, cwd=PROJECT_DIR, env=self.env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f'{self.kind} server exited with code {self.process.returncode}')
+            try:
+                requests.get(self.url, timeout=1)
+                return self
+            except requests.RequestException:
+                time.sleep(0.2)
+        raise RuntimeError('Server did not start within 60 seconds')
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            self.process.wait(timeout=10)
+
+
+def run_endpoint(server, name, path, make_request, total, concurrency):
+    local = threading.local()
+
+    def one(_):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        started = time.perf_counter()
+        try:
+            response = make_request(session, server.url + path)
+            ok = response.status_code < 400
+            body = response.json() if ok else response.text[:200]
+        except requests.RequestException as e:
+            ok, body = False, str(e)
+        return time.perf_counter() - started, ok, body
+
+    sampler = RssSampler(server.process.pid)
+    sampler.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(one, range(total)))
+    wall = time.perf_counter() - started
+    peak_kb = sampler.stop()
+
+    latencies = sorted(latency * 1000 for latency, ok, _ in outcomes if ok)
+    return {
+        'endpoint': name,
+        'path': path,
+        'requests': total,
+        'errors': sum(1 for _, ok, _ in outcomes if not ok),
+        'rps': round(total / wall, 2) if wall else None,
+        'p50_ms': _percentile(latencies, 50),
+        'p95_ms': _percentile(latencies, 95),
+        'p99_ms': _percentile(latencies, 99),
+        'peak_rss_mb': round(peak_kb / 1024, 1),
+        'first_error': next((body for _, ok, body in outcomes if not ok), None),
+        'bodies': [body for _, ok, body in outcomes if ok],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--server', choices=['wsgi', 'asgi'], default='wsgi')
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS))
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=100, help='requests per endpoint')
+    parser.add_argument('--wait-requests', type=int, default=16, help='requests for generate_and_wait')
+    parser.add_argument('--batch-size', type=int, default=20, help='task ids per check_multiple_tasks call')
+    parser.add_argument('--images', type=int, default=20, help='distinct images to upload')
+    parser.add_argument('--gemini-latency', default='lognormal:0.8:0.3')
+    parser.add_argument('--gemini-error-rate', type=float, default=0.0)
+    parser.add_argument('--suno-latency', default='uniform:0.05:0.2')
+    parser.add_argument('--suno-error-rate', type=float, default=0.0)
+    parser.add_argument('--generation-time', default='uniform:3:6', help='seconds until a Suno task succeeds')
+    parser.add_argument('--callback-drop-rate', type=float, default=0.0)
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    endpoints = [name.strip() for name in args.endpoints.split(',') if name.strip()]
+    unknown = set(endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(sorted(unknown))}")
+
+    gemini = GeminiStub(latency=args.gemini_latency, error_rate=args.gemini_error_rate).start()
+    suno = SunoStub(
+        latency=args.suno_latency, error_rate=args.suno_error_rate,
+        generation_time=args.generation_time, callback_drop_rate=args.callback_drop_rate,
+    ).start()
+
+    scratch = tempfile.mkdtemp(prefix='lof-bench-')
+    env = dict(os.environ)
+    env.update({
+        'LOF_DATABASE_NAME': os.path.join(scratch, 'db.sqlite3'),
+        'GOOGLE_API_KEY': 'bench',
+        'SUNO': 'bench',
+        'GEMINI_API_ENDPOINT': gemini.url,
+        'SUNO_API_BASE': suno.base_url,
+        'SUNO_CALLBACK_TOKEN': 'bench',
+    })
+    for name, value in {'SUNO_RATE_LIMIT': '1000', 'SUNO_RATE_BURST': '1000', 'SUNO_FALLBACK_POLL_INTERVAL': '5'}.items():
+        env.setdefault(name, value)
+    server = Server(args.server, env)
+    env['SUNO_CALLBACK_URL'] = f"{server.url}/api/suno/callback/?token={env['SUNO_CALLBACK_TOKEN']}"
+
+    images = _make_images(args.images)
+    task_ids = []
+
+    def upload(session, url):
+        return session.post(url, files={'file': ('photo.jpg', random.choice(images), 'image/jpeg')}, timeout=120)
+
+    def batch_status(session, url):
+        sample = random.sample(task_ids, min(args.batch_size, len(task_ids))) if task_ids else ['missing']
+        return session.post(url, json={'task_ids': sample}, timeout=60)
+
+    plans = {
+        'upload': (upload, args.requests),
+        'generate_and_wait': (upload, args.wait_requests),
+        'check_multiple_tasks': (batch_status, args.requests),
+    }
+
+    results = []
+    try:
+        server.start()
+        print(f"{args.server} server on {server.url}; gemini stub {gemini.url}; suno stub {suno.url}")
+        for name in endpoints:
+            sync_path, async_path = ENDPOINTS[name]
+            path = async_path if args.server == 'asgi' and async_path else sync_path
+            make_request, total = plans[name]
+            result = run_endpoint(server, name, path, make_request, total, args.concurrency)
+            task_ids.extend(body['task_id'] for body in result.pop('bodies') if body and body.get('task_id'))
+            results.append(result)
+    finally:
+        server.stop()
+        gemini.stop()
+        suno.stop()
+
+    print(f"{'endpoint':<22}{'reqs':>6}{'errs':>6}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'peak RSS':>11}")
+    for r in results:
+        def ms(value):
+            return f'{value:.1f}' if value is not None else '-'
+        print(f"{r['endpoint']:<22}{r['requests']:>6}{r['errors']:>6}{r['rps']:>9}"
+              f"{ms(r['p50_ms']):>10}{ms(r['p95_ms']):>10}{ms(r['p99_ms']):>10}{r['peak_rss_mb']:>8} MB")
+    for r in results:
+        if r['first_error']:
+            print(f"{r['endpoint']}: first error: {r['first_error']}")
+    print(f"gemini stub requests: {gemini.requests}; suno stub requests: {suno.requests}; callbacks sent: {suno.callbacks_sent}")
+
+    if args.json:
+        with open(args.json, 'w') as handle:
+            json.dump({'args': vars(args), 'results': results}, handle, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Cost of a login_api call: accepted logins, wrong passwords, and attempts
+rejected by the throttle. Runs in-process against a scratch SQLite database with the
+project's real password hasher:
+
+    python -m bench.login --logins 20 --throttled 2000
+"""
+
+import os
+import json
+import logging
+import time
+import argparse
+import tempfile
+
+
+def _time(client, payload, count, ip):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    statuses = set()
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        for _ in range(count):
+            response = client.post('/api/auth/', json.dumps(payload), content_type='application/json', REMOTE_ADDR=ip)
+            statuses.add(response.status_code)
+        elapsed = time.perf_counter() - started
+    return elapsed / count * 1000, len(queries) / count, sorted(statuses)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--logins', type=int, default=20, help='accepted and wrong-password attempts to time')
+    parser.add_argument('--throttled', type=int, default=2000, help='throttled attempts to time')
+    args = parser.parse_args()
+
+    os.environ.setdefault('LOF_DATABASE_NAME', os.path.join(tempfile.mkdtemp(prefix='lof-bench-'), 'db.sqlite3'))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'lof.settings')
+    import django
+    django.setup()
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from django.test import Client
+    from lof import utils
+
+    call_command('migrate', verbosity=0)
+    logging.getLogger('django.request').setLevel(logging.ERROR)  # one warning per 401/429 otherwise
+    User.objects.create_user('bench', 'bench@example.com', 'correct horse battery staple')
+    client = Client(HTTP_HOST='localhost')
+    good = {'username': 'bench', 'password': 'correct horse battery staple'}
+    bad = {'username': 'bench', 'password': 'wrong'}
+
+    # Generous limits while timing the paths that must reach authenticate().
+    utils.username_throttle.limit = utils.ip_throttle.limit = 10 ** 9
+    rows = []
+    rows.append(('accepted', *_time(client, good, args.logins, '10.0.0.1')))
+    rows.append(('wrong password', *_time(client, bad, args.logins, '10.0.0.3')))
+
+    utils.username_throttle.limit = 1
+    utils.username_throttle.reset('bench')
+    _time(client, bad, 1, '10.0.0.4')
+    rows.append(('throttled', *_time(client, bad, args.throttled, '10.0.0.4')))
+
+    print(f"{'attempt':<26}{'ms/attempt':>12}{'queries':>9}  status")
+    for label, ms, queries, statuses in rows:
+        print(f"{label:<26}{ms:>12.3f}{queries:>9.1f}  {','.join(map(str, statuses))}")
+    accepted, throttled = rows[0][1], rows[-1][1]
+    print(f"a throttled attempt costs {throttled / accepted:.2%} of an accepted login")
+
+
+if __name__ == '__main__':
+    main()
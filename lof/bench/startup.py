@@ -0,0 +1,72 @@
+"""
+Cold-start time per entry point: each one is run in a fresh interpreter
+and timed until it is ready to do work (URLconf loaded for the WSGI/ASGI
+apps). With --top, also lists the slowest imports from python -X importtime:
+
+    python -m bench.startup --runs 5 --top 8
+"""
+
+import os
+import sys
+import time
+import argparse
+import subprocess
+import statistics
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_READY = "import django.urls; django.urls.get_resolver().url_patterns"
+
+# label -> (argv after the interpreter, extra environment)
+ENTRY_POINTS = {
+    'manage.py check': (['manage.py', 'check'], {}),
+    'wsgi': (['-c', f"import lof.wsgi; {_READY}"], {}),
+    'wsgi, preloaded': (['-c', f"import lof.wsgi; {_READY}"], {'LOF_PRELOAD_SDKS': '1'}),
+    'asgi': (['-c', f"import lof.asgi; {_READY}"], {}),
+    'cli (python -m api.utils)': (['-m', 'api.utils'], {}),
+}
+
+
+def _run(args, env, importtime=False):
+    argv = [sys.executable, '-W', 'ignore'] + (['-X', 'importtime'] if importtime else []) + args
+    started = time.perf_counter()
+    result = subprocess.run(argv, cwd=PROJECT_DIR, env=env, capture_output=True, text=True)
+    return time.perf_counter() - started, result.stderr
+
+
+def _slowest_imports(stderr, top):
+    # Lines look like "import time:   self [us] | cumulative | module"; keep top-level packages only.
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if name.startswith('  '):
+            continue
+        imports.append((int(cumulative), name.strip()))
+    return sorted(imports, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help='fresh interpreters per entry point')
+    parser.add_argument('--top', type=int, default=0, help='also show the N slowest top-level imports')
+    args = parser.parse_args()
+
+    base_env = dict(os.environ, DJANGO_SETTINGS_MODULE='lof.settings')
+    base_env.pop('LOF_PRELOAD_SDKS', None)
+    _run(['-c', 'pass'], base_env)  # warm the OS file cache
+
+    print(f"{args.runs} cold starts each, python {sys.version.split()[0]}")
+    print(f"{'entry point':<28}{'median ms':>10}{'min ms':>9}")
+    for label, (argv, extra_env) in ENTRY_POINTS.items():
+        env = dict(base_env, **extra_env)
+        times = [_run(argv, env)[0] * 1000 for _ in range(args.runs)]
+        print(f"{label:<28}{statistics.median(times):>10.0f}{min(times):>9.0f}")
+        if args.top:
+            for micros, name in _slowest_imports(_run(argv, env, importtime=True)[1], args.top):
+                print(f"    {micros / 1000:>8.1f} ms  {name}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Bytes and server time per check_music_status response, full versus
+?compact=1 / ?fields=, with Django's stock JsonResponse versus
+api.responses.JsonResponse (orjson when installed).
+
+The status record is seeded into the status cache so only view work and
+serialization are measured; no network is used:
+
+    python -m bench.status_payload --tracks 2 --repeat 2000
+"""
+
+import os
+import time
+import argparse
+
+LOREM = (
+    "A quiet rainy street at dusk, warm window light spilling onto wet cobblestones, a lone cyclist "
+    "passing a shuttered bakery, calm, nostalgic and a little melancholic. "
+)
+
+
+def _record(task_id, tracks, prompt_words):
+    # Shaped like a SUCCESS answer from /generate/record-info, which echoes the prompt per track.
+    prompt = (LOREM * (prompt_words // len(LOREM.split()) + 1))[:prompt_words * 6]
+    base = 'https://cdn1.suno.ai'
+    return {
+        'code': 200,
+        'msg': 'success',
+        'data': {
+            'taskId': task_id,
+            'parentMusicId': '',
+            'param': (
+                '{"prompt":"%s","style":"Classical","title":"Peaceful Piano Meditation","customMode":true,'
+                '"instrumental":true,"model":"V3_5","negativeTags":"Heavy Metal, Upbeat Drums",'
+                '"callBackUrl":"https://api.example.com/api/suno/callback/"}' % prompt
+            ),
+            'response': {
+                'taskId': task_id,
+                'sunoData': [{
+                    'id': f'{task_id}-{n}',
+                    'audioUrl': f'{base}/{task_id}-{n}.mp3',
+                    'sourceAudioUrl': f'{base}/source-{task_id}-{n}.mp3',
+                    'streamAudioUrl': f'{base}/stream/{task_id}-{n}',
+                    'sourceStreamAudioUrl': f'{base}/source-stream/{task_id}-{n}',
+                    'imageUrl': f'{base}/image_{task_id}-{n}.jpeg',
+                    'sourceImageUrl': f'{base}/source-image_{task_id}-{n}.jpeg',
+                    'prompt': prompt,
+                    'modelName': 'chirp-v3-5',
+                    'title': 'Peaceful Piano Meditation',
+                    'tags': 'Classical',
+                    'createTime': 1760800000000 + n,
+                    'duration': 118.4 + n,
+                } for n in range(tracks)],
+            },
+            'status': 'SUCCESS',
+            'type': 'chirp-v3-5',
+            'operationType': 'generate',
+            'errorCode': None,
+            'errorMessage': None,
+        },
+    }
+
+
+def _measure(view, request, task_id, repeat):
+    response = view(request, task_id)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        view(request, task_id)
+    return len(response.content), (time.perf_counter() - started) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tracks', type=int, default=2)
+    parser.add_argument('--prompt-words', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=2000)
+    args = parser.parse_args()
+
+    import django
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'lof.settings')
+    django.setup()
+    from django.http import JsonResponse as DjangoJsonResponse
+    from django.test import RequestFactory
+    from api import views, responses
+    from api.cache import status_cache
+
+    task_id = 'bench-task'
+    status_cache.set(task_id, _record(task_id, args.tracks, args.prompt_words), terminal=True)
+    factory = RequestFactory()
+    queries = [('full', ''), ('compact', '?compact=1'), ('fields', '?fields=status,audio_urls')]
+    encoders = [('django', DjangoJsonResponse), ('orjson' if responses.orjson else 'compact-json', responses.JsonResponse)]
+
+    print(f"{args.tracks} tracks, {args.prompt_words}-word prompt, {args.repeat} responses each")
+    print(f"{'query':<10}{'encoder':<14}{'bytes':>9}{'us/resp':>10}")
+    baseline = None
+    for label, query in queries:
+        request = factory.get(f'/api/check_music_status/{task_id}/{query}')
+        for encoder_label, response_class in encoders:
+            views.JsonResponse = response_class
+            size, micros = _measure(views.check_music_status, request, task_id, args.repeat)
+            baseline = baseline or (size, micros)
+            print(f"{label:<10}{encoder_label:<14}{size:>9}{micros:>10.1f}"
+                  f"   ({size / baseline[0]:.0%} bytes, {micros / baseline[1]:.0%} time of full/django)")
+    views.JsonResponse = responses.JsonResponse
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,234 @@
+"""
+Local stand-ins for the Gemini and Suno APIs, for benchmarks that must not
+spend quota or touch the network.
+
+Latencies are given as distribution specs:
+
+    0.2                  fixed 200 ms
+    uniform:0.1:0.5      uniform between 100 and 500 ms
+    lognormal:0.8:0.4    log-normal with an 800 ms median and sigma 0.4
+
+The Suno stub walks each task through PENDING -> TEXT_SUCCESS ->
+FIRST_SUCCESS -> SUCCESS over ``generation_time`` and then POSTs the same
+callback body Suno sends (the one the old no.py receiver printed) to the
+task's callBackUrl, unless the callback is randomly dropped.
+"""
+
+import json
+import math
+import hashlib
+import time
+import uuid
+import random
+import threading
+import urllib.request
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+
+def parse_latency(spec):
+    """Return a zero-argument sampler (seconds) for a latency spec string."""
+    parts = str(spec).split(':')
+    kind = parts[0]
+    if kind == 'uniform':
+        low, high = float(parts[1]), float(parts[2])
+        return lambda: random.uniform(low, high)
+    if kind == 'lognormal':
+        median, sigma = float(parts[1]), float(parts[2])
+        return lambda: random.lognormvariate(math.log(median), sigma)
+    fixed = float(kind)
+    return lambda: fixed
+
+
+class _JsonHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    stub = None
+
+    def log_message(self, *args):
+        pass
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        return json.loads(body) if body else {}
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _StubServer:
+    handler_class = _JsonHandler
+
+    def __init__(self, latency='0', error_rate=0.0, host='127.0.0.1', port=0):
+        self.sample_latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.requests = 0
+        self._lock = threading.Lock()
+        handler = type(self.handler_class.__name__, (self.handler_class,), {'stub': self})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _count(self):
+        with self._lock:
+            self.requests += 1
+
+    def delay(self):
+        """Count the request, sleep for a sampled latency and say whether to fail it."""
+        self._count()
+        time.sleep(self.sample_latency())
+        return random.random() < self.error_rate
+
+
+class _GeminiHandler(_JsonHandler):
+    def do_POST(self):
+        self._read_json()
+        if not self.path.split('?')[0].endswith(':generateContent'):
+            return self._send_json(404, {'error': {'code': 404, 'message': 'Not found'}})
+        if self.stub.delay():
+            return self._send_json(503, {'error': {'code': 503, 'message': 'Stub overloaded', 'status': 'UNAVAILABLE'}})
+        text = random.choice(self.stub.descriptions)
+        self._send_json(200, {
+            'candidates': [{
+                'content': {'parts': [{'text': text}], 'role': 'model'},
+                'finishReason': 'STOP',
+                'index': 0,
+            }],
+        })
+
+
+class GeminiStub(_StubServer):
+    """Answers ``POST /v1beta/models/<model>:generateContent`` with a canned description."""
+
+    handler_class = _GeminiHandler
+    descriptions = [
+        'A quiet rainy street at dusk, warm window light, a lone cyclist, calm and nostalgic.',
+        'Friends laughing on a sunlit rooftop, soft breeze, relaxed and hopeful summer evening.',
+        'An empty library corner with a cup of tea, muted colours, reflective and cosy.',
+    ]
+
+
+class _SunoHandler(_JsonHandler):
+    def do_POST(self):
+        payload = self._read_json()
+        if not self.path.startswith('/api/v1/generate'):
+            return self._send_json(404, {'code': 404, 'msg': 'Not found'})
+        if self.stub.delay():
+            return self._send_json(429, {'code': 429, 'msg': 'Stub rate limited'}, {'Retry-After': '1'})
+        task_id = self.stub.create_task(payload.get('callBackUrl'))
+        self._send_json(200, {'code': 200, 'msg': 'success', 'data': {'taskId': task_id}})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path.startswith('/audio/'):
+            return self._send_audio(url.path)
+        if url.path != '/api/v1/generate/record-info':
+            return self._send_json(404, {'code': 404, 'msg': 'Not found'})
+        if self.stub.delay():
+            return self._send_json(429, {'code': 429, 'msg': 'Stub rate limited'}, {'Retry-After': '1'})
+        task_id = parse_qs(url.query).get('taskId', [''])[0]
+        record = self.stub.record(task_id)
+        if record is None:
+            return self._send_json(200, {'code': 404, 'msg': 'Task not found'})
+        self._send_json(200, {'code': 200, 'msg': 'success', 'data': record})
+
+    def _send_audio(self, path):
+        # Deterministic filler bytes so the same URL always has the same content.
+        seed = hashlib.sha256(path.encode('utf-8')).digest()
+        body = seed * (self.stub.audio_bytes // len(seed))
+        self.send_response(200)
+        self.send_header('Content-Type', 'audio/mpeg')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class SunoStub(_StubServer):
+    """Suno generate / record-info endpoints with simulated progress and callbacks; serves the track URLs too."""
+
+    handler_class = _SunoHandler
+    STAGES = (('PENDING', 0.0), ('TEXT_SUCCESS', 0.3), ('FIRST_SUCCESS', 0.7), ('SUCCESS', 1.0))
+
+    def __init__(self, generation_time=5.0, callback_drop_rate=0.0, audio_bytes=512 * 1024, **kwargs):
+        super().__init__(**kwargs)
+        self.audio_bytes = audio_bytes
+        self.sample_generation_time = parse_latency(generation_time)
+        self.callback_drop_rate = callback_drop_rate
+        self.tasks = {}
+        self.callbacks_sent = 0
+
+    @property
+    def base_url(self):
+        return f'{self.url}/api/v1'
+
+    def create_task(self, callback_url):
+        task_id = uuid.uuid4().hex
+        duration = self.sample_generation_time()
+        with self._lock:
+            self.tasks[task_id] = (time.monotonic(), duration)
+        if callback_url and random.random() >= self.callback_drop_rate:
+            timer = threading.Timer(duration, self._send_callback, args=(task_id, callback_url))
+            timer.daemon = True
+            timer.start()
+        return task_id
+
+    def _tracks(self, task_id, snake_case=False):
+        audio_key, stream_key = ('audio_url', 'stream_audio_url') if snake_case else ('audioUrl', 'streamAudioUrl')
+        return [{
+            'id': f'{task_id}-{n}',
+            'title': 'Peaceful Piano Meditation',
+            audio_key: f'{self.url}/audio/{task_id}-{n}.mp3',
+            stream_key: f'{self.url}/stream/{task_id}-{n}',
+            'duration': 120.0,
+            'tags': 'lofi',
+        } for n in range(2)]
+
+    def record(self, task_id):
+        with self._lock:
+            task = self.tasks.get(task_id)
+        if task is None:
+            return None
+        started, duration = task
+        done = (time.monotonic() - started) / duration if duration else 1.0
+        status = [name for name, threshold in self.STAGES if done >= threshold][-1]
+        return {
+            'taskId': task_id,
+            'status': status,
+            'type': 'chirp-v3-5',
+            'response': {'taskId': task_id, 'sunoData': self._tracks(task_id) if status == 'SUCCESS' else []},
+            'errorCode': None,
+            'errorMessage': None,
+        }
+
+    def _send_callback(self, task_id, callback_url):
+        body = json.dumps({
+            'code': 200,
+            'msg': 'All generated successfully.',
+            'data': {'callbackType': 'complete', 'task_id': task_id, 'data': self._tracks(task_id, snake_case=True)},
+        }).encode('utf-8')
+        request = urllib.request.Request(callback_url, data=body, headers={'Content-Type': 'application/json'})
+        try:
+            urllib.request.urlopen(request, timeout=10).close()
+            with self._lock:
+                self.callbacks_sent += 1
+        except OSError:
+            pass
@@ -0,0 +1,120 @@
+"""
+Peak RSS per concurrent upload for the old copy-to-storage path and the
+streaming path used by the upload views. Both paths end in the same
+preprocess_image call, so the difference is the cost of the byte copies.
+
+Each variant runs in its own interpreter so ``ru_maxrss`` is not shared:
+
+    python -m bench.upload_memory --width 4000 --height 3000 --concurrency 8
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import subprocess
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _make_jpeg(width, height, quality):
+    from PIL import Image, ImageFilter
+    noise = Image.effect_noise((width // 2, height // 2), 40).filter(ImageFilter.GaussianBlur(1))
+    buffer = BytesIO()
+    noise.convert('RGB').resize((width, height)).save(buffer, 'JPEG', quality=quality)
+    return buffer.getvalue()
+
+
+def _spooled_upload(data):
+    # What Django hands the view for anything over FILE_UPLOAD_MAX_MEMORY_SIZE.
+    from django.core.files.uploadedfile import TemporaryUploadedFile
+    upload = TemporaryUploadedFile('photo.jpg', 'image/jpeg', len(data), None)
+    for offset in range(0, len(data), 64 * 1024):
+        upload.write(data[offset:offset + 64 * 1024])
+    upload.seek(0)
+    return upload
+
+
+def _legacy(upload, media_root):
+    # file.read() -> ContentFile -> storage -> reopen from disk.
+    from django.core.files.base import ContentFile
+    from api.prompt_cache import image_digests
+    from api.utils import preprocess_image
+    content = ContentFile(upload.read())
+    path = os.path.join(media_root, f'{id(content)}.jpg')
+    with open(path, 'wb') as handle:
+        handle.write(content.read())
+    image_digests(path)
+    preprocess_image(path)
+    os.remove(path)
+
+
+def _streaming(upload, media_root):
+    from api.prompt_cache import image_digests
+    from api.utils import preprocess_image
+    image_digests(upload)
+    preprocess_image(upload)
+
+
+def _child(variant, data_path, concurrency):
+    import django
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'lof.settings')
+    django.setup()
+    # Import the pipeline modules up front so they count towards the baseline.
+    import api.prompt_cache  # noqa: F401
+    with open(data_path, 'rb') as handle:
+        data = handle.read()
+    uploads = [_spooled_upload(data) for _ in range(concurrency)]
+    del data
+    media_root = tempfile.mkdtemp()
+    handler = _legacy if variant == 'legacy' else _streaming
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(lambda upload: handler(upload, media_root), uploads))
+    elapsed = time.perf_counter() - started
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    shutil.rmtree(media_root, ignore_errors=True)
+    print(json.dumps({'baseline_kb': baseline, 'peak_kb': peak, 'seconds': elapsed}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--width', type=int, default=4000)
+    parser.add_argument('--height', type=int, default=3000)
+    parser.add_argument('--quality', type=int, default=95)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--child', choices=['legacy', 'streaming'], help=argparse.SUPPRESS)
+    parser.add_argument('--data', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args.child, args.data, args.concurrency)
+        return
+
+    data = _make_jpeg(args.width, args.height, args.quality)
+    with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as handle:
+        handle.write(data)
+    print(f"{args.width}x{args.height} JPEG, {len(data) / 1e6:.1f} MB, {args.concurrency} concurrent uploads")
+    print(f"{'path':<10} {'peak RSS delta':>15} {'per upload':>12} {'wall':>8}")
+    try:
+        for variant in ('legacy', 'streaming'):
+            output = subprocess.run(
+                [sys.executable, '-m', 'bench.upload_memory', '--child', variant,
+                 '--data', handle.name, '--concurrency', str(args.concurrency)],
+                check=True, capture_output=True, text=True,
+                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            delta_mb = (result['peak_kb'] - result['baseline_kb']) / 1024
+            print(f"{variant:<10} {delta_mb:>12.1f} MB {delta_mb / args.concurrency:>9.1f} MB {result['seconds']:>7.2f}s")
+    finally:
+        os.remove(handle.name)
+
+
+if __name__ == '__main__':
+    main()
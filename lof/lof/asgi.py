@@ -9,8 +9,19 @@ https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'lof.settings')
 
 application = get_asgi_application()
+
+if settings.GENERATION_SWEEP_INTERVAL:
+    from api.jobs import start_sweeper_on_first_request
+
+    start_sweeper_on_first_request()
+
+if settings.PRELOAD_SDKS:
+    from api.clients import PRELOAD_MODULES, warm_up
+
+    warm_up((settings.ROOT_URLCONF, *PRELOAD_MODULES))
@@ -0,0 +1,177 @@
+# lof/outbox.py
+#
+# In-process outbox for transactional email. Views enqueue a job and return
+# straight away; one background thread drains the queue in batches and sends
+# each batch over a single SMTP connection, retrying failed messages with
+# backoff. Password-reset jobs carry only the address: the user lookup and
+# token generation happen in the sender, so the request takes the same time
+# whether or not an account exists.
+
+import queue
+import logging
+import threading
+from contextlib import suppress
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.auth.tokens import default_token_generator
+from django.core.mail import EmailMessage, get_connection
+from django.db import close_old_connections
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+logger = logging.getLogger(__name__)
+
+RESET_SUBJECT = 'Password Reset Request'
+RESET_BODY = '''
+            Hi {username},
+
+            You requested a password reset. Click the link below to reset your password:
+            {reset_link}
+
+            If you didn't request this, please ignore this email.
+
+            Best regards,
+            Your Team
+            '''
+
+
+class _Job:
+    def __init__(self, kind, payload):
+        self.kind = kind
+        self.payload = payload
+        self.attempts = 0
+        self.messages = None  # built on first delivery attempt
+
+
+class Outbox:
+    def __init__(self, batch_size, batch_wait, max_retries, retry_delay):
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.sent = 0
+        self.failed = 0
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='outbox', daemon=True)
+                self._thread.start()
+
+    def put(self, kind, payload):
+        self._queue.put(_Job(kind, payload))
+        self._ensure_thread()
+
+    def flush(self):
+        """Block until every queued job has been handled (retries scheduled later are not waited for)."""
+        self._queue.join()
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get(timeout=self.batch_wait))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                close_old_connections()
+                self._deliver(batch)
+            except Exception:
+                logger.exception("Outbox batch of %d jobs failed", len(batch))
+            finally:
+                close_old_connections()
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _deliver(self, batch):
+        pending = []
+        for job in batch:
+            if job.messages is None:
+                try:
+                    job.messages = BUILDERS[job.kind](job.payload)
+                except Exception:
+                    logger.exception("Could not build %s email", job.kind)
+                    self._retry(job)
+                    continue
+            pending.extend((job, message) for message in job.messages)
+        if not pending:
+            return
+
+        connection = get_connection(fail_silently=False)
+        failed = []
+        position = 0
+        try:
+            connection.open()
+            for job, message in pending:
+                position += 1
+                message.connection = connection
+                try:
+                    message.send()
+                    self.sent += 1
+                except Exception as e:
+                    logger.warning("Sending %s email failed: %s", job.kind, e)
+                    failed.append((job, message))
+                    # The failure may have broken the connection; reopen it for the rest.
+                    connection.close()
+                    connection.open()
+        except Exception as e:
+            logger.warning("SMTP connection failed: %s", e)
+            failed.extend(pending[position:])
+        finally:
+            with suppress(Exception):
+                connection.close()
+
+        for job in {id(job): job for job, _ in failed}.values():
+            job.messages = [message for owner, message in failed if owner is job]
+            self._retry(job)
+
+    def _retry(self, job):
+        job.attempts += 1
+        if job.attempts > self.max_retries:
+            self.failed += 1
+            logger.error("Giving up on %s email after %d attempts", job.kind, job.attempts)
+            return
+        delay = self.retry_delay * 2 ** (job.attempts - 1)
+        timer = threading.Timer(delay, self._requeue, args=(job,))
+        timer.daemon = True
+        timer.start()
+
+    def _requeue(self, job):
+        self._queue.put(job)
+        self._ensure_thread()
+
+
+def _password_reset_messages(email):
+    messages = []
+    for user in User.objects.filter(email__iexact=email, is_active=True):
+        token = default_token_generator.make_token(user)
+        uid = urlsafe_base64_encode(force_bytes(user.pk))
+        reset_link = f"{settings.FRONTEND_URL}/reset-password/{uid}/{token}/"
+        body = RESET_BODY.format(username=user.username, reset_link=reset_link)
+        messages.append(EmailMessage(RESET_SUBJECT, body, settings.DEFAULT_FROM_EMAIL, [user.email]))
+    return messages
+
+
+BUILDERS = {
+    'password_reset': _password_reset_messages,
+}
+
+outbox = Outbox(
+    batch_size=settings.OUTBOX_BATCH_SIZE,
+    batch_wait=settings.OUTBOX_BATCH_WAIT,
+    max_retries=settings.OUTBOX_MAX_RETRIES,
+    retry_delay=settings.OUTBOX_RETRY_DELAY,
+)
+
+
+def queue_password_reset(email):
+    outbox.put('password_reset', email)
@@ -46,6 +46,7 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'rest_framework',
     'corsheaders',
+    'api',
 ]
 
 MIDDLEWARE = [
@@ -87,7 +88,18 @@ LOGIN_REDIRECT_URL = '/'  # or 'home' if you're using named routes
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.getenv('LOF_DATABASE_NAME', BASE_DIR / 'db.sqlite3'),
+        'OPTIONS': {
+            # Take the write lock when a transaction starts so concurrent
+            # read-then-write transactions queue instead of failing as "locked".
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+            # WAL lets readers (history, status pages) run while a writer holds the lock.
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL',
+        },
+        # Keep connections open between requests instead of reconnecting (and re-running the PRAGMAs).
+        'CONN_MAX_AGE': int(os.getenv('LOF_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
@@ -141,3 +153,142 @@ CORS_ALLOWED_ORIGINS = [
 ]
 
 CORS_ALLOW_CREDENTIALS = True
+# Lets browser clients read the status ETag for If-None-Match polling.
+CORS_EXPOSE_HEADERS = ['ETag']
+
+# Login throttling (lof/utils.py): (attempts, window seconds) per username and per client IP,
+# enforced before any password hashing.
+LOGIN_THROTTLE_USERNAME = (int(os.getenv('LOGIN_THROTTLE_USERNAME_LIMIT', 5)), float(os.getenv('LOGIN_THROTTLE_USERNAME_WINDOW', 300)))
+LOGIN_THROTTLE_IP = (int(os.getenv('LOGIN_THROTTLE_IP_LIMIT', 20)), float(os.getenv('LOGIN_THROTTLE_IP_WINDOW', 60)))
+
+# Email. Password reset links point at FRONTEND_URL; mail goes out through the outbox
+# (lof/outbox.py) in batches of OUTBOX_BATCH_SIZE over one connection, failures retried with backoff.
+# The queue and the pending retries (threading.Timer) live in memory: mail not yet sent when the
+# worker restarts is lost, and the user has to ask for another reset link.
+FRONTEND_URL = os.getenv('FRONTEND_URL', 'http://localhost:3000')
+EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
+EMAIL_HOST = os.getenv('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.getenv('EMAIL_PORT', 25))
+EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', '').lower() in ('1', 'true', 'yes')
+EMAIL_TIMEOUT = float(os.getenv('EMAIL_TIMEOUT', 30))
+DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'webmaster@localhost')
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', 50))
+OUTBOX_BATCH_WAIT = float(os.getenv('OUTBOX_BATCH_WAIT', 0.5))
+OUTBOX_MAX_RETRIES = int(os.getenv('OUTBOX_MAX_RETRIES', 5))
+OUTBOX_RETRY_DELAY = float(os.getenv('OUTBOX_RETRY_DELAY', 30))
+
+# Background generation pipeline
+GENERATION_WORKERS = int(os.getenv('GENERATION_WORKERS', 4))
+# Every GENERATION_SWEEP_INTERVAL seconds (0: never) each server process requeues generations stuck
+# before Suno for GENERATION_STALE_AFTER seconds, e.g. after a restart, or fails them if the upload is gone.
+GENERATION_SWEEP_INTERVAL = float(os.getenv('GENERATION_SWEEP_INTERVAL', 60))
+GENERATION_STALE_AFTER = float(os.getenv('GENERATION_STALE_AFTER', 600))
+# Most images one api/batches/ request may carry, and how many of them are hashed and downscaled
+# at once during the request. Their Gemini and Suno stages share the GENERATION_WORKERS pool.
+BATCH_MAX_FILES = int(os.getenv('BATCH_MAX_FILES', 50))
+BATCH_PREPARE_WORKERS = int(os.getenv('BATCH_PREPARE_WORKERS', 4))
+
+# Suno pushes completions to api/suno/callback/; polling only covers missed callbacks
+# (generate-and-wait requests, and queued generations read after this many seconds without news).
+# SUNO_CALLBACK_URL must carry ?token=<SUNO_CALLBACK_TOKEN>; without a token callbacks are refused.
+SUNO_CALLBACK_TOKEN = os.getenv('SUNO_CALLBACK_TOKEN', '')
+SUNO_FALLBACK_POLL_INTERVAL = int(os.getenv('SUNO_FALLBACK_POLL_INTERVAL', 30))
+
+# check-multiple-tasks fans out over this many threads and answers within the deadline (seconds).
+# A request may carry at most SUNO_BATCH_MAX_TASKS ids and holds at most
+# SUNO_BATCH_REQUEST_CONCURRENCY threads at a time, so one batch cannot starve the others.
+SUNO_STATUS_CONCURRENCY = int(os.getenv('SUNO_STATUS_CONCURRENCY', 8))
+SUNO_BATCH_DEADLINE = float(os.getenv('SUNO_BATCH_DEADLINE', 10))
+SUNO_BATCH_MAX_TASKS = int(os.getenv('SUNO_BATCH_MAX_TASKS', 100))
+SUNO_BATCH_REQUEST_CONCURRENCY = int(os.getenv('SUNO_BATCH_REQUEST_CONCURRENCY', 4))
+
+# Largest page api/generations/history/ returns.
+HISTORY_MAX_PAGE_SIZE = int(os.getenv('HISTORY_MAX_PAGE_SIZE', 100))
+
+# Status cache: in-flight records live STATUS_CACHE_TTL seconds, finished ones until LRU eviction.
+STATUS_CACHE_TTL = float(os.getenv('STATUS_CACHE_TTL', 5))
+STATUS_CACHE_MAX_ENTRIES = int(os.getenv('STATUS_CACHE_MAX_ENTRIES', 10000))
+
+# check_music_status sends an ETag and a Cache-Control max-age telling clients when to poll
+# next: about STATUS_POLL_HINT seconds early on, less near completion, never below the cache TTL.
+STATUS_POLL_HINT = float(os.getenv('STATUS_POLL_HINT', 10))
+STATUS_TERMINAL_MAX_AGE = int(os.getenv('STATUS_TERMINAL_MAX_AGE', 300))
+
+# Prompt cache: Gemini descriptions keyed by image hash. Images whose perceptual
+# hashes differ by at most PROMPT_CACHE_PHASH_DISTANCE bits share a description (0 disables).
+PROMPT_CACHE_MAX_ENTRIES = int(os.getenv('PROMPT_CACHE_MAX_ENTRIES', 5000))
+PROMPT_CACHE_PHASH_DISTANCE = int(os.getenv('PROMPT_CACHE_PHASH_DISTANCE', 6))
+
+# Identical uploads (same image and mode) in flight at once share one Gemini + Suno run
+# (api/singleflight.py); its result answers repeats for SINGLE_FLIGHT_LINGER more seconds (0: none).
+SINGLE_FLIGHT_LINGER = float(os.getenv('SINGLE_FLIGHT_LINGER', 10))
+
+# Seconds an upload request (or a queued generation, once it starts) may spend
+# describing the image and submitting it to Suno, waits included (0: no limit).
+# Per-call timeouts for Gemini and Suno are in api/utils.py, which reads the environment directly.
+UPLOAD_DEADLINE = float(os.getenv('UPLOAD_DEADLINE', 60))
+GENERATION_DEADLINE = float(os.getenv('GENERATION_DEADLINE', 120))
+
+# Circuit breakers (api/resilience.py): an upstream's circuit opens when at least FAILURE_RATIO of
+# its calls in the last WINDOW seconds failed (MIN_CALLS or more), refuses calls for COOLDOWN
+# seconds, then lets one trial call through. The api.utils CLI reads the same names from the environment.
+GEMINI_BREAKER_FAILURE_RATIO = float(os.getenv('GEMINI_BREAKER_FAILURE_RATIO', 0.5))
+GEMINI_BREAKER_MIN_CALLS = int(os.getenv('GEMINI_BREAKER_MIN_CALLS', 10))
+GEMINI_BREAKER_WINDOW = float(os.getenv('GEMINI_BREAKER_WINDOW', 30))
+GEMINI_BREAKER_COOLDOWN = float(os.getenv('GEMINI_BREAKER_COOLDOWN', 30))
+SUNO_BREAKER_FAILURE_RATIO = float(os.getenv('SUNO_BREAKER_FAILURE_RATIO', 0.5))
+SUNO_BREAKER_MIN_CALLS = int(os.getenv('SUNO_BREAKER_MIN_CALLS', 10))
+SUNO_BREAKER_WINDOW = float(os.getenv('SUNO_BREAKER_WINDOW', 30))
+SUNO_BREAKER_COOLDOWN = float(os.getenv('SUNO_BREAKER_COOLDOWN', 30))
+# A Gemini describe still running after GEMINI_HEDGE_QUANTILE of recent latencies (and at least
+# GEMINI_HEDGE_MIN_DELAY seconds) gets a second identical request, for at most GEMINI_HEDGE_MAX_RATIO of calls.
+GEMINI_HEDGE_ENABLED = os.getenv('GEMINI_HEDGE_ENABLED', '1').lower() in ('1', 'true', 'yes')
+GEMINI_HEDGE_QUANTILE = float(os.getenv('GEMINI_HEDGE_QUANTILE', 0.95))
+GEMINI_HEDGE_MIN_DELAY = float(os.getenv('GEMINI_HEDGE_MIN_DELAY', 1.0))
+GEMINI_HEDGE_MAX_RATIO = float(os.getenv('GEMINI_HEDGE_MAX_RATIO', 0.1))
+
+# Server-Sent Events: how often a stream re-reads the (cached) task status,
+# how often it sends a keep-alive comment, and the reconnect delay given to clients.
+# After upstream errors the poll interval doubles up to SSE_ERROR_BACKOFF_MAX; a
+# stream is closed with `end` after SSE_MAX_DURATION and the client reconnects.
+SSE_POLL_INTERVAL = float(os.getenv('SSE_POLL_INTERVAL', 2))
+SSE_HEARTBEAT_INTERVAL = float(os.getenv('SSE_HEARTBEAT_INTERVAL', 15))
+SSE_RETRY_MS = int(os.getenv('SSE_RETRY_MS', 3000))
+SSE_ERROR_BACKOFF_MAX = float(os.getenv('SSE_ERROR_BACKOFF_MAX', 60))
+SSE_MAX_DURATION = float(os.getenv('SSE_MAX_DURATION', 300))
+
+# Audio mirror (off by default): finished tracks are copied under MEDIA_ROOT/AUDIO_MIRROR_DIR
+# and served from api/audio/<sha256>/. Least recently played tracks go first past the byte budget.
+# Behind nginx, set AUDIO_MIRROR_ACCEL_REDIRECT to an internal location aliased to that directory.
+AUDIO_MIRROR_ENABLED = os.getenv('AUDIO_MIRROR_ENABLED', '').lower() in ('1', 'true', 'yes')
+AUDIO_MIRROR_DIR = os.getenv('AUDIO_MIRROR_DIR', 'audio')
+AUDIO_MIRROR_MAX_BYTES = int(os.getenv('AUDIO_MIRROR_MAX_BYTES', 2 * 1024 ** 3))
+AUDIO_MIRROR_WORKERS = int(os.getenv('AUDIO_MIRROR_WORKERS', 2))
+AUDIO_MIRROR_TIMEOUT = float(os.getenv('AUDIO_MIRROR_TIMEOUT', 60))
+AUDIO_MIRROR_ACCEL_REDIRECT = os.getenv('AUDIO_MIRROR_ACCEL_REDIRECT', '')
+# Hosts the mirror may download from (https only); a leading dot also allows subdomains.
+AUDIO_MIRROR_ALLOWED_HOSTS = [
+    host.strip().lower()
+    for host in os.getenv('AUDIO_MIRROR_ALLOWED_HOSTS', '.suno.ai,.suno.com,musicfile.api.box,tempfile.aiquickdraw.com').split(',')
+    if host.strip()
+]
+
+# One JSON line per pipeline stage (api/metrics.py) on stderr; PIPELINE_LOG_LEVEL=WARNING silences them.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'api': {'handlers': ['console'], 'level': 'INFO'},
+        'api.pipeline': {'level': os.getenv('PIPELINE_LOG_LEVEL', 'INFO')},
+    },
+}
+
+# Import the Gemini SDK, HTTP clients and Pillow when lof.wsgi / lof.asgi is loaded instead of
+# on the first request. Worth it with a pre-forking server that loads the app in its master
+# (gunicorn --preload), so every forked worker starts with them, and the URLconf, already imported.
+PRELOAD_SDKS = os.getenv('LOF_PRELOAD_SDKS', '').lower() in ('1', 'true', 'yes')
@@ -0,0 +1,160 @@
+import time
+from smtplib import SMTPException
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+
+from .outbox import Outbox, outbox
+from .utils import SlidingWindowThrottle
+
+
+class CountingBackend(EmailBackend):
+    """locmem backend that counts opened connections and can fail the first few sends."""
+
+    opened = 0
+    failures_left = 0
+
+    def open(self):
+        CountingBackend.opened += 1
+        return super().open()
+
+    def send_messages(self, messages):
+        if CountingBackend.failures_left:
+            CountingBackend.failures_left -= 1
+            raise SMTPException('421 try again later')
+        return super().send_messages(messages)
+
+
+@override_settings(
+    EMAIL_BACKEND='lof.tests.CountingBackend',
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+)
+class OutboxTests(TransactionTestCase):
+    # The outbox sends from its own thread, so the users must be committed.
+
+    def setUp(self):
+        CountingBackend.opened = 0
+        CountingBackend.failures_left = 0
+        for n in range(3):
+            User.objects.create_user(f'user{n}', f'user{n}@example.com', 'password')
+
+    def _wait_for_mail(self, count, timeout=5):
+        deadline = time.monotonic() + timeout
+        while len(mail.outbox) < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_batch_is_sent_over_one_connection(self):
+        box = Outbox(batch_size=10, batch_wait=0.2, max_retries=0, retry_delay=0)
+        for n in range(3):
+            box.put('password_reset', f'user{n}@example.com')
+        box.flush()
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), [f'user{n}@example.com' for n in range(3)])
+        self.assertEqual(CountingBackend.opened, 1)
+        self.assertEqual(box.sent, 3)
+
+    def test_failed_send_is_retried(self):
+        CountingBackend.failures_left = 1
+        box = Outbox(batch_size=10, batch_wait=0.05, max_retries=2, retry_delay=0.05)
+        box.put('password_reset', 'user0@example.com')
+        box.flush()
+        self.assertEqual(len(mail.outbox), 0)
+        self._wait_for_mail(1)
+        box.flush()
+        self.assertEqual([message.to for message in mail.outbox], [['user0@example.com']])
+        self.assertEqual((box.sent, box.failed), (1, 0))
+
+    def test_reset_answer_does_not_reveal_accounts(self):
+        known = self.client.post('/api/auth/forgot-password/', {'email': 'user1@example.com'}, content_type='application/json')
+        unknown = self.client.post('/api/auth/forgot-password/', {'email': 'nobody@example.com'}, content_type='application/json')
+        self.assertEqual(known.status_code, 200)
+        self.assertEqual((known.status_code, known.json()), (unknown.status_code, unknown.json()))
+        outbox.flush()
+        self.assertEqual([message.to for message in mail.outbox], [['user1@example.com']])
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class SlidingWindowThrottleTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch('lof.utils.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.throttle = SlidingWindowThrottle(limit=3, window=60)
+
+    def test_limit_and_wait(self):
+        for _ in range(3):
+            self.assertEqual(self.throttle.hit('alice'), 0)
+            self.clock.advance(10)
+        self.assertEqual(self.throttle.hit('alice'), 30)  # the first attempt leaves the window at t+60
+        self.assertEqual(self.throttle.hit('bob'), 0)
+        self.clock.advance(30)
+        self.assertEqual(self.throttle.hit('alice'), 0)
+        self.assertEqual(self.throttle.hit('alice'), 10)
+
+    def test_refused_attempts_are_not_counted(self):
+        for _ in range(3):
+            self.throttle.hit('alice')
+        for _ in range(10):
+            self.throttle.hit('alice')
+        self.clock.advance(60)
+        self.assertEqual(self.throttle.hit('alice'), 0)
+
+    def test_reset(self):
+        for _ in range(3):
+            self.throttle.hit('alice')
+        self.throttle.reset('alice')
+        self.assertEqual(self.throttle.hit('alice'), 0)
+
+    def test_least_recently_used_keys_are_dropped(self):
+        throttle = SlidingWindowThrottle(limit=1, window=60, max_keys=2)
+        for key in ('a', 'b', 'c'):
+            throttle.hit(key)
+        self.assertEqual(throttle.hit('a'), 0)
+        self.assertGreater(throttle.hit('c'), 0)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class LoginTests(TestCase):
+    def setUp(self):
+        User.objects.create_user('alice', 'alice@example.com', 'password')
+        for name, throttle in (('username_throttle', SlidingWindowThrottle(3, 300)), ('ip_throttle', SlidingWindowThrottle(20, 60))):
+            patcher = mock.patch(f'lof.utils.{name}', throttle)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _login(self, username, password):
+        return self.client.post('/api/auth/', {'username': username, 'password': password}, content_type='application/json')
+
+    def test_username_must_be_a_string(self):
+        self.assertEqual(self._login(['alice'], 'password').status_code, 400)
+        self.assertEqual(self._login('alice', {'x': 1}).status_code, 400)
+        response = self.client.post('/api/auth/', [1], content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_throttled_with_retry_after(self):
+        for _ in range(3):
+            self.assertEqual(self._login('Alice', 'wrong').status_code, 401)
+        response = self._login('alice', 'password')
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(0 < int(response['Retry-After']) <= 300)
+
+    def test_success_resets_the_count(self):
+        for _ in range(2):
+            self._login('alice', 'wrong')
+        self.assertEqual(self._login('alice', 'password').status_code, 200)
+        for _ in range(2):
+            self.assertEqual(self._login('alice', 'wrong').status_code, 401)
+        self.assertEqual(self._login('alice', 'password').status_code, 200)
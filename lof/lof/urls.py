@@ -10,5 +10,6 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('', home,name="home"),
     path('api/auth/',views.login_api),
+    path('api/auth/forgot-password/',views.forgot_password_api),
     path('api/', include('api.urls')),
 ]
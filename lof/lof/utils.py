@@ -0,0 +1,63 @@
+# lof/utils.py
+#
+# Login hardening for lof.views.login_api. Attempts are counted per username
+# and per client IP in in-memory sliding windows and rejected before any
+# password hashing once a window is full. Per process. authenticate() itself
+# stays on the stock ModelBackend, so a password change or deactivation takes
+# effect on every worker at once.
+
+import math
+import time
+import threading
+from collections import OrderedDict, deque
+
+from django.conf import settings
+
+
+class SlidingWindowThrottle:
+    """At most ``limit`` attempts per key in any ``window`` seconds."""
+
+    def __init__(self, limit, window, max_keys=100_000):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self._hits = OrderedDict()  # key -> deque of attempt times, least recently used first
+        self._lock = threading.Lock()
+
+    def hit(self, key):
+        """Record an attempt for ``key``; return 0 if it is allowed, else seconds until one will be."""
+        now = time.monotonic()
+        with self._lock:
+            hits = self._hits.get(key)
+            if hits is None:
+                hits = self._hits[key] = deque()
+                if len(self._hits) > self.max_keys:
+                    self._hits.popitem(last=False)
+            else:
+                self._hits.move_to_end(key)
+            while hits and hits[0] <= now - self.window:
+                hits.popleft()
+            if len(hits) >= self.limit:
+                return hits[0] + self.window - now
+            hits.append(now)
+            return 0
+
+    def reset(self, key):
+        with self._lock:
+            self._hits.pop(key, None)
+
+
+username_throttle = SlidingWindowThrottle(*settings.LOGIN_THROTTLE_USERNAME)
+ip_throttle = SlidingWindowThrottle(*settings.LOGIN_THROTTLE_IP)
+
+
+def throttle_login(username, ip):
+    """Seconds the client must wait before trying again (rounded up), or 0 to go ahead."""
+    wait = ip_throttle.hit(ip) if ip else 0
+    if not wait:
+        wait = username_throttle.hit(username.lower())
+    return math.ceil(wait)
+
+
+def login_succeeded(username):
+    username_throttle.reset(username.lower())
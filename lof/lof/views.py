@@ -3,13 +3,9 @@ from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework import status
 from django.contrib.auth import authenticate
-from django.contrib.auth.models import User
-from django.core.mail import send_mail
-from django.contrib.auth.tokens import default_token_generator
-from django.utils.http import urlsafe_base64_encode
-from django.utils.encoding import force_bytes
-from django.conf import settings
 from rest_framework_simplejwt.tokens import RefreshToken
+from .utils import throttle_login, login_succeeded
+from .outbox import queue_password_reset
 from django.views.decorators.csrf import csrf_exempt
 import json
 import logging
@@ -27,6 +23,10 @@ def login_api(request):
         # Parse JSON data from request body
         if request.content_type == 'application/json':
             data = json.loads(request.body)
+            if not isinstance(data, dict):
+                return Response({
+                    'error': 'Expected a JSON object'
+                }, status=status.HTTP_400_BAD_REQUEST)
             username = data.get('username')
             password = data.get('password')
         else:
@@ -38,13 +38,25 @@ def login_api(request):
             return Response({
                 'error': 'Username and password are required'
             }, status=status.HTTP_400_BAD_REQUEST)
+        if not isinstance(username, str) or not isinstance(password, str):
+            return Response({
+                'error': 'Username and password must be strings'
+            }, status=status.HTTP_400_BAD_REQUEST)
         
+        # Throttle before authenticate(): rejected attempts never reach the password hasher
+        retry_after = throttle_login(username, request.META.get('REMOTE_ADDR'))
+        if retry_after:
+            return Response({
+                'error': 'Too many login attempts. Please try again later.'
+            }, status=status.HTTP_429_TOO_MANY_REQUESTS, headers={'Retry-After': str(retry_after)})
+
         # Authenticate user
         user = authenticate(request, username=username, password=password)
 
         
         if user is not None:
             if user.is_active:
+                login_succeeded(username)
                 # Generate JWT tokens
                 refresh = RefreshToken.for_user(user)
                 
@@ -100,55 +112,12 @@ def forgot_password_api(request):
                 'error': 'Email address is required'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        try:
-            user = User.objects.get(email=email)
-            
-            # Generate password reset token
-            token = default_token_generator.make_token(user)
-            uid = urlsafe_base64_encode(force_bytes(user.pk))
-            
-            # Create reset link (you'll need to adjust this URL to match your frontend)
-            # Example: http://localhost:3000/reset-password/NQ/cbg8ht-93434...
-            reset_link = f"{settings.FRONTEND_URL}/reset-password/{uid}/{token}/"
-            
-            # Send email (configure your email settings in Django settings.py)
-            subject = 'Password Reset Request'
-            message = f'''
-            Hi {user.username},
-            
-            You requested a password reset. Click the link below to reset your password:
-            {reset_link}
-            
-            If you didn't request this, please ignore this email.
-            
-            Best regards,
-            Your Team
-            '''
-            
-            try:
-                send_mail(
-                    subject,
-                    message,
-                    settings.DEFAULT_FROM_EMAIL,
-                    [email],
-                    fail_silently=False,
-                )
-                
-                return Response({
-                    'message': 'Password reset link has been sent to your email'
-                }, status=status.HTTP_200_OK)
-                
-            except Exception as email_error:
-                logger.error(f"Email sending failed: {email_error}")
-                return Response({
-                    'error': 'Failed to send reset email. Please try again later.'
-                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-                
-        except User.DoesNotExist:
-            # Don't reveal whether the email exists for security
-            return Response({
-                'message': 'If an account with that email exists, a reset link has been sent'
-            }, status=status.HTTP_200_OK)
+        # The lookup and the SMTP round trip happen in the outbox thread, so this
+        # answer is the same, and takes the same time, whether or not the account exists.
+        queue_password_reset(email)
+        return Response({
+            'message': 'If an account with that email exists, a reset link has been sent'
+        }, status=status.HTTP_200_OK)
             
     except json.JSONDecodeError:
         return Response({